@@ -0,0 +1,63 @@
+import os
+import json
+import threading
+
+# ==========================================
+# ALIAS STORE (จำชื่อที่ OCR อ่านผิด -> สมาชิกจริง ที่เจ้าหน้าที่เคยยืนยันไว้)
+# ==========================================
+DEFAULT_ALIAS_PATH = os.environ.get("ALIAS_STORE_PATH", "aliases.json")
+
+
+def alias_key(name):
+    return str(name).strip()
+
+
+class AliasStore:
+    # โหลดทั้งไฟล์เป็น dict ครั้งเดียว -> lookup O(1) / เขียนกลับแบบ atomic ทุกครั้งที่บันทึก
+    def __init__(self, path=DEFAULT_ALIAS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self._aliases = {alias_key(k): str(v) for k, v in data.items()}
+
+    def _save(self, aliases):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(aliases, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def lookup(self, name):
+        return self._aliases.get(alias_key(name))
+
+    def record_many(self, mappings):
+        # mappings: [(ชื่อที่อ่านได้, ชื่อสมาชิก)] -> คืนจำนวน alias ที่เพิ่ม/เปลี่ยน
+        # เขียนไฟล์สำเร็จก่อนค่อยแทนที่ dict ในหน่วยความจำ -> เขียนไม่ได้ (OSError) ข้อมูลในแอปกับไฟล์ยังตรงกัน
+        changed = 0
+        with self._lock:
+            aliases = dict(self._aliases)
+            for alias, member in mappings:
+                key = alias_key(alias)
+                member = str(member)
+                if not key or key == member or aliases.get(key) == member:
+                    continue
+                aliases[key] = member
+                changed += 1
+            if changed:
+                self._save(aliases)
+                self._aliases = aliases
+        return changed
+
+    def record(self, alias, member):
+        return self.record_many([(alias, member)])
@@ -1,16 +1,31 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import numpy as np
 import io
+import os
+import time
 import zipfile
-import easyocr
-from thefuzz import process
-from PIL import Image
+import threading
 import gspread
 from google.oauth2.service_account import Credentials
 import matplotlib.font_manager as fm
+import guild_config
+import ocr_pipeline
+import sheet_sync
+from sheet_connection import SheetConnection
+import sheet_history
+import guild_analytics
+import chart_service
+import ocr_cache
+import ocr_preprocess
+import scroll_ingest
+import perf_stats
+from roster_index import RosterIndex
+from alias_store import AliasStore
+from roster_table import RosterTable
+from roster_view import RosterView, PAGE_SIZES, DEFAULT_PAGE_SIZE
+from local_store import LocalStore
+from sync_worker import SheetSyncWorker
 
 # ==========================================
 # 1. GLOBAL SETUP & CONFIG
@@ -30,103 +45,289 @@ plt.rcParams['font.family'] = fe.name
 # บรรทัดนี้ให้ลบออกหรือใส่ # ไว้ครับ เพื่อป้องกันความสับสนของ Library
 plt.rcParams['font.sans-serif'] = ['Tahoma', 'Sarabun', 'Arial Unicode MS', 'DejaVu Sans', 'sans-serif']
 
-# รายชื่อบอส (หัวตาราง)
-days_cols = ["ลูดี้", "ไอลีน", "ราเชล", "เดลโลน", "เจฟ", "สไปร์ค", "คริส"]
+# รายชื่อบอส (หัวตาราง) -> กำหนดไว้ที่ guild_config.py
+days_cols = guild_config.DAYS_COLS
 
 # ==========================================
 # 2. GOOGLE SHEETS CONNECTION FUNCTIONS
 # ==========================================
-@st.cache_resource
+# ยังไม่มี credentials -> คืน None โดยไม่ cache (ใส่ secrets แล้วเชื่อมได้เลยไม่ต้อง restart)
 def get_gsheet_client():
     if "gcp_service_account" not in st.secrets:
         st.error("ไม่พบข้อมูล 'gcp_service_account' ใน secrets.toml")
         return None
-    
+    return _authorize_gsheet_client()
+
+@st.cache_resource
+def _authorize_gsheet_client():
     scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scope)
     client = gspread.authorize(creds)
     return client
 
-def load_data_from_gsheet(sheet_url, worksheet_name):
+def get_sheet_connection():
+    client = get_gsheet_client()
+    if not client: return None
+    return _sheet_connection(client)
+
+@st.cache_resource
+def _sheet_connection(_client):
+    return SheetConnection(_client)
+
+@st.cache_resource
+def get_local_store():
+    return LocalStore()
+
+def get_sync_worker():
+    # ส่งการแก้ไขในเครื่องขึ้น Sheet เบื้องหลัง (ต้องเชื่อม service account ได้)
+    conn = get_sheet_connection()
+    if not conn: return None
+    return _start_sync_worker(conn)
+
+@st.cache_resource
+def _start_sync_worker(_conn):
+    return SheetSyncWorker(get_local_store(), _conn, days_cols).start()
+
+def sheet_changed_since_local(conn, store, sheet_url, worksheet_name):
+    # revision ของไฟล์ไม่ตรงกับตอนที่เก็บลงเครื่อง -> มีคนแก้ Sheet หลังจากนั้น (เชื่อม Sheet ไม่ได้ = ใช้ของในเครื่องไปก่อน)
+    if conn is None:
+        return False
+    current = conn.revision(sheet_url)
+    return current is not None and current != store.sheet_revision(sheet_url, worksheet_name)
+
+def load_data_from_gsheet(sheet_url, worksheet_name, refresh=False, discard_local=False):
+    # อ่านจาก local store ก่อน (ไม่ต้องรอ Google API) / ยังไม่มีในเครื่อง, Sheet เปลี่ยนไปแล้ว หรือสั่ง refresh -> ดึงจาก Sheet แล้วเก็บลงเครื่อง
+    # discard_local=True: ทิ้งการแก้ในเครื่องที่ยังไม่ซิงก์ (ใช้ตอนเลือกฝั่ง Sheet เมื่อ conflict)
+    store = get_local_store()
+    conn = get_sheet_connection()
+    if not refresh:
+        df = store.load(sheet_url, worksheet_name)
+        if df is not None:
+            if not sheet_changed_since_local(conn, store, sheet_url, worksheet_name):
+                return sheet_sync.normalize_frame(df, days_cols)
+            if store.has_unsynced(sheet_url, worksheet_name):
+                st.warning("⚠️ Google Sheet ถูกแก้หลังโหลดครั้งล่าสุด แต่หน้านี้ยังมีการแก้ไขในเครื่องที่ยังไม่ซิงก์ -> แสดงข้อมูลในเครื่อง (ตอนซิงก์ระบบจะเช็คว่าชนกันหรือไม่)")
+                return sheet_sync.normalize_frame(df, days_cols)
+            st.info("🔄 Google Sheet ถูกแก้หลังโหลดครั้งล่าสุด -> ดึงข้อมูลใหม่")
+            refresh = True
+    elif store.has_unsynced(sheet_url, worksheet_name) and not discard_local:
+        st.warning("⏳ หน้านี้ยังมีการแก้ไขที่ยังไม่ขึ้น Google Sheet รอซิงก์เสร็จก่อนค่อยดึงใหม่ (กันข้อมูลในเครื่องถูกทับ)")
+        return None
+
+    if not conn: return None
     try:
-        client = get_gsheet_client()
-        if not client: return None
-        
-        sh = client.open_by_url(sheet_url)
-        
-        try:
-            worksheet = sh.worksheet(worksheet_name)
-        except:
-            worksheet = sh.add_worksheet(title=worksheet_name, rows="100", cols="20")
-            headers = ["ชื่อสมาชิก"] + days_cols
-            worksheet.append_row(headers)
-            return pd.DataFrame(columns=headers)
-
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        if "ชื่อสมาชิก" not in df.columns:
-            df["ชื่อสมาชิก"] = ""
-        for col in days_cols:
-            if col not in df.columns:
-                df[col] = 0.0
-                
-        df["ชื่อสมาชิก"] = df["ชื่อสมาชิก"].astype(str)
-        for col in days_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
+        if refresh:
+            conn.invalidate(sheet_url, worksheet_name)
+        df, sheet_header, snapshot_rows, sheet_revision = sheet_sync.load_sheet(conn, sheet_url, worksheet_name, days_cols)
+        store.import_remote(sheet_url, worksheet_name, df, sheet_header, snapshot_rows, sheet_revision)
         return df
     except Exception as e:
+        conn.invalidate(sheet_url)
         st.error(f"❌ Error Loading Sheet: {e}")
         return None
 
-def save_data_to_gsheet(sheet_url, worksheet_name, df):
+def list_worksheet_titles(sheet_url):
+    conn = get_sheet_connection()
+    if not conn: return []
     try:
-        client = get_gsheet_client()
-        if not client: return False
-
-        sh = client.open_by_url(sheet_url)
-        try:
-            worksheet = sh.worksheet(worksheet_name)
-        except:
-            worksheet = sh.add_worksheet(title=worksheet_name, rows="100", cols="20")
-
-        export_cols = ["ชื่อสมาชิก"] + days_cols
-        for c in export_cols:
-            if c not in df.columns: df[c] = 0
+        return sheet_history.order_week_titles(conn.worksheet_titles(sheet_url))
+    except Exception as e:
+        conn.invalidate(sheet_url)
+        st.error(f"❌ Error Listing Sheets: {e}")
+        return []
+
+def load_history_from_gsheet(sheet_url, worksheet_names):
+    # โหลดหลายหน้าในครั้งเดียว (values_batch_get) -> long format: สมาชิก / week / boss / damage
+    conn = get_sheet_connection()
+    if not conn: return None
+    try:
+        return sheet_history.fetch_history(conn.spreadsheet(sheet_url), worksheet_names, days_cols)
+    except Exception as e:
+        conn.invalidate(sheet_url)
+        st.error(f"❌ Error Loading History: {e}")
+        return None
 
-        worksheet.clear()
-        worksheet.update([export_cols])
-        
-        val_list = df[export_cols].values.tolist()
-        clean_list = []
-        for row in val_list:
-            clean_row = []
-            for item in row:
-                if isinstance(item, (int, float, np.integer, np.floating)):
-                    clean_row.append(float(item))
-                else:
-                    clean_row.append(str(item))
-            clean_list.append(clean_row)
-            
-        if clean_list:
-            worksheet.update("A2", clean_list)
-            
-        # ใช้ Emoji แทน text เพื่อแก้ error icon="cloud"
-        st.toast("✅ บันทึกข้อมูลลง Google Sheet เรียบร้อย!", icon="☁️")
-        return True
+def save_data_to_gsheet(sheet_url, worksheet_name, df, mode="diff"):
+    # บันทึกลงเครื่องทันที แล้ว sync worker ส่งขึ้น Sheet เบื้องหลัง (Sheet ช้า/เกินโควต้าก็ไม่ต้องรอ)
+    # mode="diff" ส่งเฉพาะเซลล์ที่เปลี่ยนจาก snapshot ล่าสุดบน Sheet / "full" เขียนใหม่ทั้งหน้า
+    try:
+        get_local_store().save(sheet_url, worksheet_name, df, full=(mode != "diff"))
     except Exception as e:
         st.error(f"❌ Error Saving: {e}")
         return False
 
+    worker = get_sync_worker()
+    if worker is None:
+        st.toast("💾 บันทึกในเครื่องแล้ว (ยังเชื่อม Google Sheet ไม่ได้ จะซิงก์เมื่อเชื่อมได้)", icon="💾")
+    else:
+        worker.notify()
+        # ใช้ Emoji แทน text เพื่อแก้ error icon="cloud"
+        st.toast("✅ บันทึกเรียบร้อย! กำลังซิงก์ขึ้น Google Sheet เบื้องหลัง", icon="☁️")
+    return True
+
+SYNC_STATUS_POLL_SECONDS = 3.0
+SYNC_STATUS_LABELS = {
+    "synced": "🟢 ซิงก์แล้ว",
+    "pending": "🟡 รอซิงก์",
+    "syncing": "🔄 กำลังส่ง",
+    "retrying": "🔴 รอลองใหม่",
+    "conflict": "⚠️ ชนกับการแก้บน Sheet",
+}
+
+def _clock(ts):
+    return time.strftime("%H:%M:%S", time.localtime(ts)) if ts else ""
+
+def sync_status_rows(statuses):
+    now = time.time()
+    return [
+        {
+            "หน้า": s["worksheet"],
+            "สถานะ": SYNC_STATUS_LABELS.get(s["status"], s["status"]),
+            "บันทึกที่รอส่ง": s["unsynced_saves"],
+            "ซิงก์ล่าสุด": _clock(s["synced_at"]),
+            "ลองใหม่ในอีก (วินาที)": max(0, round(s["next_attempt"] - now)) if s["status"] == "retrying" and s["next_attempt"] else None,
+            "Error ล่าสุด": s["last_error"] or "",
+        }
+        for s in statuses
+    ]
+
+@st.fragment(run_every=SYNC_STATUS_POLL_SECONDS)
+def render_sync_progress(sheet_url):
+    # แสดงเฉพาะตอนมีหน้าที่รอซิงก์ (poll สถานะจาก store ทุกไม่กี่วินาที ไม่ rerun ทั้งหน้า)
+    store = get_local_store()
+    worker = get_sync_worker()
+    statuses = store.statuses(sheet_url)
+    waiting = sum(1 for s in statuses if s["unsynced_saves"] and s["status"] != "conflict")
+    if worker is None:
+        st.caption(f"💾 มี {waiting} หน้าที่บันทึกไว้ในเครื่อง รอเชื่อม Google Sheet")
+    elif worker.last_error is not None:
+        st.caption(f"🔴 ตัวซิงก์ทำงานผิดพลาด (จะลองใหม่อัตโนมัติ): {worker.last_error}")
+    elif waiting:
+        quota = worker.quota_wait()
+        st.caption(f"☁️ กำลังซิงก์ {waiting} หน้า" + (f" · Sheets API เกินโควต้า พักอีก {quota:.0f} วินาที" if quota else ""))
+    else:
+        st.caption("🟢 ทุกหน้าซิงก์ขึ้น Google Sheet แล้ว")
+    st.dataframe(pd.DataFrame(sync_status_rows(statuses)), use_container_width=True, hide_index=True)
+    if worker is not None and waiting and st.button("🔁 ซิงก์ตอนนี้ (ไม่ต้องรอ retry)"):
+        store.retry_now(sheet_url)
+        worker.notify()
+
+def render_sync_conflict(sheet_url, worksheet_name, current_worksheet):
+    # Sheet ถูกแก้จากที่อื่นระหว่างที่มีการแก้ในเครื่องค้างอยู่ -> ให้ผู้ใช้เลือกฝั่งที่จะเก็บ (worker ไม่เขียนทับเอง)
+    st.error(f"⚠️ หน้า '{worksheet_name}': Google Sheet ถูกแก้จากที่อื่นหลังโหลดครั้งล่าสุด การแก้ในเครื่องจึงยังไม่ถูกส่ง")
+    c1, c2 = st.columns(2)
+    with c1:
+        use_remote = st.button("📥 ใช้ข้อมูลบน Google Sheet (ทิ้งการแก้ในเครื่อง)", key=f"conflict_remote_{worksheet_name}")
+    with c2:
+        use_local = st.button("📤 เขียนทับ Google Sheet ด้วยข้อมูลในเครื่อง", key=f"conflict_local_{worksheet_name}")
+    if use_remote:
+        df = load_data_from_gsheet(sheet_url, worksheet_name, refresh=True, discard_local=True)
+        if df is not None:
+            if worksheet_name == current_worksheet:
+                st.session_state.main_df = df
+            st.rerun()
+    if use_local:
+        conn = get_sheet_connection()
+        get_local_store().resolve_conflict(sheet_url, worksheet_name, conn.revision(sheet_url) if conn else None)
+        worker = get_sync_worker()
+        if worker is not None:
+            worker.notify()
+        st.rerun()
+
+def render_sync_status(sheet_url, current_worksheet=None):
+    statuses = get_local_store().statuses(sheet_url)
+    if not statuses:
+        return
+    for s in statuses:
+        if s["status"] == "conflict":
+            render_sync_conflict(sheet_url, s["worksheet"], current_worksheet)
+    if any(s["unsynced_saves"] for s in statuses):
+        render_sync_progress(sheet_url)
+    else:
+        st.caption(f"🟢 ซิงก์ขึ้น Google Sheet แล้ว (ล่าสุด {_clock(max(s['synced_at'] or 0 for s in statuses))})")
+
 # ==========================================
 # 3. EASYOCR SETUP
 # ==========================================
+READER_WAIT_SECONDS = 90
+
+@st.cache_resource
+def get_reader_warmup():
+    # เริ่มโหลดโมเดลเบื้องหลังตั้งแต่เปิดแอป แต่ไม่บล็อกหน้า Dashboard
+    return ocr_pipeline.ReaderWarmup(ocr_pipeline.OCR_LANGS).start()
+
+get_reader_warmup()
+
+@st.cache_resource
+def get_ocr_cache():
+    return ocr_cache.OcrResultCache()
+
+@st.cache_resource
+def get_roi_templates():
+    return ocr_preprocess.load_templates()
+
+@st.cache_resource
+def get_engine_slot():
+    return {"engine": None, "lock": threading.Lock()}
+
+def get_scan_engine(workers, roi_template, reader):
+    # engine ตัวเดียวทั้ง process: workers > 1 แต่ละ process ในตัว pool โหลดโมเดล EasyOCR ของตัวเอง
+    # เปลี่ยนจำนวน workers -> สั่งปิด engine เดิม (pool ปิดจริงเมื่อ session อื่นสแกนเสร็จ) / เปลี่ยน template -> ใช้ pool เดิม (with_preprocess)
+    slot = get_engine_slot()
+    with slot["lock"]:
+        engine = slot["engine"]
+        if engine is None or engine.workers != workers or engine.reader is not reader:
+            if engine is not None:
+                engine.shutdown(wait=False)
+            engine = ocr_pipeline.ScanEngine(reader=reader, workers=workers, cache=get_ocr_cache())
+            slot["engine"] = engine
+    return engine.with_preprocess(get_roi_templates().get(roi_template))
+
+def wait_for_reader():
+    warmup = get_reader_warmup()
+    with st.spinner("⏳ รอโมเดล OCR โหลดให้เสร็จ..."):
+        return warmup.wait(READER_WAIT_SECONDS)
+
+def acquire_scan_engine(workers, roi_template=ocr_preprocess.NO_PREPROCESS):
+    if workers > 1:
+        return get_scan_engine(workers, roi_template, None)
+    reader = wait_for_reader()
+    if reader is None:
+        return None
+    return get_scan_engine(workers, roi_template, reader)
+
+def render_ocr_status():
+    warmup = get_reader_warmup()
+    status = warmup.status()
+    if status == "ready":
+        st.caption(f"🟢 OCR พร้อมใช้งาน (โหลดโมเดล {warmup.load_seconds:.1f} วินาที)")
+    elif status == "error":
+        st.error(f"❌ โหลดโมเดล OCR ไม่สำเร็จ: {warmup.error}")
+    else:
+        st.caption("🟡 กำลังโหลดโมเดล OCR อยู่เบื้องหลัง... (กดสแกนได้เลย ระบบจะรอให้พร้อมก่อน)")
+
+@st.cache_resource(max_entries=4)
+def get_roster_index(names):
+    # สร้าง index ครั้งเดียวต่อรายชื่อชุดหนึ่ง ใช้ร่วมกันทั้งตอนสแกนและ dropdown ยืนยันชื่อ
+    return RosterIndex(names)
+
 @st.cache_resource
-def load_reader():
-    return easyocr.Reader(['th', 'en'])
+def get_alias_store():
+    return AliasStore()
 
-reader = load_reader()
+def current_roster_index():
+    return get_roster_index(tuple(str(x) for x in st.session_state.main_df["ชื่อสมาชิก"].tolist()))
+
+def current_roster_view():
+    # view ของตารางแก้ไข สร้างใหม่เมื่อ main_df เปลี่ยนตัว (โหลด/เพิ่มแถว) หรือถูกทิ้งหลังแก้แบบ in-place
+    view = st.session_state.get("roster_view")
+    if view is None or not view.is_current(st.session_state.main_df):
+        view = RosterView(st.session_state.main_df, days_cols)
+        st.session_state.roster_view = view
+    return view
+
+def invalidate_roster_view():
+    st.session_state.roster_view = None
 
 # ==========================================
 # 4. SESSION STATE INITIALIZATION
@@ -141,6 +342,18 @@ if 'pending_new_members' not in st.session_state:
     st.session_state.pending_new_members = []
 if 'scan_target_boss' not in st.session_state: 
     st.session_state.scan_target_boss = None
+if 'history_df' not in st.session_state:
+    st.session_state.history_df = None
+if 'history_frames' not in st.session_state:
+    st.session_state.history_frames = []
+if 'history_titles' not in st.session_state:
+    st.session_state.history_titles = []
+if 'ocr_debug_rows' not in st.session_state:
+    st.session_state.ocr_debug_rows = []
+if 'scan_job' not in st.session_state:
+    st.session_state.scan_job = None
+if 'scan_summary' not in st.session_state:
+    st.session_state.scan_summary = None
 
 if 'sheet_url' not in st.session_state: 
     if "sheet_config" in st.secrets and "spreadsheet_url" in st.secrets["sheet_config"]:
@@ -151,6 +364,14 @@ if 'sheet_url' not in st.session_state:
 if 'current_sheet_id' not in st.session_state: 
     st.session_state.current_sheet_id = "1"
 
+if 'local_restored' not in st.session_state:
+    # session ใหม่ (รีเฟรชหน้า / หลุดการเชื่อมต่อ) -> ดึงหน้าล่าสุดที่บันทึกไว้ในเครื่องกลับมา ไม่ต้องรอ Sheet
+    st.session_state.local_restored = True
+    if st.session_state.sheet_url and st.session_state.main_df.empty:
+        restored = get_local_store().load(st.session_state.sheet_url, st.session_state.current_sheet_id)
+        if restored is not None:
+            st.session_state.main_df = sheet_sync.normalize_frame(restored, days_cols)
+
 # ==========================================
 # 5. TAB 1: DASHBOARD
 # ==========================================
@@ -171,8 +392,10 @@ def render_dashboard_tab():
     with col_c2:
         st.write("") 
         st.write("") 
-        if st.button("📥 โหลดข้อมูล (Load)", type="primary", use_container_width=True):
-            df = load_data_from_gsheet(st.session_state.sheet_url, target_sheet_name)
+        load_clicked = st.button("📥 โหลดข้อมูล (Load)", type="primary", use_container_width=True)
+        refresh = st.checkbox("ดึงใหม่จาก Google Sheet (ไม่ใช้ข้อมูลในเครื่อง)", value=False)
+        if load_clicked:
+            df = load_data_from_gsheet(st.session_state.sheet_url, target_sheet_name, refresh=refresh)
             if df is not None:
                 st.session_state.main_df = df
                 st.success(f"โหลดข้อมูลจากหน้า '{target_sheet_name}' สำเร็จ")
@@ -188,32 +411,59 @@ def render_dashboard_tab():
     with c_f1: search_term = st.text_input("🔍 ค้นหาชื่อ:", placeholder="พิมพ์ชื่อ...")
     with c_f2: filter_zero = st.checkbox("⚠️ แสดงเฉพาะ 0")
 
-    display_df = st.session_state.main_df.copy()
-    if search_term:
-        display_df = display_df[display_df['ชื่อสมาชิก'].astype(str).str.contains(search_term, case=False, na=False)]
-    if filter_zero:
-        display_df = display_df[display_df[days_cols].eq(0).any(axis=1)]
+    view = current_roster_view()
+    positions = view.matches(search_term, filter_zero)
+
+    # คำค้น/ตัวกรองเปลี่ยน -> กลับไปหน้าแรก
+    if st.session_state.get("editor_filter") != (search_term, filter_zero):
+        st.session_state.editor_filter = (search_term, filter_zero)
+        st.session_state.editor_page = 1
+
+    c_p1, c_p2, c_p3 = st.columns([1, 1, 2])
+    with c_p1:
+        page_size = st.selectbox("แถวต่อหน้า", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key="editor_page_size")
+    page_count = max(1, -(-len(positions) // page_size))
+    st.session_state.editor_page = min(max(1, st.session_state.get("editor_page", 1)), page_count)
+    with c_p2:
+        page = st.number_input(f"หน้า (จาก {page_count})", min_value=1, max_value=page_count, step=1, key="editor_page")
+    page_df = view.page(positions, page - 1, page_size)
+    with c_p3:
+        st.write("")
+        first = (page - 1) * page_size
+        if len(positions):
+            st.caption(f"แสดงแถว {first + 1}-{first + len(page_df)} จาก {len(positions)} แถวที่ตรงเงื่อนไข (ทั้งหมด {len(view)} แถว)")
+        else:
+            st.caption(f"ไม่พบแถวที่ตรงเงื่อนไข (ทั้งหมด {len(view)} แถว)")
 
     column_config = {"ชื่อสมาชิก": st.column_config.TextColumn("ชื่อสมาชิก", width="medium")}
     for col in days_cols: column_config[col] = st.column_config.NumberColumn(col, format="%d")
 
+    # ส่งเข้า editor แค่หน้าปัจจุบัน แล้วเขียนกลับเฉพาะแถวที่แก้ตาม row id (ไม่ copy/update ทั้งตาราง)
     edited_df = st.data_editor(
-        display_df,
+        page_df,
         column_config=column_config,
         num_rows="dynamic",
         use_container_width=True,
-        key="main_editor",
+        key=f"main_editor_{page}",
         height=400
     )
-
-    if not search_term and not filter_zero:
-        st.session_state.main_df = edited_df
-    else:
-        st.session_state.main_df.update(edited_df)
+    view.write_back(page_df, edited_df)
+    st.session_state.main_df = view.df
 
     st.write("")
-    if st.button("💾 บันทึกการแก้ไขลง Google Sheet (Save & Sync)", type="primary"):
-        save_data_to_gsheet(st.session_state.sheet_url, st.session_state.current_sheet_id, st.session_state.main_df)
+    c_s1, c_s2 = st.columns([2, 3])
+    with c_s1:
+        save_clicked = st.button("💾 บันทึกการแก้ไขลง Google Sheet (Save & Sync)", type="primary")
+    with c_s2:
+        full_rewrite = st.checkbox("เขียนใหม่ทั้งหน้า (ปิด = ส่งเฉพาะเซลล์ที่แก้)", value=False)
+    if save_clicked:
+        save_data_to_gsheet(
+            st.session_state.sheet_url,
+            st.session_state.current_sheet_id,
+            st.session_state.main_df,
+            mode="full" if full_rewrite else "diff",
+        )
+    render_sync_status(st.session_state.sheet_url, st.session_state.current_sheet_id)
 
     st.divider()
     st.subheader("📈 เปรียบเทียบพัฒนาการ (Compare)")
@@ -232,31 +482,71 @@ def render_dashboard_tab():
 
     df_growth_export = None
     if st.session_state.prev_df is not None:
-        curr = st.session_state.main_df.copy()
-        prev = st.session_state.prev_df.copy()
-        curr["Total"] = curr[days_cols].sum(axis=1)
-        prev["Total"] = prev[days_cols].sum(axis=1)
-        
-        growth = pd.merge(curr[["ชื่อสมาชิก", "Total"]], prev[["ชื่อสมาชิก", "Total"]], on="ชื่อสมาชิก", how="left", suffixes=("_Cur", "_Prev"))
-        growth["Total_Prev"] = growth["Total_Prev"].fillna(0)
-        growth["Diff"] = growth["Total_Cur"] - growth["Total_Prev"]
+        # คำนวณผ่าน analytics engine (memo ตาม hash ของข้อมูล) rerun ที่ข้อมูลไม่เปลี่ยนจะไม่คำนวณซ้ำ
+        report = guild_analytics.analyze(
+            [("prev", st.session_state.prev_df), ("cur", st.session_state.main_df)], days_cols
+        )
+        growth = report["summary"]
         
         # แก้ไข format เพื่อไม่ให้ error กับ string column (ValueError fixed)
         st.dataframe(
             growth.sort_values("Diff", ascending=False).style.format({
                 "Total_Cur": "{:,.0f}", 
                 "Total_Prev": "{:,.0f}", 
-                "Diff": "{:+,.0f}"
+                "Diff": "{:+,.0f}",
+                f"Avg_{guild_analytics.DEFAULT_ROLLING_WINDOW}W": "{:,.0f}",
             }), 
             use_container_width=True, 
             hide_index=True
         )
         df_growth_export = growth
 
+    with st.expander("📚 ประวัติย้อนหลังหลายสัปดาห์ (History)"):
+        if st.button("🔄 ดึงรายชื่อหน้าทั้งหมด"):
+            st.session_state.history_titles = list_worksheet_titles(st.session_state.sheet_url)
+        if st.session_state.history_titles:
+            selected_weeks = st.multiselect(
+                "เลือกหน้า (สัปดาห์) ที่จะโหลด:",
+                st.session_state.history_titles,
+                default=st.session_state.history_titles[-12:],
+            )
+            if st.button("📥 โหลดประวัติ (ครั้งเดียวทุกหน้า)"):
+                history = load_history_from_gsheet(st.session_state.sheet_url, selected_weeks)
+                if history is not None:
+                    st.session_state.history_df = history
+                    st.session_state.history_frames = guild_analytics.frames_from_long(history, days_cols)
+                    st.success(f"โหลดประวัติ {len(selected_weeks)} สัปดาห์เรียบร้อย")
+        if st.session_state.history_frames:
+            # สัปดาห์ปัจจุบันใช้ข้อมูลในตาราง (รวมที่แก้ไขแล้วแต่ยังไม่ Save) แทนค่าบน Sheet
+            current_label = str(st.session_state.current_sheet_id)
+            frames = [f for f in st.session_state.history_frames if f[0] != current_label]
+            frames.append((current_label, st.session_state.main_df))
+            report = guild_analytics.analyze(frames, days_cols)
+
+            st.caption("ยอดรวมรายสัปดาห์")
+            st.dataframe(report["weekly"].style.format("{:,.0f}", na_rep="-"), use_container_width=True)
+            st.caption("สรุปสัปดาห์ล่าสุด (ต่ำกว่าเส้น = จำนวนบอสที่ดาเมจต่ำกว่า 2.5M / 1.5M)")
+            st.dataframe(
+                report["summary"].sort_values("Total_Cur", ascending=False).style.format({
+                    "Total_Cur": "{:,.0f}",
+                    "Total_Prev": "{:,.0f}",
+                    "Diff": "{:+,.0f}",
+                    f"Avg_{guild_analytics.DEFAULT_ROLLING_WINDOW}W": "{:,.0f}",
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption("Percentile ดาเมจต่อบอส (สัปดาห์ล่าสุด)")
+            st.dataframe(report["percentiles"].style.format("{:,.0f}"), use_container_width=True)
+
     st.divider()
     if st.button("🖼️ สร้างกราฟและดาวน์โหลด (ZIP Images Only)"):
         generate_and_download_images(df_growth_export)
 
+@st.cache_resource
+def get_chart_cache():
+    return chart_service.ChartCache()
+
 def generate_and_download_images(growth_df=None):
     df = st.session_state.main_df.copy()
     # กรองแถวว่างออกก่อนสร้างกราฟ
@@ -267,197 +557,214 @@ def generate_and_download_images(growth_df=None):
         return
 
     df["Total Damage"] = df[days_cols].sum(axis=1)
-    
-    # --- Graph 1: Ranking (Total) ---
-    df_sorted = df.sort_values("Total Damage", ascending=True)
-    fig1, ax1 = plt.subplots(figsize=(10, max(5, len(df) * 0.45)))
-    bars = ax1.barh(df_sorted["ชื่อสมาชิก"].astype(str), df_sorted["Total Damage"], color='#2196F3', zorder=3)
-    ax1.set_title(f"Ranking: {st.session_state.guild_name}", fontsize=14, fontweight='bold')
-    ax1.set_xticks([]) # Remove x-axis numbers as requested
-    # ax1.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
-    # ax1.xaxis.set_major_locator(ticker.MultipleLocator(1000000)) # 1M Interval
-    # ax1.grid(axis='x', linestyle='--', alpha=0.6, zorder=0) # Removed grid lines as requested
-    
-    for bar in bars:
-        width = bar.get_width()
-        ax1.text(width * 1.01, bar.get_y() + bar.get_height()/2, f' {width:,.0f}', va='center', fontsize=9)
-    plt.tight_layout()
-
-    # --- Graph 2: Breakdown (GROUPED BAR - แบบเก่า) ---
-    # เปลี่ยน Logic กลับมาเป็นแบบแยกแท่ง (Side-by-side)
-    fig2, ax2 = plt.subplots(figsize=(16, 8))
-    df_desc = df.sort_values("Total Damage", ascending=False)
-    
-    x = np.arange(len(df_desc))
-    width = 0.1  # ความกว้างของแท่งแต่ละบอส
-    colors = ['#FF5733', '#FFC300', '#DAF7A6', '#33FF57', '#3380FF', '#FF33A8', '#8D33FF']
-    
-    # วนลูปสร้างกราฟแท่งทีละบอส โดยขยับแกน x ไปทีละนิด
-    for i, day in enumerate(days_cols):
-        ax2.bar(x + (i * width), df_desc[day], width, label=day, color=colors[i], zorder=3)
-
-    # เพิ่มเส้นคั่นระหว่างคน (Separator Lines)
-    for i in range(len(df_desc) - 1):
-        ax2.axvline(x=i + 0.85, color='gray', linestyle=':', alpha=0.5, zorder=1)
-    
-    # จัดตำแหน่งชื่อสมาชิกให้อยู่กึ่งกลางกลุ่มแท่งกราฟ     # (มี 7 บอส กึ่งกลางคือช่องที่ 3.5 -> width * 3)
-    ax2.set_xticks(x + (width * 3))
-    ax2.set_xticklabels(df_desc["ชื่อสมาชิก"].astype(str), rotation=45, ha='right', fontsize=10)
-
-    # เพิ่มเส้นเกณฑ์ (Threshold Lines) แบบเก่า
-    ax2.axhline(y=2500000, color='red', linestyle='--', linewidth=1.5, label="2.5M กายภาพ", zorder=4)
-    ax2.axhline(y=1500000, color='#00BFFF', linestyle='--', linewidth=1.5, label="1.5M เวทย์", zorder=4)
 
-    ax2.set_title(f"Damage Breakdown: {st.session_state.guild_name}", fontsize=14, fontweight='bold')
-    ax2.legend()
-    ax2.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
-    ax2.yaxis.set_major_locator(ticker.MultipleLocator(1000000)) # 1M Interval
-    ax2.grid(axis='y', linestyle='--', alpha=0.6, zorder=0)
-    plt.tight_layout()
+    # วาดครั้งเดียวต่อข้อมูลชุดหนึ่ง (figure ถูกปิดทันทีหลังเรนเดอร์) แล้วใช้ PNG เดียวกันทั้ง ZIP และ Preview
+    with perf_stats.stage("chart.render_charts"):
+        pngs = chart_service.render_charts(df, st.session_state.guild_name, days_cols, cache=get_chart_cache())
 
     # --- ZIP Creation ---
     zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "a", zipfile.ZIP_DEFLATED, False) as z:
-        img1 = io.BytesIO(); fig1.savefig(img1, format='png'); z.writestr("Rank_Graph.png", img1.getvalue())
-        img2 = io.BytesIO(); fig2.savefig(img2, format='png'); z.writestr("Weekly_Graph.png", img2.getvalue())
+    with perf_stats.stage("chart.zip") as timer:
+        with zipfile.ZipFile(zip_buf, "a", zipfile.ZIP_DEFLATED, False) as z:
+            for fname, data in pngs.items():
+                z.writestr(fname, data)
+        timer.add_bytes(zip_buf.tell())
     
     st.write("### Preview:")
-    st.pyplot(fig1)
-    st.pyplot(fig2)
+    for data in pngs.values():
+        st.image(data, use_container_width=True)
     st.download_button("💾 Download ZIP", data=zip_buf.getvalue(), file_name="Guild_Graphs.zip", mime="application/zip")
 
 # ==========================================
 # 6. TAB 2: OCR AUTO-FILLER
 # ==========================================
+ROI_COMPARE_SAMPLES = 3
+SCAN_POLL_SECONDS = 1.0
+
+def scan_job_running():
+    job = st.session_state.scan_job
+    return job is not None and job.is_running()
+
+def start_scan_job(engine, scan_inputs, target_boss, roster, ignore_words):
+    # สแกนใน thread เบื้องหลัง ผลแต่ละรูปถูก commit ลง main_df ทันทีที่อ่านเสร็จ (ดู commit_scan_events)
+    st.session_state.scan_target_boss = target_boss
+    st.session_state.pending_new_members = []
+    st.session_state.ocr_debug_rows = []
+    st.session_state.scan_summary = {"boss": target_boss, "updated": set(), "alias_hits": 0, "errors": [], "live_rows": []}
+    st.session_state.scan_job = ocr_pipeline.ScanStream(
+        engine, scan_inputs, roster, st.session_state.guild_name,
+        ignore_words=ignore_words, aliases=get_alias_store(),
+    ).start()
+
+def commit_scan_events(events):
+    # ทำงานใน script thread เท่านั้น (thread สแกนไม่แตะ DataFrame) ชื่อใหม่ซ้ำหลายรูปเก็บค่าล่าสุด
+    if not events:
+        return
+    summary = st.session_state.scan_summary
+    pending = {row["ชื่อที่อ่านได้"]: row for row in st.session_state.pending_new_members}
+    for event in events:
+        if event["error"] is not None:
+            summary["errors"].append((event["image"], str(event["error"])))
+            summary["live_rows"].append({"รูป": event["image"], "จับคู่ได้": 0, "ชื่อใหม่": 0, "รายละเอียด": f"❌ {event['error']}"})
+            continue
+        ocr_pipeline.apply_matches(st.session_state.main_df, event["matched"], summary["boss"])
+        invalidate_roster_view()
+        summary["updated"].update(item["name"] for item in event["matched"])
+        summary["alias_hits"] += event["alias_hits"]
+        st.session_state.ocr_debug_rows.extend(event["rows"])
+        for item in event["new_candidates"]:
+            suggestion = item.get("suggestion")
+            pending[item['name']] = {
+                "ชื่อที่อ่านได้": item['name'],
+                "ดาเมจ": item['damage'],
+                "ใกล้เคียง": f"{suggestion[0]} ({suggestion[1]})" if suggestion else "",
+                "จัดการ": "++ สร้างสมาชิกใหม่ ++"
+            }
+        summary["live_rows"].append({
+            "รูป": event["image"],
+            "จับคู่ได้": len(event["matched"]),
+            "ชื่อใหม่": len(event["new_candidates"]),
+            "รายละเอียด": ", ".join(f"{item['name']} {item['damage']:,}" for item in event["matched"]),
+        })
+    st.session_state.pending_new_members = list(pending.values())
+
+@st.fragment(run_every=SCAN_POLL_SECONDS)
+def render_scan_progress():
+    # rerun เฉพาะส่วนนี้ทุกวินาทีระหว่างสแกน -> ตารางผลอัปเดตสด โดยไม่ต้องรันทั้งหน้าใหม่
+    job = st.session_state.scan_job
+    commit_scan_events(job.drain())
+    summary = st.session_state.scan_summary
+    if not job.is_running():
+        st.rerun()  # จบแล้ว รันทั้งหน้าใหม่เพื่อแสดงสรุป + ตารางตรวจชื่อใหม่
+
+    st.progress(
+        job.done / max(1, job.total),
+        text=f"📷 อ่านแล้ว {job.done}/{job.total} รูป · อัปเดตแล้ว {len(summary['updated'])} คน (ช่อง: {summary['boss']})",
+    )
+    if job.status() == "cancelling":
+        st.caption("⏳ กำลังหยุด... รอรูปที่กำลังอ่านอยู่ให้เสร็จ")
+    else:
+        st.button("⛔ ยกเลิกการสแกน", on_click=job.cancel)
+    if summary["live_rows"]:
+        st.dataframe(pd.DataFrame(summary["live_rows"]), use_container_width=True, hide_index=True)
+
+def render_scan_summary():
+    job = st.session_state.scan_job
+    commit_scan_events(job.drain())
+    summary = st.session_state.scan_summary
+    status = job.status()
+
+    if status == "error":
+        st.error(f"❌ สแกนไม่สำเร็จ: {job.error}")
+    elif status == "cancelled":
+        st.info(f"⛔ ยกเลิกแล้ว: อ่านไป {job.done}/{job.total} รูป ผลที่อ่านเสร็จแล้วถูกบันทึกลงตารางเรียบร้อย")
+    for image, error in summary["errors"]:
+        st.error(f"Image {image} Error: {error}")
+    st.success(f"🎉 อัปเดตสมาชิกเดิม {len(summary['updated'])} คน (ลงในช่อง: {summary['boss']})")
+    if summary["alias_hits"]:
+        st.caption(f"🔁 จับคู่จากชื่อที่เคยยืนยันไว้ (Alias) {summary['alias_hits']} รายการ")
+    if len(st.session_state.pending_new_members) > 0:
+        st.warning(f"⚠️ พบรายชื่อใหม่ {len(st.session_state.pending_new_members)} คน กรุณาตรวจสอบด้านล่าง")
+    if summary["live_rows"]:
+        with st.expander(f"📋 ผลรายรูป ({len(summary['live_rows'])} รูป)"):
+            st.dataframe(pd.DataFrame(summary["live_rows"]), use_container_width=True, hide_index=True)
+
+def render_roi_compare(uploaded_images, roi_template, ignore_words):
+    with st.expander(f"🧪 เทียบเวลา OCR / Hit rate: ภาพเต็ม vs {roi_template}"):
+        template = get_roi_templates()[roi_template]
+        st.caption(f"ROI {template.get('roi')} · ขาวดำ {template.get('grayscale')} · ตัวอักษรสูง {template.get('target_text_height')} px (ใช้ {ROI_COMPARE_SAMPLES} รูปแรก ไม่ผ่าน cache)")
+        if st.button("▶️ เริ่มเทียบ"):
+            reader = wait_for_reader()
+            if reader is None:
+                st.warning("⏳ โมเดล OCR ยังโหลดไม่เสร็จ")
+                return
+            with st.spinner("กำลังอ่านทั้งสองแบบ..."):
+                report = ocr_pipeline.compare_preprocess(
+                    reader, [f.getvalue() for f in uploaded_images[:ROI_COMPARE_SAMPLES]],
+                    template, current_roster_index(), st.session_state.guild_name, ignore_words,
+                )
+            st.dataframe(pd.DataFrame(report), use_container_width=True, hide_index=True)
+            before, after = report[0]["ocr_seconds"], report[1]["ocr_seconds"]
+            if after > 0:
+                st.caption(f"⚡ เร็วขึ้น {before / after:.1f} เท่า · hit rate {report[1]['hit_rate']}")
+
 def render_ocr_tab():
     st.header("🤖 OCR Auto-Filler")
     st.caption("ระบบจะอ่านค่าจากรูปภาพและอัปเดตลงตารางชั่วคราว (เมื่อเสร็จแล้ว อย่าลืมกด Save ลง Google Sheet ที่หน้าแรก)")
     
     st.info(f"📁 สมาชิกในระบบปัจจุบัน: {len(st.session_state.main_df)} คน (ข้อมูลนี้รอการบันทึก)")
+    render_ocr_status()
+    cache_placeholder = st.empty()
 
     col1, col2 = st.columns([1, 2])
     with col1:
         selected_boss = st.selectbox("1. เลือกบอสที่จะสแกน", days_cols)
+        scan_workers = st.number_input("⚙️ จำนวน Worker (CPU process)", min_value=1, max_value=max(1, os.cpu_count() or 1), value=1, step=1)
+        roi_template = st.selectbox(
+            "✂️ ROI Template (ตัดเฉพาะกรอบ leaderboard)", list(get_roi_templates().keys()),
+            help="ตัดภาพเฉพาะส่วนตาราง + ขาวดำ + ย่อขนาด ก่อนส่งเข้า OCR (none = ใช้ภาพเต็มแบบเดิม)",
+        )
     with col2:
-        uploaded_images = st.file_uploader("2. อัปโหลดรูป (รองรับหลายไฟล์)", type=['png', 'jpg', 'jpeg'], accept_multiple_files=True)
+        uploaded_images = st.file_uploader(
+            "2. อัปโหลดรูป หรือคลิปอัดหน้าจอ (รองรับหลายไฟล์)",
+            type=['png', 'jpg', 'jpeg'] + [ext.lstrip('.') for ext in scroll_ingest.VIDEO_EXTS],
+            accept_multiple_files=True,
+        )
+        scroll_dedupe = st.checkbox(
+            "🧩 รูปเลื่อนต่อกัน: อ่านเฉพาะส่วนที่ไม่ซ้ำกับรูปก่อนหน้า", value=False,
+            help="อัปโหลดตามลำดับที่เลื่อนลง ระบบจะตัดแถวที่ซ้อนทับกับรูปก่อนหน้าออกก่อนส่ง OCR (คลิปวิดีโอใช้วิธีนี้เสมอ)",
+        )
 
     if uploaded_images:
         st.divider()
-        ignore_words = ["rank", "score", "damage", "total", "guild", "boss", "level", "lv", "name", "point"]
-        if "guild_name" in st.session_state:
-            ignore_words.append(st.session_state.guild_name.lower())
-
-        if st.button("🚀 เริ่มอ่าน (Scan Images)", type="primary"):
-            st.session_state.scan_target_boss = selected_boss
-            target_boss = st.session_state.scan_target_boss
-            
-            all_match_log = []
-            new_candidates = []
-            
-            # แปลงเป็น list string ให้หมด เพื่อความชัวร์ และกรองค่าว่าง (Fix NoneType error)
-            existing_names = [str(x) for x in st.session_state.main_df["ชื่อสมาชิก"].tolist() if str(x).strip() != ""]
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            for idx, img_file in enumerate(uploaded_images):
-                status_text.text(f"Processing image {idx+1}/{len(uploaded_images)}...")
-                try:
-                    image = Image.open(img_file)
-                    img_np = np.array(image)
-                    results = reader.readtext(img_np, adjust_contrast=0.7, text_threshold=0.5, low_text=0.35)
-                    
-                    text_blocks = []
-                    for (bbox, text, prob) in results:
-                        (tl, tr, br, bl) = bbox
-                        center_y = int((tl[1] + bl[1]) / 2)
-                        text_blocks.append({"text": text.strip(), "y": center_y, "x": int(tl[0])})
-
-                    text_blocks.sort(key=lambda k: k['y'])
-                    used_blocks = []
-                    
-                    for i, block_num in enumerate(text_blocks):
-                        num_text = block_num['text']
-                        clean_num = num_text.replace(',', '').replace('.', '')
-                        
-                        if clean_num.isdigit() and len(clean_num) >= 4:
-                            best_name = None
-                            found_name_index = -1
-                            
-                            for j, block_name in enumerate(text_blocks):
-                                if i == j or j in used_blocks: continue
-                                if abs(block_num['y'] - block_name['y']) < 30: 
-                                    if block_name['x'] < block_num['x']:
-                                        raw_name = block_name['text']
-                                        if len(raw_name) < 2: continue
-                                        if raw_name.lower() in ignore_words: continue
-                                        if raw_name.replace(',','').isdigit(): continue
-                                        
-                                        best_name = raw_name
-                                        found_name_index = j
-                                        break
-                            
-                            if best_name:
-                                damage_val = int(clean_num)
-                                used_blocks.append(i)
-                                used_blocks.append(found_name_index)
-                                
-                                # ป้องกัน Error ถ้า list ว่างเปล่า หรือหาไม่เจอ
-                                match_result = None
-                                if existing_names:
-                                    match_result = process.extractOne(best_name, existing_names)
-                                
-                                if match_result:
-                                    match_name, score = match_result
-                                    if score >= 70: 
-                                        all_match_log.append({"name": match_name, "damage": damage_val})
-                                    else:
-                                        if best_name.lower() != st.session_state.guild_name.lower():
-                                            new_candidates.append({"name": best_name, "damage": damage_val})
-                                else:
-                                    # ถ้าไม่มีรายชื่อในระบบเลย ก็ถือเป็นคนใหม่ทันที
-                                    if best_name.lower() != st.session_state.guild_name.lower():
-                                        new_candidates.append({"name": best_name, "damage": damage_val})
-
-                except Exception as e:
-                    st.error(f"Image {idx+1} Error: {e}")
-                
-                progress_bar.progress((idx + 1) / len(uploaded_images))
-
-            status_text.text("✅ Finished!")
-            progress_bar.empty()
-
-            count_update = 0
-            if all_match_log:
-                update_dict = {item['name']: item['damage'] for item in all_match_log}
-                for r_idx, row in st.session_state.main_df.iterrows():
-                    name_key = str(row["ชื่อสมาชิก"])
-                    if name_key in update_dict:
-                        st.session_state.main_df.at[r_idx, target_boss] = update_dict[name_key]
-                        count_update += 1
-            
-            unique_candidates = {}
-            for item in new_candidates:
-                unique_candidates[item['name']] = item['damage']
-            
-            st.session_state.pending_new_members = []
-            for name, dmg in unique_candidates.items():
-                st.session_state.pending_new_members.append({
-                    "ชื่อที่อ่านได้": name,
-                    "ดาเมจ": dmg,
-                    "จัดการ": "++ สร้างสมาชิกใหม่ ++"
-                })
-
-            st.success(f"🎉 อัปเดตสมาชิกเดิม {count_update} คน (ลงในช่อง: {target_boss})")
-            if len(st.session_state.pending_new_members) > 0:
-                st.warning(f"⚠️ พบรายชื่อใหม่ {len(st.session_state.pending_new_members)} คน กรุณาตรวจสอบด้านล่าง")
+        ignore_words = ocr_pipeline.build_ignore_words(st.session_state.get("guild_name"))
+
+        has_video = any(scroll_ingest.is_video(f.name) for f in uploaded_images)
+        use_ingest = scroll_dedupe or has_video
+
+        scan_running = scan_job_running()
+        if st.button("🚀 เริ่มอ่าน (Scan Images)", type="primary", disabled=scan_running):
+            # โหมดตัดส่วนซ้ำ: scroll_ingest ตัด ROI/ย่อภาพเองก่อนหาส่วนซ้อนทับ -> engine ไม่ต้อง preprocess ซ้ำ
+            engine = acquire_scan_engine(int(scan_workers), ocr_preprocess.NO_PREPROCESS if use_ingest else roi_template)
+            if engine is None:
+                st.warning("⏳ โมเดล OCR ยังโหลดไม่เสร็จ ลองกดสแกนใหม่อีกครั้งในอีกสักครู่")
+            else:
+                if use_ingest:
+                    with st.spinner("🧩 กำลังตัดส่วนที่ซ้ำกันออก..."):
+                        scan_inputs, ingest_stats, ingest_errors = scroll_ingest.ingest(
+                            [(f.name, f.getvalue()) for f in uploaded_images], get_roi_templates()[roi_template]
+                        )
+                    for idx, e in ingest_errors:
+                        st.error(f"{uploaded_images[idx].name}: {e}")
+                    st.caption(
+                        f"🧩 {ingest_stats['frames']} ภาพ/เฟรม -> OCR {ingest_stats['strips']} ชิ้น "
+                        f"({ingest_stats['ocr_megapixels']} จาก {ingest_stats['input_megapixels']} ล้านพิกเซล)"
+                    )
+                else:
+                    scan_inputs = [img_file.getvalue() for img_file in uploaded_images]
 
-    if len(st.session_state.pending_new_members) > 0:
+                # RosterIndex แปลงเป็น string และกรองค่าว่างให้แล้ว (Fix NoneType error)
+                start_scan_job(engine, scan_inputs, selected_boss, current_roster_index(), ignore_words)
+
+        still_images = [f for f in uploaded_images if not scroll_ingest.is_video(f.name)]
+        if roi_template != ocr_preprocess.NO_PREPROCESS and still_images:
+            render_roi_compare(still_images, roi_template, ignore_words)
+
+    if st.session_state.scan_job is not None:
+        if scan_job_running():
+            render_scan_progress()
+        else:
+            render_scan_summary()
+
+    if st.session_state.ocr_debug_rows:
+        with st.expander("🔎 Debug: แถวที่ OCR จัดกลุ่มได้ (ตรวจการจับคู่ชื่อ-ดาเมจ)"):
+            st.dataframe(pd.DataFrame(st.session_state.ocr_debug_rows), use_container_width=True, hide_index=True)
+
+    if len(st.session_state.pending_new_members) > 0 and not scan_job_running():
         st.divider()
         st.subheader(f"👤 ตรวจสอบรายชื่อใหม่ (บอส: {st.session_state.scan_target_boss})")
         
-        existing_options = sorted([str(x) for x in st.session_state.main_df["ชื่อสมาชิก"].tolist() if str(x).strip() != ""])
-        dropdown_options = ["++ สร้างสมาชิกใหม่ ++"] + existing_options
+        dropdown_options = ["++ สร้างสมาชิกใหม่ ++"] + current_roster_index().sorted_names
         df_pending = pd.DataFrame(st.session_state.pending_new_members)
         
         edited_pending = st.data_editor(
@@ -465,6 +772,7 @@ def render_ocr_tab():
             column_config={
                 "ชื่อที่อ่านได้": st.column_config.TextColumn("ชื่ออ่านได้", disabled=True),
                 "ดาเมจ": st.column_config.NumberColumn("ดาเมจ", format="%d"),
+                "ใกล้เคียง": st.column_config.TextColumn("ชื่อใกล้เคียง (คะแนน)", disabled=True),
                 "จัดการ": st.column_config.SelectboxColumn("Action", options=dropdown_options, width="large", required=True)
             },
             use_container_width=True,
@@ -475,48 +783,81 @@ def render_ocr_tab():
         c1, c2 = st.columns([1, 4])
         with c1:
             if st.button("✅ ยืนยันข้อมูล", type="primary"):
-                confirmed_boss = st.session_state.scan_target_boss 
-                count_added = 0
-                count_mapped = 0
-                new_rows_to_add = []
-                
-                for _, row in edited_pending.iterrows():
-                    action = row["จัดการ"]
-                    dmg_val = row["ดาเมจ"]
-                    read_name = row["ชื่อที่อ่านได้"]
+                confirmed_boss = st.session_state.scan_target_boss
+                table = RosterTable(st.session_state.main_df, days_cols)
+                updates, inserts, learned_aliases = [], [], []
 
+                for read_name, action, dmg_val in zip(edited_pending["ชื่อที่อ่านได้"], edited_pending["จัดการ"], edited_pending["ดาเมจ"]):
+                    if pd.isna(read_name) or str(read_name).strip() == "":
+                        continue  # แถวว่างที่เพิ่มจาก data_editor
                     if action == "++ สร้างสมาชิกใหม่ ++":
-                        new_row = {"ชื่อสมาชิก": read_name}
-                        for d in days_cols:
-                            new_row[d] = dmg_val if d == confirmed_boss else 0
-                        new_rows_to_add.append(new_row)
-                        count_added += 1
+                        inserts.append((read_name, confirmed_boss, dmg_val))
                     else:
-                        target_name = action
-                        idx_list = st.session_state.main_df.index[st.session_state.main_df['ชื่อสมาชิก'].astype(str) == str(target_name)].tolist()
-                        if idx_list:
-                            st.session_state.main_df.at[idx_list[0], confirmed_boss] = dmg_val
-                            count_mapped += 1
-
-                if new_rows_to_add:
-                    st.session_state.main_df = pd.concat([st.session_state.main_df, pd.DataFrame(new_rows_to_add)], ignore_index=True)
-
+                        updates.append((action, confirmed_boss, dmg_val))
+                        if action in table:
+                            # จำไว้ว่าชื่อที่อ่านผิดนี้คือสมาชิกคนนี้ รอบหน้าจะจับคู่ให้อัตโนมัติ
+                            learned_aliases.append((read_name, action))
+
+                # เขียนทั้งชุดในครั้งเดียว (map ชื่อ -> แถว) แทนการหา index ทีละแถว + concat ทีละครั้ง
+                report = table.apply(updates, inserts)
+                st.session_state.main_df = table.df
+                invalidate_roster_view()
+                # ล้างรายการก่อนบันทึก alias: main_df ถูกแก้ไปแล้ว กดยืนยันซ้ำจะเพิ่มสมาชิกใหม่ซ้ำ
                 st.session_state.pending_new_members = []
-                st.toast(f"จัดการเรียบร้อย (New: {count_added}, Mapped: {count_mapped})", icon="✅")
+                st.session_state.scan_job = None  # ปิดสรุปผลสแกนรอบนี้
+                if learned_aliases:
+                    try:
+                        get_alias_store().record_many(learned_aliases)
+                    except OSError as e:
+                        st.toast(f"บันทึก Alias ไม่สำเร็จ (ตารางอัปเดตแล้ว): {e}", icon="⚠️")
+                st.toast(f"จัดการเรียบร้อย (New: {report['inserted']}, Mapped: {report['updated']})", icon="✅")
+                if report["conflicts"] or report["missing"]:
+                    st.toast(f"⚠️ ค่าซ้ำ/ขัดกัน {report['conflicts']} รายการ (ใช้ค่าล่าสุด) · ไม่พบชื่อในตาราง {report['missing']} รายการ", icon="⚠️")
                 st.success("✅ อัปเดตตารางแล้ว! อย่าลืมกลับไปหน้า Dashboard เพื่อกด Save ลง Google Sheet")
                 st.rerun()
                 
         with c2:
             if st.button("🗑️ ทิ้งรายการนี้"):
                 st.session_state.pending_new_members = []
+                st.session_state.scan_job = None
                 st.rerun()
 
+    cache_stats = get_ocr_cache().stats()
+    cache_placeholder.caption(
+        f"🗃️ OCR Cache: hit {cache_stats['hits']} / miss {cache_stats['misses']} "
+        f"· เก็บไว้ {cache_stats['entries']} รูป ({cache_stats['bytes'] / 1e6:.1f} MB) "
+        f"· 🔁 Alias ที่จำไว้ {len(get_alias_store())} ชื่อ"
+    )
+
     st.divider()
     st.subheader("📝 Preview ข้อมูล (รอ Save)")
     st.dataframe(st.session_state.main_df, use_container_width=True, height=200)
 
 # ==========================================
-# 7. MAIN EXECUTION
+# 7. DIAGNOSTICS (เวลาแต่ละขั้น decode / OCR / จับคู่ / DataFrame / Sheets / กราฟ)
+# ==========================================
+def render_diagnostics():
+    with st.expander("🩺 Diagnostics: เวลาแต่ละขั้นตอน"):
+        collect = st.toggle("เก็บสถิติเวลา (รวมทุก session ในเซิร์ฟเวอร์นี้)", value=perf_stats.enabled())
+        if collect != perf_stats.enabled():
+            perf_stats.set_enabled(collect)
+
+        rows = perf_stats.summary()
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        else:
+            st.caption("ยังไม่มีข้อมูล เปิดเก็บสถิติแล้วลองสแกน / โหลด / บันทึก / สร้างกราฟ")
+
+        c1, c2 = st.columns([1, 1])
+        with c1:
+            st.download_button("💾 Download JSON", data=perf_stats.report_json(), file_name="perf_report.json", mime="application/json")
+        with c2:
+            if st.button("🧹 ล้างสถิติ"):
+                perf_stats.reset()
+                st.rerun()
+
+# ==========================================
+# 8. MAIN EXECUTION
 # ==========================================
 tab1, tab2 = st.tabs(["📊 Dashboard & Google Sheet", "🤖 OCR Auto-Filler"])
 
@@ -525,3 +866,5 @@ with tab1:
 
 with tab2:
     render_ocr_tab()
+
+render_diagnostics()
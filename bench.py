@@ -0,0 +1,331 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+from rapidfuzz import fuzz
+
+import perf_stats
+import sheet_sync
+import ocr_pipeline
+import bench_data
+from guild_config import NAME_COL, DAYS_COLS
+from roster_index import RosterIndex, MATCH_SCORE_THRESHOLD
+from roster_table import RosterTable
+from sheet_connection import SheetConnection
+from fake_gspread import FakeClient
+from local_store import LocalStore
+from sync_worker import SheetSyncWorker
+
+# ==========================================
+# BENCHMARK (ภาพ leaderboard จำลอง -> OCR -> จับคู่ -> เติมตาราง -> Sheets จำลอง) รันแบบ offline บน CPU
+# ==========================================
+#   python bench.py                                  ผลลัพธ์ -> bench_output.txt
+#   python bench.py --roster-sizes 50 500 5000 --pages 10 --json bench.json
+#   python bench.py --ocr easyocr                    ใช้ EasyOCR จริง (ต้องมีโมเดลใน ~/.EasyOCR อยู่แล้ว ไม่ดาวน์โหลด)
+#   python bench.py --save-images shots/             เก็บภาพ + roster.csv + truth.csv ไว้ลองกับ scan_cli.py
+# --ocr synthetic (ค่าเริ่มต้น): readtext คืนผลจำลองจากเฉลย (มีอ่านผิด/ตกหล่นตาม --error-rate)
+#   -> เวลา OCR ที่ได้คือ decode + pipeline ไม่รวมโมเดล แต่ความแม่นยำการจับคู่/fuzzy match วัดได้ครบ
+# seed เดียวกัน = ภาพ / รายชื่อ / noise ชุดเดิมทุกครั้ง
+DEFAULT_ROSTER_SIZES = [50, 500, 2000]
+SHEET_URL = "https://docs.google.com/spreadsheets/d/bench"
+WORKSHEET = "1"
+TARGET_BOSS = DAYS_COLS[0]
+
+
+class OracleReader:
+    # แทน EasyOCR Reader: คืนผลจำลองของภาพนั้น (หาจาก hash ของ pixel หลัง decode)
+    def __init__(self):
+        self._results = {}
+
+    @staticmethod
+    def _key(img_np):
+        return hashlib.blake2b(np.ascontiguousarray(img_np).tobytes(), digest_size=16).hexdigest()
+
+    def add(self, data, results):
+        self._results[self._key(np.array(Image.open(io.BytesIO(data))))] = results
+
+    def readtext(self, img_np, **params):
+        return self._results[self._key(img_np)]
+
+    def readtext_batched(self, images, **params):
+        return [self.readtext(img) for img in images]
+
+
+def load_easyocr():
+    import easyocr
+    return easyocr.Reader(ocr_pipeline.OCR_LANGS, gpu=False, download_enabled=False, verbose=False)
+
+
+def build_case(size, args):
+    rng = np.random.default_rng([args.seed, size])
+    roster_names = bench_data.make_names(size, rng)
+    entries = bench_data.make_leaderboard(roster_names, rng, args.pages * args.rows_per_page, args.outsider_ratio)
+    pages = bench_data.render_leaderboard(entries, rng, args.rows_per_page, args.noise)
+    return {
+        "size": size,
+        "roster_names": roster_names,
+        "frame": bench_data.make_roster_frame(roster_names, rng),
+        "entries": entries,
+        "pages": pages,
+        "synthetic": [bench_data.synthetic_readtext(page, rng, args.error_rate) for page in pages],
+    }
+
+
+def save_case_images(case, out_dir):
+    # โครงสร้างเดียวกับที่ scan_cli.py อ่าน: <out_dir>/<roster>/<บอส>/page_001.png
+    case_dir = os.path.join(out_dir, str(case["size"]))
+    boss_dir = os.path.join(case_dir, TARGET_BOSS)
+    os.makedirs(boss_dir, exist_ok=True)
+    for i, page in enumerate(case["pages"], 1):
+        ext = ".jpg" if page["data"][:3] == b"\xff\xd8\xff" else ".png"
+        with open(os.path.join(boss_dir, f"page_{i:03d}{ext}"), "wb") as f:
+            f.write(page["data"])
+    case["frame"].to_csv(os.path.join(case_dir, "roster.csv"), index=False, encoding="utf-8-sig")
+    pd.DataFrame(case["entries"]).to_csv(os.path.join(case_dir, "truth.csv"), index=False, encoding="utf-8-sig")
+
+
+def bench_ocr(case, reader, args):
+    if isinstance(reader, OracleReader):
+        for page, (results, _) in zip(case["pages"], case["synthetic"]):
+            reader.add(page["data"], results)
+    engine = ocr_pipeline.ScanEngine(reader=reader, workers=1, batch_size=args.batch_size)
+    datas = [page["data"] for page in case["pages"]]
+
+    started = time.perf_counter()
+    with perf_stats.stage("ocr.read_all", sum(len(d) for d in datas)):
+        outputs = engine.read_all(datas)
+    seconds = time.perf_counter() - started
+    engine.shutdown()
+
+    megapixels = sum(page["size"][0] * page["size"][1] for page in case["pages"]) / 1e6
+    row = {
+        "roster": case["size"],
+        "mode": args.ocr,
+        "images": len(datas),
+        "megapixels": round(megapixels, 2),
+        "seconds": round(seconds, 3),
+        "images_per_s": round(len(datas) / seconds, 2) if seconds else None,
+        "errors": sum(1 for _, error in outputs if error is not None),
+    }
+    return outputs, row
+
+
+def bench_pairing(case, outputs, args):
+    # คู่ถูก = ดาเมจตรงกับแถวในเฉลย และชื่อที่จับมาเป็นชื่อของแถวเดียวกัน
+    ignore_words = ocr_pipeline.build_ignore_words(bench_data.GUILD_NAME)
+    all_pairs = []
+    correct = 0
+    truth_rows = 0
+    for page, (results, error), (_, read_names) in zip(case["pages"], outputs, case["synthetic"]):
+        truth_rows += len(page["entries"])
+        if error is not None:
+            continue
+        with perf_stats.stage("ocr.pairing"):
+            pairs = ocr_pipeline.extract_pairs(results, ignore_words)
+        all_pairs.extend(pairs)
+
+        by_damage = {entry["damage"]: (row, entry) for row, entry in enumerate(page["entries"])}
+        for name, damage in pairs:
+            hit = by_damage.get(damage)
+            if hit is None:
+                continue
+            row, entry = hit
+            if args.ocr == "synthetic":
+                correct += name == read_names.get(row)
+            else:
+                correct += fuzz.WRatio(name, entry["name"]) >= MATCH_SCORE_THRESHOLD
+
+    row = {
+        "roster": case["size"],
+        "truth_rows": truth_rows,
+        "pairs": len(all_pairs),
+        "correct": correct,
+        "precision": round(correct / len(all_pairs), 3) if all_pairs else None,
+        "recall": round(correct / truth_rows, 3) if truth_rows else None,
+    }
+    return all_pairs, row
+
+
+def bench_matching(case, all_pairs):
+    truth = {entry["damage"]: entry for entry in case["entries"]}
+
+    started = time.perf_counter()
+    roster = RosterIndex(case["roster_names"])
+    index_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matched, candidates, _ = ocr_pipeline.match_pairs(all_pairs, roster, bench_data.GUILD_NAME)
+    match_seconds = time.perf_counter() - started
+
+    correct = sum(1 for m in matched if truth.get(m["damage"], {}).get("name") == m["name"])
+    false_accept = sum(1 for m in matched if m["damage"] in truth and not truth[m["damage"]]["member"])
+    missed = sum(1 for c in candidates if truth.get(c["damage"], {}).get("member"))
+    members = sum(1 for entry in case["entries"] if entry["member"])
+
+    row = {
+        "roster": case["size"],
+        "names": len(all_pairs),
+        "matched": len(matched),
+        "correct": correct,
+        "wrong_member": len(matched) - correct - false_accept,
+        "false_accept": false_accept,
+        "missed": missed,
+        "precision": round(correct / len(matched), 3) if matched else None,
+        "recall": round(correct / members, 3) if members else None,
+        "index_ms": round(index_seconds * 1000, 2),
+        "match_ms_per_name": round(match_seconds * 1000 / len(all_pairs), 3) if all_pairs else None,
+    }
+    return matched, row
+
+
+def bench_apply(case, matched):
+    frame = case["frame"].copy()
+    started = time.perf_counter()
+    table = RosterTable(frame)
+    report = table.apply([(m["name"], TARGET_BOSS, m["damage"]) for m in matched])
+    seconds = time.perf_counter() - started
+    row = {"roster": case["size"], "seconds": round(seconds, 4), **report}
+    return table.df, row
+
+
+def bench_sheets(case, frame_after, args):
+    # เดินขั้นเดียวกับหน้า Dashboard: Load -> Load ซ้ำ (cache) -> Save ลงเครื่อง -> worker ส่ง diff -> Load ใหม่ -> Save ทั้งหน้า
+    client = FakeClient(latency=args.sheet_latency)
+    export_cols = [NAME_COL] + DAYS_COLS
+    client.spreadsheet(SHEET_URL).seed(WORKSHEET, [export_cols] + sheet_sync.to_sheet_rows(case["frame"], export_cols))
+    conn = SheetConnection(client)
+    store = LocalStore(":memory:")
+    worker = SheetSyncWorker(store, conn, DAYS_COLS)
+    rows = []
+
+    def step(label, fn, cells=None):
+        client.reset_calls()
+        started = time.perf_counter()
+        out = fn()
+        rows.append({
+            "roster": case["size"],
+            "step": label,
+            "seconds": round(time.perf_counter() - started, 4),
+            "api_calls": client.total_calls(),
+            "cells_written": cells(out) if cells else 0,
+            "calls": ", ".join(f"{name}={count}" for name, count in sorted(client.calls.items())),
+        })
+        return out
+
+    def load():
+        return sheet_sync.load_sheet(conn, SHEET_URL, WORKSHEET, DAYS_COLS)
+
+    def last_sync_cells(_):
+        return store.statuses(SHEET_URL)[0]["last_result"]["cells"]
+
+    df, header, snapshot_rows, sheet_revision = step("load (cold)", load)
+    step("load (cached)", load)
+    store.import_remote(SHEET_URL, WORKSHEET, df, header, snapshot_rows, sheet_revision)
+    step("store load", lambda: store.load(SHEET_URL, WORKSHEET))
+    step("store save", lambda: store.save(SHEET_URL, WORKSHEET, frame_after))
+    step("sync push (diff)", lambda: worker.sync_one(SHEET_URL, WORKSHEET), last_sync_cells)
+    reloaded, _, _, _ = step("load (after sync)", load)
+    step("save full", lambda: sheet_sync.save_sheet(conn, SHEET_URL, WORKSHEET, frame_after.copy(), DAYS_COLS, mode="full"), lambda out: out[0]["cells"])
+    store.close()
+
+    round_trip = sheet_sync.to_sheet_rows(reloaded, export_cols) == sheet_sync.to_sheet_rows(frame_after, export_cols)
+    return rows, round_trip
+
+
+def stage_rows(size):
+    return [
+        {"roster": size, **{k: row[k] for k in ("stage", "count", "mean_ms", "p50_ms", "p95_ms", "bytes")}}
+        for row in perf_stats.summary()
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="วัดความเร็ว/ความแม่นยำของ OCR pipeline และการอ่านเขียน Sheets ด้วยข้อมูลจำลอง")
+    parser.add_argument("--roster-sizes", type=int, nargs="+", default=DEFAULT_ROSTER_SIZES, help="ขนาดรายชื่อที่ต้องการวัด")
+    parser.add_argument("--pages", type=int, default=6, help="จำนวนภาพ leaderboard ต่อรอบ (สูงสุด)")
+    parser.add_argument("--rows-per-page", type=int, default=20)
+    parser.add_argument("--outsider-ratio", type=float, default=0.1, help="สัดส่วนคนนอกกิลด์ใน leaderboard")
+    parser.add_argument("--error-rate", type=float, default=0.03, help="โอกาสอ่านตัวอักษรผิดของ OCR จำลอง")
+    parser.add_argument("--noise", type=float, default=6.0, help="noise ของ pixel (ส่วนเบี่ยงเบนมาตรฐาน)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--ocr", choices=["synthetic", "easyocr"], default="synthetic")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--sheet-latency", type=float, default=0.0, help="หน่วงเวลาต่อ API call ของ Sheets จำลอง (วินาที)")
+    parser.add_argument("--out", default="bench_output.txt", help="ไฟล์รายงานแบบข้อความ")
+    parser.add_argument("--json", help="ไฟล์รายงานแบบ JSON")
+    parser.add_argument("--save-images", help="โฟลเดอร์สำหรับเก็บภาพจำลองและเฉลย")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.ocr == "easyocr":
+        try:
+            reader = load_easyocr()
+        except Exception as e:
+            print(f"โหลด EasyOCR แบบ offline ไม่สำเร็จ (ต้องมีโมเดลในเครื่องก่อน): {e}", file=sys.stderr)
+            return 2
+    else:
+        reader = OracleReader()
+
+    perf_stats.set_enabled(True)
+    sections = {"ocr": [], "pairing": [], "matching": [], "apply": [], "sheets": [], "stages": []}
+    round_trips = {}
+
+    for size in args.roster_sizes:
+        perf_stats.reset()
+        case = build_case(size, args)
+        if args.save_images:
+            save_case_images(case, args.save_images)
+
+        outputs, row = bench_ocr(case, reader, args)
+        sections["ocr"].append(row)
+        all_pairs, row = bench_pairing(case, outputs, args)
+        sections["pairing"].append(row)
+        matched, row = bench_matching(case, all_pairs)
+        sections["matching"].append(row)
+        frame_after, row = bench_apply(case, matched)
+        sections["apply"].append(row)
+        rows, round_trips[size] = bench_sheets(case, frame_after, args)
+        sections["sheets"].extend(rows)
+        sections["stages"].extend(stage_rows(size))
+        print(f"roster {size}: {len(case['pages'])} ภาพ / {len(case['entries'])} แถว เสร็จ", file=sys.stderr)
+
+    perf_stats.set_enabled(False)
+
+    lines = [f"bench seed={args.seed} ocr={args.ocr} pages={args.pages} rows/page={args.rows_per_page} error_rate={args.error_rate}"]
+    titles = {
+        "ocr": "OCR throughput",
+        "pairing": "Pairing (ชื่อ -> ดาเมจ)",
+        "matching": "Fuzzy match กับรายชื่อ",
+        "apply": "เขียนผลลง DataFrame (RosterTable)",
+        "sheets": "Google Sheets (จำลอง) จำนวน API call ต่อขั้น",
+        "stages": "เวลาแต่ละขั้น (perf_stats)",
+    }
+    for key, title in titles.items():
+        lines.append("")
+        lines.append(f"== {title} ==")
+        lines.append(pd.DataFrame(sections[key]).fillna("").to_string(index=False))
+    lines.append("")
+    lines.append("round trip (Save แล้ว Load กลับได้ค่าเดิม): " + ", ".join(f"{s}={'OK' if ok else 'FAIL'}" for s, ok in round_trips.items()))
+    text = "\n".join(lines)
+    print(text)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), **sections, "round_trip": round_trips}, f, ensure_ascii=False, indent=2, default=str)
+    return 0 if all(round_trips.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
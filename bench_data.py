@@ -0,0 +1,195 @@
+import io
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFont
+
+from guild_config import NAME_COL, DAYS_COLS
+
+# ==========================================
+# BENCH DATA (สร้างภาพ leaderboard จำลองพร้อมเฉลย ชื่อ/ดาเมจ ทุกแถว)
+# ==========================================
+# ทุกฟังก์ชันรับ rng (np.random.Generator) -> seed เดียวกันได้ภาพ/รายชื่อ/noise ชุดเดิมทุกครั้ง
+# block ในเฉลยเก็บ bbox แบบเดียวกับ EasyOCR ([tl, tr, br, bl]) ใช้สร้างผล readtext จำลองได้โดยไม่ต้องมีโมเดล
+FONT_PATH = "./NotoSansThai-Regular.ttf"
+GUILD_NAME = "MeAndBro"
+PAGE_WIDTH = 1280
+ROW_HEIGHT = 56
+HEADER_HEIGHT = 120
+FONT_SIZE = 26
+
+THAI_SYLLABLES = [
+    "สม", "ชาย", "มณี", "ทอง", "แก้ว", "ศรี", "นภา", "ดาว", "ฟ้า", "ใจ", "กิต", "ติ", "พร", "วัฒ", "นา",
+    "ธนา", "รัตน์", "สุข", "เพชร", "มังกร", "เสือ", "ไฟ", "น้ำ", "ลม", "ดิน", "ขวัญ", "บุญ", "ปิติ", "ชล", "ภู",
+]
+LATIN_PARTS = [
+    "Shadow", "Dark", "Night", "Blade", "Fire", "Ice", "Storm", "Wolf", "Dragon", "Ghost",
+    "Star", "Moon", "Sky", "King", "Lord", "Neo", "Zero", "Kuro", "Ace", "Max", "Bolt", "Lily",
+]
+
+# ตัวอักษรที่ OCR มักอ่านสลับกัน (ใช้ทำ noise ของผล readtext จำลอง)
+LATIN_CONFUSIONS = {"O": "0", "0": "O", "l": "1", "1": "l", "I": "l", "S": "5", "5": "S", "B": "8", "8": "B", "o": "0"}
+THAI_CONFUSIONS = {"ข": "ช", "ช": "ข", "บ": "ป", "ป": "บ", "ด": "ค", "ค": "ด", "ท": "ฑ", "ม": "น"}
+THAI_TONE_MARKS = "่้๊๋์"
+
+
+def _thai_name(rng):
+    return "".join(rng.choice(THAI_SYLLABLES, size=int(rng.integers(2, 4))))
+
+
+def _latin_name(rng):
+    parts = rng.choice(LATIN_PARTS, size=2, replace=False)
+    style = int(rng.integers(0, 4))
+    if style == 0:
+        return f"{parts[0]}{parts[1]}"
+    if style == 1:
+        return f"{parts[0]}_{int(rng.integers(1, 100))}"
+    if style == 2:
+        return f"xX{parts[0]}Xx"
+    return f"{parts[0].lower()}{parts[1]}{int(rng.integers(0, 10))}"
+
+
+def make_names(count, rng, exclude=()):
+    # ชื่อไม่ซ้ำกัน: ไทย ~45% / อังกฤษ ~45% / ผสม ~10%
+    exclude = set(exclude)
+    names = []
+    seen = set()
+    while len(names) < count:
+        kind = rng.random()
+        if kind < 0.45:
+            name = _thai_name(rng)
+        elif kind < 0.9:
+            name = _latin_name(rng)
+        else:
+            name = _thai_name(rng) + rng.choice(LATIN_PARTS)
+        if name in seen or name in exclude:
+            name = f"{name}{int(rng.integers(2, 1000))}"
+            if name in seen or name in exclude:
+                continue
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def make_roster_frame(names, rng, days_cols=DAYS_COLS, zero_ratio=0.3):
+    # ตารางรายชื่อแบบเดียวกับ worksheet (บางช่องยังเป็น 0 = ยังไม่ได้ตี)
+    data = {NAME_COL: list(names)}
+    for col in days_cols:
+        values = rng.integers(100_000, 30_000_000, size=len(names))
+        values[rng.random(len(names)) < zero_ratio] = 0
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def make_leaderboard(roster_names, rng, max_rows, outsider_ratio=0.1):
+    # ผู้เล่นใน leaderboard = สมาชิกบางส่วน + คนนอกกิลด์ (ต้องไม่ถูกจับคู่) เรียงดาเมจมากไปน้อย
+    outsiders = int(round(max_rows * outsider_ratio))
+    members = min(len(roster_names), max_rows - outsiders)
+    picked = list(rng.choice(roster_names, size=members, replace=False)) if members else []
+    extra = make_names(outsiders, rng, exclude=roster_names)
+
+    # ดาเมจไม่ซ้ำกันทั้งชุด -> ใช้ดาเมจเป็น key ตรวจคำตอบได้
+    damages = rng.choice(2_400_000, size=members + outsiders, replace=False) * 37 + 50_000
+    entries = [{"name": str(n), "member": True} for n in picked] + [{"name": n, "member": False} for n in extra]
+    entries = [entries[i] for i in rng.permutation(len(entries))]
+    for entry, damage in zip(entries, sorted(damages.tolist(), reverse=True)):
+        entry["damage"] = int(damage)
+    return entries
+
+
+def _box(draw, xy, text, font):
+    left, top, right, bottom = draw.textbbox(xy, text, font=font)
+    return [[left, top], [right, top], [right, bottom], [left, bottom]]
+
+
+def render_page(entries, rng, first_rank=1, noise=6.0, jpeg_quality=None, font_path=FONT_PATH):
+    # คืนค่า {"data": bytes ของรูป, "blocks": เฉลยทุกข้อความบนภาพ, "entries": แถวในหน้านี้}
+    font = ImageFont.truetype(font_path, FONT_SIZE)
+    title_font = ImageFont.truetype(font_path, FONT_SIZE + 8)
+    height = HEADER_HEIGHT + ROW_HEIGHT * len(entries) + 40
+    background = np.linspace(18, 42, height, dtype=np.float32)[:, None, None] * np.array([1.0, 0.9, 1.3], dtype=np.float32)
+    canvas = np.broadcast_to(background, (height, PAGE_WIDTH, 3))
+    image = Image.fromarray(np.clip(canvas, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+
+    blocks = []
+
+    def put(xy, text, kind, row=None, fnt=font, fill=(235, 235, 235)):
+        draw.text(xy, text, font=fnt, fill=fill)
+        blocks.append({"bbox": _box(draw, xy, text, fnt), "text": text, "kind": kind, "row": row})
+
+    put((40, 20), f"{GUILD_NAME} Guild Boss", "title", fnt=title_font, fill=(250, 210, 120))
+    put((40, 78), "Rank", "header", fill=(170, 170, 190))
+    put((160, 78), "Name", "header", fill=(170, 170, 190))
+    put((PAGE_WIDTH - 200, 78), "Damage", "header", fill=(170, 170, 190))
+
+    for i, entry in enumerate(entries):
+        y = HEADER_HEIGHT + i * ROW_HEIGHT + int(rng.integers(-3, 4))
+        put((48, y), str(first_rank + i), "rank", i)
+        put((160 + int(rng.integers(-6, 7)), y + int(rng.integers(-2, 3))), entry["name"], "name", i)
+        damage_text = f"{entry['damage']:,}"
+        width = draw.textlength(damage_text, font=font)
+        put((PAGE_WIDTH - 60 - width, y + int(rng.integers(-2, 3))), damage_text, "damage", i, fill=(255, 230, 160))
+
+    pixels = np.asarray(image, dtype=np.float32)
+    if noise:
+        pixels = pixels + rng.normal(0.0, noise, size=pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buf = io.BytesIO()
+    if jpeg_quality:
+        image.save(buf, format="JPEG", quality=int(jpeg_quality))
+    else:
+        image.save(buf, format="PNG", compress_level=1)
+    return {"data": buf.getvalue(), "blocks": blocks, "entries": entries, "size": image.size}
+
+
+def render_leaderboard(entries, rng, rows_per_page=20, noise=6.0, jpeg_ratio=0.5):
+    # แบ่งเป็นหลายหน้าเหมือนแคปหน้าจอทีละหน้า (ครึ่งหนึ่งเป็น JPEG คุณภาพต่าง ๆ)
+    pages = []
+    for start in range(0, len(entries), rows_per_page):
+        quality = int(rng.integers(60, 95)) if rng.random() < jpeg_ratio else None
+        pages.append(render_page(entries[start:start + rows_per_page], rng, start + 1, noise, quality))
+    return pages
+
+
+def _misread(text, rng, error_rate):
+    out = []
+    for ch in text:
+        if rng.random() < error_rate:
+            if ch in THAI_TONE_MARKS:
+                continue  # วรรณยุกต์หาย
+            swap = LATIN_CONFUSIONS.get(ch) or THAI_CONFUSIONS.get(ch)
+            if swap:
+                out.append(swap)
+                continue
+        out.append(ch)
+    return "".join(out) or text
+
+
+def _misread_damage(text, rng, error_rate):
+    # ตัวเลขอ่านผิดแบบที่ parse_damage ยังรับได้: , เป็น . หรือ , หาย
+    if rng.random() < error_rate:
+        return text.replace(",", ".", 1)
+    if rng.random() < error_rate:
+        return text.replace(",", "", 1)
+    return text
+
+
+def synthetic_readtext(page, rng, error_rate=0.03, drop_rate=0.01):
+    # ผล readtext จำลองจากเฉลย [(bbox, text, prob)] + ชื่อที่ "อ่านได้" ของแต่ละแถว (ไว้ตรวจการจับคู่)
+    results = []
+    read_names = {}
+    for block in page["blocks"]:
+        if rng.random() < drop_rate:
+            continue  # ข้อความที่ OCR ตรวจไม่เจอ
+        text = block["text"]
+        if block["kind"] == "damage":
+            text = _misread_damage(text, rng, error_rate)
+        elif block["kind"] in ("name", "title", "header"):
+            text = _misread(text, rng, error_rate)
+        if block["kind"] == "name":
+            read_names[block["row"]] = text
+        bbox = [[float(x) + rng.normal(0, 1.0), float(y) + rng.normal(0, 1.0)] for x, y in block["bbox"]]
+        results.append((bbox, text, float(rng.uniform(0.55, 0.99))))
+    return results, read_names
@@ -0,0 +1,145 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.ticker as ticker
+
+import perf_stats
+
+# ==========================================
+# CHART SERVICE (เรนเดอร์กราฟเป็น PNG ครั้งเดียวต่อข้อมูลชุดหนึ่ง แล้วใช้ซ้ำทั้ง Preview และ ZIP)
+# ==========================================
+DEFAULT_THEME = {
+    "name": "default",
+    "rank_color": "#2196F3",
+    "boss_colors": ['#FF5733', '#FFC300', '#DAF7A6', '#33FF57', '#3380FF', '#FF33A8', '#8D33FF'],
+    "physical_line": 'red',
+    "magic_line": '#00BFFF',
+}
+PHYSICAL_LINE = 2500000
+MAGIC_LINE = 1500000
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+CHART_FILES = ("Rank_Graph.png", "Weekly_Graph.png")
+
+
+class ChartCache:
+    # LRU จำกัดขนาดรวมของ PNG (bytes)
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._items[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+
+def chart_key(df, days_cols, guild_name, theme, name_col="ชื่อสมาชิก"):
+    h = hashlib.sha1()
+    h.update(repr((str(guild_name), sorted(theme.items()), list(days_cols))).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df[[name_col] + list(days_cols)], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def render_png(fig):
+    # เรนเดอร์แล้วปิด figure ทันที กันหน่วยความจำโตเรื่อย ๆ บนเซิร์ฟเวอร์ที่รันนาน
+    buf = io.BytesIO()
+    with perf_stats.stage("chart.render_png") as timer:
+        try:
+            fig.savefig(buf, format='png')
+        finally:
+            plt.close(fig)
+        timer.add_bytes(buf.tell())
+    return buf.getvalue()
+
+
+def build_ranking_figure(df, guild_name, theme=DEFAULT_THEME, name_col="ชื่อสมาชิก"):
+    # --- Graph 1: Ranking (Total) ---
+    df_sorted = df.sort_values("Total Damage", ascending=True)
+    fig1, ax1 = plt.subplots(figsize=(10, max(5, len(df) * 0.45)))
+    bars = ax1.barh(df_sorted[name_col].astype(str), df_sorted["Total Damage"], color=theme["rank_color"], zorder=3)
+    ax1.set_title(f"Ranking: {guild_name}", fontsize=14, fontweight='bold')
+    ax1.set_xticks([]) # Remove x-axis numbers as requested
+
+    for bar in bars:
+        width = bar.get_width()
+        ax1.text(width * 1.01, bar.get_y() + bar.get_height()/2, f' {width:,.0f}', va='center', fontsize=9)
+    fig1.tight_layout()
+    return fig1
+
+
+def build_breakdown_figure(df, guild_name, days_cols, theme=DEFAULT_THEME, name_col="ชื่อสมาชิก"):
+    # --- Graph 2: Breakdown (GROUPED BAR - แบบเก่า) ---
+    fig2, ax2 = plt.subplots(figsize=(16, 8))
+    df_desc = df.sort_values("Total Damage", ascending=False)
+
+    x = np.arange(len(df_desc))
+    width = 0.1  # ความกว้างของแท่งแต่ละบอส
+    colors = theme["boss_colors"]
+
+    # วนลูปสร้างกราฟแท่งทีละบอส โดยขยับแกน x ไปทีละนิด
+    for i, day in enumerate(days_cols):
+        ax2.bar(x + (i * width), df_desc[day], width, label=day, color=colors[i % len(colors)], zorder=3)
+
+    # เพิ่มเส้นคั่นระหว่างคน (Separator Lines)
+    for i in range(len(df_desc) - 1):
+        ax2.axvline(x=i + 0.85, color='gray', linestyle=':', alpha=0.5, zorder=1)
+
+    # จัดตำแหน่งชื่อสมาชิกให้อยู่กึ่งกลางกลุ่มแท่งกราฟ     # (มี 7 บอส กึ่งกลางคือช่องที่ 3.5 -> width * 3)
+    ax2.set_xticks(x + (width * 3))
+    ax2.set_xticklabels(df_desc[name_col].astype(str), rotation=45, ha='right', fontsize=10)
+
+    # เพิ่มเส้นเกณฑ์ (Threshold Lines) แบบเก่า
+    ax2.axhline(y=PHYSICAL_LINE, color=theme["physical_line"], linestyle='--', linewidth=1.5, label="2.5M กายภาพ", zorder=4)
+    ax2.axhline(y=MAGIC_LINE, color=theme["magic_line"], linestyle='--', linewidth=1.5, label="1.5M เวทย์", zorder=4)
+
+    ax2.set_title(f"Damage Breakdown: {guild_name}", fontsize=14, fontweight='bold')
+    ax2.legend()
+    ax2.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
+    ax2.yaxis.set_major_locator(ticker.MultipleLocator(1000000)) # 1M Interval
+    ax2.grid(axis='y', linestyle='--', alpha=0.6, zorder=0)
+    fig2.tight_layout()
+    return fig2
+
+
+def render_charts(df, guild_name, days_cols, cache=None, theme=DEFAULT_THEME, name_col="ชื่อสมาชิก"):
+    # คืนค่า {ชื่อไฟล์: PNG bytes} ถ้าข้อมูล/ชื่อกิลด์/ธีมเหมือนเดิม ใช้ของใน cache ไม่ต้องวาดใหม่
+    key = chart_key(df, days_cols, guild_name, theme, name_col)
+    pngs = {}
+    for fname in CHART_FILES:
+        data = cache.get(f"{key}:{fname}") if cache is not None else None
+        if data is None:
+            with perf_stats.stage("chart.build_figure"):
+                if fname == "Rank_Graph.png":
+                    fig = build_ranking_figure(df, guild_name, theme, name_col)
+                else:
+                    fig = build_breakdown_figure(df, guild_name, days_cols, theme, name_col)
+            data = render_png(fig)
+            if cache is not None:
+                cache.put(f"{key}:{fname}", data)
+        pngs[fname] = data
+    return pngs
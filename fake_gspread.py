@@ -0,0 +1,183 @@
+import time
+import threading
+from collections import Counter
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+# ==========================================
+# FAKE GSPREAD (Spreadsheet ในหน่วยความจำ สำหรับ bench / ทดสอบแบบ offline)
+# ==========================================
+# รองรับเฉพาะเมธอดที่แอปเรียกจริง (SheetConnection / sheet_sync / sheet_history)
+# ทุกเมธอดที่เทียบเท่า 1 request ของ Google API นับลง client.calls และหน่วงได้ด้วย latency (วินาที/ครั้ง)
+# ค่าที่อ่านกลับคืนแบบ UNFORMATTED_VALUE: ตัวเลขจำนวนเต็มเป็น int เหมือน Sheets จริง
+
+
+def _unformatted(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _parse_range(range_name):
+    # "A2" / "A2:H10" / "'หน้า 1'!A2:H10" -> (แถว, คอลัมน์) ของมุมซ้ายบน
+    cell = range_name.split("!")[-1].split(":")[0]
+    return a1_to_rowcol(cell)
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows=100, cols=20):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.row_count = int(rows)
+        self.col_count = int(cols)
+        self.cells = []  # list ของแถว (แถว 1 = หัวตาราง)
+
+    def _call(self, name):
+        self.spreadsheet.client._call(name, self.spreadsheet)
+
+    def _write(self, row, col, values):
+        for r, row_values in enumerate(values):
+            target = row - 1 + r
+            while len(self.cells) <= target:
+                self.cells.append([])
+            line = self.cells[target]
+            end = col - 1 + len(row_values)
+            if len(line) < end:
+                line.extend([""] * (end - len(line)))
+            line[col - 1:end] = list(row_values)
+        self.row_count = max(self.row_count, len(self.cells))
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        return [[_unformatted(v) for v in row] for row in self.cells]
+
+    def get_all_records(self):
+        self._call("get_all_records")
+        if not self.cells:
+            return []
+        header = self.cells[0]
+        return [
+            {key: _unformatted(row[i]) if i < len(row) else "" for i, key in enumerate(header)}
+            for row in self.cells[1:]
+        ]
+
+    def append_row(self, values):
+        self._call("append_row")
+        self._write(len(self.cells) + 1, 1, [values])
+
+    def update(self, range_name, values=None):
+        # รองรับทั้ง update(values) และ update("A2", values) แบบที่ sheet_sync ใช้
+        self._call("update")
+        if values is None:
+            range_name, values = "A1", range_name
+        row, col = _parse_range(range_name)
+        self._write(row, col, values)
+
+    def batch_update(self, data):
+        self._call("batch_update")
+        for item in data:
+            row, col = _parse_range(item["range"])
+            self._write(row, col, item["values"])
+
+    def clear(self):
+        self._call("clear")
+        self.cells = []
+
+    def add_rows(self, rows):
+        self._call("add_rows")
+        self.row_count += int(rows)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._call("delete_rows")
+        end_index = start_index if end_index is None else end_index
+        del self.cells[start_index - 1:end_index]
+        self.row_count -= end_index - start_index + 1
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, url):
+        self.client = client
+        self.url = url
+        self._worksheets = {}
+        self.last_update = 0
+
+    def touch(self):
+        self.last_update += 1
+
+    def worksheet(self, title):
+        self.client._call("worksheet")
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.client._call("worksheets")
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.client._call("add_worksheet", self)
+        ws = FakeWorksheet(self, title, rows, cols)
+        self._worksheets[title] = ws
+        return ws
+
+    def get_lastUpdateTime(self):
+        self.client._call("get_lastUpdateTime")
+        return str(self.last_update)
+
+    def values_batch_get(self, ranges, params=None):
+        self.client._call("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title = range_name.split("!")[0].strip("'").replace("''", "'")
+            ws = self._worksheets.get(title)
+            rows = [[_unformatted(v) for v in row] for row in ws.cells] if ws is not None else []
+            value_ranges.append({"range": range_name, "values": rows})
+        return {"valueRanges": value_ranges}
+
+    def seed(self, title, values):
+        # ใส่ข้อมูลตั้งต้นโดยไม่นับเป็น API call
+        ws = self._worksheets.get(title) or FakeWorksheet(self, title, max(100, len(values)), 20)
+        self._worksheets[title] = ws
+        ws.cells = [list(row) for row in values]
+        ws.row_count = max(ws.row_count, len(ws.cells))
+        self.touch()
+        return ws
+
+
+class FakeClient:
+    # ใช้แทน gspread.Client: SheetConnection(FakeClient())
+    WRITE_CALLS = {"append_row", "update", "batch_update", "clear", "add_rows", "delete_rows", "add_worksheet"}
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._spreadsheets = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name, spreadsheet=None):
+        with self._lock:
+            self.calls[name] += 1
+            if spreadsheet is not None and name in self.WRITE_CALLS:
+                spreadsheet.touch()  # ให้ get_lastUpdateTime เปลี่ยนเหมือน Drive modifiedTime
+        if self.latency:
+            time.sleep(self.latency)
+
+    def open_by_url(self, url):
+        self._call("open_by_url")
+        return self.spreadsheet(url)
+
+    def spreadsheet(self, url):
+        # เข้าถึงข้อมูลตรง ๆ (ไม่นับ call) สำหรับเตรียมข้อมูล/ตรวจผล
+        with self._lock:
+            sh = self._spreadsheets.get(url)
+            if sh is None:
+                sh = self._spreadsheets[url] = FakeSpreadsheet(self, url)
+            return sh
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
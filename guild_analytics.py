@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# GUILD ANALYTICS (ประวัติดาเมจเป็น array members x weeks x bosses คำนวณแบบ vectorized)
+# ==========================================
+PHYSICAL_THRESHOLD = 2_500_000  # เส้น 2.5M กายภาพ (เหมือนกราฟ Breakdown)
+MAGIC_THRESHOLD = 1_500_000  # เส้น 1.5M เวทย์
+DEFAULT_ROLLING_WINDOW = 4
+MEMO_MAX_ENTRIES = 16
+
+
+class DamageHistory:
+    # members เรียงตามตัวอักษร -> index ของสมาชิกคงที่ไม่ว่าจะโหลดกี่สัปดาห์/ลำดับไหน
+    def __init__(self, members, weeks, bosses, values, present):
+        self.members = members
+        self.member_index = {name: i for i, name in enumerate(members)}
+        self.weeks = weeks
+        self.bosses = bosses
+        self.values = values  # float64 (M, W, B)
+        self.present = present  # bool (M, W) มีชื่อในสัปดาห์นั้นหรือไม่
+
+    @classmethod
+    def from_frames(cls, frames, bosses, name_col="ชื่อสมาชิก"):
+        # frames: [(ชื่อสัปดาห์, DataFrame แบบกว้าง)] เรียงเก่า -> ใหม่
+        names_per_week = [df[name_col].fillna("").astype(str).str.strip().to_numpy(dtype=object) for _, df in frames]
+        members = sorted(set(np.concatenate(names_per_week)) - {""}) if frames else []
+        member_index = {name: i for i, name in enumerate(members)}
+
+        values = np.zeros((len(members), len(frames), len(bosses)), dtype=np.float64)
+        present = np.zeros((len(members), len(frames)), dtype=bool)
+        for w, ((_, df), names) in enumerate(zip(frames, names_per_week)):
+            mask = names != ""
+            rows = np.array([member_index[n] for n in names[mask]], dtype=np.int64)
+            damage = df[bosses].to_numpy(dtype=np.float64, na_value=0.0)[mask]
+            np.add.at(values[:, w, :], rows, damage)  # ชื่อซ้ำในสัปดาห์เดียวกันรวมกัน
+            present[rows, w] = True
+
+        return cls(members, [str(label) for label, _ in frames], list(bosses), values, present)
+
+    def totals(self):
+        return self.values.sum(axis=2)
+
+    def deltas(self):
+        totals = self.totals()
+        prev = np.zeros_like(totals)
+        prev[:, 1:] = totals[:, :-1]
+        return totals - prev
+
+    def rolling_mean(self, window=DEFAULT_ROLLING_WINDOW):
+        totals = self.totals()
+        csum = np.zeros((totals.shape[0], totals.shape[1] + 1))
+        np.cumsum(totals, axis=1, out=csum[:, 1:])
+        end = np.arange(1, totals.shape[1] + 1)
+        start = np.maximum(0, end - window)
+        return (csum[:, end] - csum[:, start]) / (end - start)
+
+    def boss_percentiles(self, q=(25, 50, 75, 90), week=-1):
+        active = self.values[self.present[:, week], week, :]
+        if active.size == 0:
+            return np.full((len(q), len(self.bosses)), np.nan)
+        return np.percentile(active, q, axis=0)
+
+    def below_threshold(self, threshold, week=-1):
+        return self.values[:, week, :] < threshold
+
+
+def frames_from_long(history, bosses, name_col="ชื่อสมาชิก"):
+    # long (สมาชิก / week / boss / damage) -> [(week, DataFrame แบบกว้าง)]
+    frames = []
+    for week, part in history.groupby("week", observed=True, sort=True):
+        wide = part.pivot_table(index=name_col, columns="boss", values="damage", aggfunc="sum", observed=True)
+        wide = wide.reindex(columns=bosses, fill_value=0).fillna(0).reset_index()
+        wide.columns = [name_col] + list(bosses)
+        frames.append((str(week), wide))
+    return frames
+
+
+def content_hash(frames, bosses, name_col="ชื่อสมาชิก", **params):
+    h = hashlib.sha1()
+    h.update(repr((list(bosses), sorted(params.items()))).encode("utf-8"))
+    for label, df in frames:
+        h.update(str(label).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(df[[name_col] + list(bosses)], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()  # ใช้ร่วมกันทุก session ของ Streamlit (คนละ thread)
+
+def analyze(frames, bosses, name_col="ชื่อสมาชิก", window=DEFAULT_ROLLING_WINDOW):
+    # คำนวณครั้งเดียวต่อข้อมูลชุดหนึ่ง (key = hash ของเนื้อหา) rerun ที่ข้อมูลไม่เปลี่ยนจะได้ผลเดิมทันที
+    key = content_hash(frames, bosses, name_col, window=window)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    # คำนวณนอก lock -> session อื่นไม่ต้องรอ (สองคนคำนวณชุดเดียวกันพร้อมกันได้ผลเหมือนกัน)
+    hist = DamageHistory.from_frames(frames, bosses, name_col)
+    result = _build_report(hist, name_col, window)
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+    return result
+
+
+def _build_report(hist, name_col, window):
+    if not hist.weeks:
+        return {"history": hist, "summary": pd.DataFrame(), "weekly": pd.DataFrame(), "percentiles": pd.DataFrame()}
+
+    totals = hist.totals()
+    current = hist.present[:, -1]  # แสดงเฉพาะคนที่อยู่ในสัปดาห์ล่าสุด (เหมือน merge แบบ left เดิม)
+    summary = pd.DataFrame({
+        name_col: np.array(hist.members, dtype=object),
+        "Total_Cur": totals[:, -1],
+        "Total_Prev": totals[:, -2] if len(hist.weeks) > 1 else 0.0,
+        "Diff": hist.deltas()[:, -1],
+        f"Avg_{window}W": hist.rolling_mean(window)[:, -1],
+        "Below_2.5M": hist.below_threshold(PHYSICAL_THRESHOLD).sum(axis=1),
+        "Below_1.5M": hist.below_threshold(MAGIC_THRESHOLD).sum(axis=1),
+    })[current].reset_index(drop=True)
+
+    weekly = pd.DataFrame(np.where(hist.present, totals, np.nan), index=hist.members, columns=hist.weeks)
+    weekly.index.name = name_col
+
+    q = (25, 50, 75, 90)
+    percentiles = pd.DataFrame(hist.boss_percentiles(q), index=[f"P{p}" for p in q], columns=hist.bosses)
+
+    return {"history": hist, "summary": summary, "weekly": weekly, "percentiles": percentiles}
@@ -0,0 +1,7 @@
+# ==========================================
+# GUILD CONFIG (ค่าที่ใช้ร่วมกันระหว่าง Streamlit / CLI / Service)
+# ==========================================
+NAME_COL = "ชื่อสมาชิก"
+
+# รายชื่อบอส (หัวตาราง)
+DAYS_COLS = ["ลูดี้", "ไอลีน", "ราเชล", "เดลโลน", "เจฟ", "สไปร์ค", "คริส"]
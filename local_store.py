@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+import perf_stats
+
+# ==========================================
+# LOCAL STORE (SQLite ในเครื่อง = ที่อ่าน/เขียนหลัก, Google Sheets ตามหลังผ่าน sync_worker)
+# ==========================================
+# 1 ตารางต่อ worksheet (ชื่อตาราง = hash ของ url + ชื่อหน้า) + ตาราง worksheets เก็บสถานะซิงก์
+# revision เพิ่มทุกครั้งที่ save ในเครื่อง / synced_revision = revision ล่าสุดที่ขึ้น Sheet แล้ว
+# snapshot (header + rows ที่อยู่บน Sheet ล่าสุด) เก็บในไฟล์เดียวกัน -> ปิดแอปแล้วเปิดใหม่ยังส่งแบบ diff ต่อได้
+# sheet_revision = get_lastUpdateTime ของไฟล์ตอนได้ snapshot (ไว้เช็คว่ามีคนแก้ Sheet หลังจากนั้นหรือไม่)
+DEFAULT_STORE_PATH = os.environ.get("LOCAL_STORE_PATH", "guild_store.sqlite3")
+
+STATUS_SYNCED = "synced"
+STATUS_PENDING = "pending"
+STATUS_SYNCING = "syncing"
+STATUS_RETRYING = "retrying"
+STATUS_CONFLICT = "conflict"  # Sheet ถูกแก้จากที่อื่นหลัง snapshot -> ไม่ส่งจนกว่าผู้ใช้เลือกว่าจะเก็บฝั่งไหน
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS worksheets (
+    sheet_url TEXT NOT NULL,
+    worksheet TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    synced_revision INTEGER NOT NULL DEFAULT 0,
+    force_full INTEGER NOT NULL DEFAULT 0,
+    snapshot TEXT,
+    sheet_revision TEXT,
+    status TEXT NOT NULL DEFAULT 'synced',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    last_result TEXT,
+    updated_at REAL,
+    synced_at REAL,
+    PRIMARY KEY (sheet_url, worksheet)
+)
+"""
+
+
+def _table_name(sheet_url, worksheet):
+    digest = hashlib.sha1(f"{sheet_url}\n{worksheet}".encode("utf-8")).hexdigest()[:16]
+    return f"ws_{digest}"
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+class LocalStore:
+    # ใช้ร่วมกันทุก session + sync thread (ผ่าน st.cache_resource) -> ล็อกทุกการเข้าถึง connection
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        # isolation_level=None + BEGIN เอง: DROP/CREATE ตารางอยู่ใน transaction เดียวกับ metadata จริง
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(worksheets)")}
+        if "sheet_revision" not in columns:
+            self._db.execute("ALTER TABLE worksheets ADD COLUMN sheet_revision TEXT")  # ไฟล์ store รุ่นก่อน
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _meta(self, sheet_url, worksheet):
+        row = self._db.execute(
+            "SELECT * FROM worksheets WHERE sheet_url = ? AND worksheet = ?", (sheet_url, worksheet)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _write_table(self, table, df):
+        # แทนที่ทั้งตาราง (เรียกใน _transaction คู่กับ metadata -> ไม่มีสถานะครึ่ง ๆ กลาง ๆ ถ้าเครื่องดับ)
+        # คอลัมน์ไม่กำหนด type -> SQLite เก็บ int/float/str ตามค่าจริง อ่านกลับได้ dtype เดิม
+        columns = ", ".join(_quote(c) for c in df.columns)
+        self._db.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        self._db.execute(f"CREATE TABLE {_quote(table)} ({columns})")
+        if len(df):
+            placeholders = ", ".join("?" * len(df.columns))
+            self._db.executemany(
+                f"INSERT INTO {_quote(table)} VALUES ({placeholders})",
+                df.itertuples(index=False, name=None),
+            )
+
+    def has(self, sheet_url, worksheet):
+        with self._lock:
+            return self._meta(sheet_url, worksheet) is not None
+
+    def load(self, sheet_url, worksheet):
+        # DataFrame ของหน้านั้น (เรียงตามแถวที่บันทึก) หรือ None ถ้ายังไม่เคยโหลด/บันทึกในเครื่อง
+        with perf_stats.stage("store.load"), self._lock:
+            meta = self._meta(sheet_url, worksheet)
+            if meta is None:
+                return None
+            return pd.read_sql_query(f"SELECT * FROM {_quote(meta['table_name'])} ORDER BY rowid", self._db)
+
+    def save(self, sheet_url, worksheet, df, full=False):
+        # บันทึกการแก้ไขในเครื่อง -> revision ใหม่ที่รอซิงก์ (save ซ้ำก่อนซิงก์ = ส่งแค่ค่าล่าสุดครั้งเดียว)
+        table = _table_name(sheet_url, worksheet)
+        now = time.time()
+        with perf_stats.stage("store.save"), self._transaction():
+            self._write_table(table, df)
+            self._db.execute(
+                """
+                INSERT INTO worksheets (sheet_url, worksheet, table_name, revision, force_full, status, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT (sheet_url, worksheet) DO UPDATE SET
+                    revision = revision + 1,
+                    force_full = MAX(force_full, excluded.force_full),
+                    status = CASE WHEN status = 'conflict' THEN status ELSE excluded.status END,
+                    attempts = 0,
+                    next_attempt = 0,
+                    updated_at = excluded.updated_at
+                """,
+                (sheet_url, worksheet, table, int(bool(full)), STATUS_PENDING, now),
+            )
+            return self._meta(sheet_url, worksheet)["revision"]
+
+    def import_remote(self, sheet_url, worksheet, df, header, rows, sheet_revision=None):
+        # ข้อมูลที่เพิ่งโหลดจาก Sheet -> เก็บเป็นสถานะที่ซิงก์แล้ว (ไม่ต้องส่งกลับขึ้นไป / ทิ้งการแก้ที่ค้างหรือ conflict)
+        table = _table_name(sheet_url, worksheet)
+        now = time.time()
+        snapshot = json.dumps({"header": list(header), "rows": rows}, ensure_ascii=False)
+        with self._transaction():
+            self._write_table(table, df)
+            self._db.execute(
+                """
+                INSERT INTO worksheets (sheet_url, worksheet, table_name, revision, synced_revision, snapshot, sheet_revision, status, updated_at, synced_at)
+                VALUES (?, ?, ?, 1, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT (sheet_url, worksheet) DO UPDATE SET
+                    revision = revision + 1,
+                    synced_revision = revision + 1,
+                    force_full = 0,
+                    snapshot = excluded.snapshot,
+                    sheet_revision = excluded.sheet_revision,
+                    status = excluded.status,
+                    attempts = 0,
+                    next_attempt = 0,
+                    last_error = NULL,
+                    updated_at = excluded.updated_at,
+                    synced_at = excluded.synced_at
+                """,
+                (sheet_url, worksheet, table, snapshot, sheet_revision, STATUS_SYNCED, now, now),
+            )
+
+    def has_unsynced(self, sheet_url, worksheet):
+        with self._lock:
+            meta = self._meta(sheet_url, worksheet)
+            return meta is not None and meta["revision"] > meta["synced_revision"]
+
+    def sheet_revision(self, sheet_url, worksheet):
+        with self._lock:
+            meta = self._meta(sheet_url, worksheet)
+            return meta["sheet_revision"] if meta is not None else None
+
+    def pending(self, now=None):
+        # หน้าที่มีการแก้ไขยังไม่ขึ้น Sheet และพ้นเวลารอ retry แล้ว (เก่าสุดก่อน)
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT sheet_url, worksheet FROM worksheets WHERE revision > synced_revision AND next_attempt <= ? AND status != ? ORDER BY updated_at",
+                (now, STATUS_CONFLICT),
+            ).fetchall()
+        return [(row["sheet_url"], row["worksheet"]) for row in rows]
+
+    def checkout(self, sheet_url, worksheet):
+        # อ่านข้อมูล + revision + snapshot ชุดเดียวกัน สำหรับ worker ส่งขึ้น Sheet
+        with self._transaction():
+            meta = self._meta(sheet_url, worksheet)
+            if meta is None or meta["revision"] <= meta["synced_revision"] or meta["status"] == STATUS_CONFLICT:
+                return None
+            df = pd.read_sql_query(f"SELECT * FROM {_quote(meta['table_name'])} ORDER BY rowid", self._db)
+            self._db.execute(
+                "UPDATE worksheets SET status = ? WHERE sheet_url = ? AND worksheet = ?",
+                (STATUS_SYNCING, sheet_url, worksheet),
+            )
+        return {
+            "df": df,
+            "revision": meta["revision"],
+            "snapshot": json.loads(meta["snapshot"]) if meta["snapshot"] else None,
+            "force_full": bool(meta["force_full"]),
+            "sheet_revision": meta["sheet_revision"],
+            "attempts": meta["attempts"],
+        }
+
+    def mark_synced(self, sheet_url, worksheet, revision, header, rows, result, sheet_revision=None):
+        # มีการ save ใหม่ระหว่างส่ง (revision ขยับไปแล้ว) -> ยังเป็น pending ให้รอบถัดไปส่ง diff ส่วนที่เหลือ
+        snapshot = json.dumps({"header": list(header), "rows": rows}, ensure_ascii=False)
+        summary = json.dumps({k: result[k] for k in ("cells", "appended", "deleted") if k in result})
+        with self._transaction():
+            self._db.execute(
+                """
+                UPDATE worksheets SET
+                    synced_revision = ?,
+                    snapshot = ?,
+                    sheet_revision = ?,
+                    force_full = CASE WHEN revision = ? THEN 0 ELSE force_full END,
+                    status = CASE WHEN revision = ? THEN ? ELSE ? END,
+                    attempts = 0,
+                    next_attempt = 0,
+                    last_error = NULL,
+                    last_result = ?,
+                    synced_at = ?
+                WHERE sheet_url = ? AND worksheet = ?
+                """,
+                (revision, snapshot, sheet_revision, revision, revision, STATUS_SYNCED, STATUS_PENDING, summary, time.time(), sheet_url, worksheet),
+            )
+
+    def mark_failed(self, sheet_url, worksheet, error, retry_at):
+        with self._transaction():
+            self._db.execute(
+                """
+                UPDATE worksheets SET status = ?, attempts = attempts + 1, next_attempt = ?, last_error = ?
+                WHERE sheet_url = ? AND worksheet = ?
+                """,
+                (STATUS_RETRYING, retry_at, str(error), sheet_url, worksheet),
+            )
+
+    def mark_conflict(self, sheet_url, worksheet, message):
+        with self._transaction():
+            self._db.execute(
+                "UPDATE worksheets SET status = ?, next_attempt = 0, last_error = ? WHERE sheet_url = ? AND worksheet = ?",
+                (STATUS_CONFLICT, message, sheet_url, worksheet),
+            )
+
+    def resolve_conflict(self, sheet_url, worksheet, sheet_revision):
+        # ผู้ใช้เลือกเขียนทับ Sheet ด้วยข้อมูลในเครื่อง -> ส่งแบบเต็มหน้า โดยยอมรับ revision ปัจจุบันของ Sheet
+        # (เลือกฝั่ง Sheet = import_remote แทน)
+        with self._transaction():
+            self._db.execute(
+                """
+                UPDATE worksheets SET status = ?, force_full = 1, sheet_revision = ?, attempts = 0, next_attempt = 0, last_error = NULL
+                WHERE sheet_url = ? AND worksheet = ? AND status = ?
+                """,
+                (STATUS_PENDING, sheet_revision, sheet_url, worksheet, STATUS_CONFLICT),
+            )
+
+    def retry_now(self, sheet_url=None):
+        # ไม่ต้องรอ backoff (กดซิงก์เองจากหน้าเว็บ)
+        with self._transaction():
+            if sheet_url is None:
+                self._db.execute("UPDATE worksheets SET next_attempt = 0 WHERE revision > synced_revision")
+            else:
+                self._db.execute(
+                    "UPDATE worksheets SET next_attempt = 0 WHERE revision > synced_revision AND sheet_url = ?",
+                    (sheet_url,),
+                )
+
+    def statuses(self, sheet_url=None):
+        query = "SELECT * FROM worksheets"
+        params = ()
+        if sheet_url is not None:
+            query += " WHERE sheet_url = ?"
+            params = (sheet_url,)
+        with self._lock:
+            rows = [dict(row) for row in self._db.execute(query + " ORDER BY worksheet", params).fetchall()]
+        return [
+            {
+                "sheet_url": row["sheet_url"],
+                "worksheet": row["worksheet"],
+                "status": row["status"],
+                "unsynced_saves": row["revision"] - row["synced_revision"],
+                "attempts": row["attempts"],
+                "updated_at": row["updated_at"],
+                "synced_at": row["synced_at"],
+                "next_attempt": row["next_attempt"] or None,
+                "last_error": row["last_error"],
+                "last_result": json.loads(row["last_result"]) if row["last_result"] else None,
+            }
+            for row in rows
+        ]
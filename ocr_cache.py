@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ==========================================
+# OCR RESULT CACHE (เก็บผล readtext ลงดิสก์ ตาม hash ของรูป + พารามิเตอร์)
+# ==========================================
+DEFAULT_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", ".ocr_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _json_default(obj):
+    # bbox จาก EasyOCR เป็น numpy int/float -> แปลงเป็น type ปกติก่อนเขียน JSON
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj)}")
+
+
+class OcrResultCache:
+    # LRU แบบจำกัดขนาดรวม (bytes) ลำดับการใช้งานเก็บใน mtime ของไฟล์ จึงอยู่รอดข้ามการรีสตาร์ท
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> size (เก่าสุดอยู่หน้า)
+        self._total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(data, params):
+        h = hashlib.sha256()
+        h.update(data)
+        h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _load_index(self):
+        entries = []
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(".json"): continue
+            try:
+                st_info = os.stat(os.path.join(self.directory, fname))
+            except OSError:
+                continue
+            entries.append((st_info.st_mtime, fname[:-5], st_info.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _drop(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    results = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def put(self, key, results):
+        payload = json.dumps(results, ensure_ascii=False, default=_json_default).encode("utf-8")
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError:
+                return
+            self._drop(key)
+            self._index[key] = len(payload)
+            self._total_bytes += len(payload)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,99 @@
+import bisect
+
+# ==========================================
+# OCR LAYOUT ENGINE (จัดกลุ่มข้อความเป็นแถว + จับคู่ ชื่อ -> ดาเมจ)
+# ==========================================
+ROW_TOLERANCE = 30  # |dy| < 30px ถือว่าอยู่แถวเดียวกัน
+MIN_DAMAGE_DIGITS = 4
+
+
+def parse_damage(text):
+    clean_num = text.replace(',', '').replace('.', '')
+    if clean_num.isdigit() and len(clean_num) >= MIN_DAMAGE_DIGITS:
+        return int(clean_num)
+    return None
+
+
+def is_name_candidate(text, ignore_words):
+    if len(text) < 2: return False
+    if text.lower() in ignore_words: return False
+    if text.replace(',', '').isdigit(): return False
+    return True
+
+
+class TextLayout:
+    # blocks เรียงตาม y ครั้งเดียว แล้วใช้ bisect หาช่วง y ±tolerance แทนการวนทุก block (O(n log n))
+    def __init__(self, results, row_tolerance=ROW_TOLERANCE):
+        blocks = []
+        for (bbox, text, prob) in results:
+            (tl, tr, br, bl) = bbox
+            center_y = int((tl[1] + bl[1]) / 2)
+            blocks.append({"text": text.strip(), "y": center_y, "x": int(tl[0]), "prob": float(prob)})
+        blocks.sort(key=lambda k: k['y'])
+
+        self.blocks = blocks
+        self.ys = [b['y'] for b in blocks]
+        self.row_tolerance = row_tolerance
+        self.rows = self._group_rows()
+        self.pairs = []  # [(name_index, number_index)]
+
+    def _group_rows(self):
+        # y-band: เริ่มแถวใหม่เมื่อห่างจาก block แรกของแถวเกิน tolerance
+        rows = []
+        anchor_y = None
+        for i, block in enumerate(self.blocks):
+            if anchor_y is None or block['y'] - anchor_y >= self.row_tolerance:
+                rows.append([])
+                anchor_y = block['y']
+            rows[-1].append(i)
+        return [sorted(row, key=lambda i: self.blocks[i]['x']) for row in rows]
+
+    def _window(self, y):
+        lo = bisect.bisect_right(self.ys, y - self.row_tolerance)
+        hi = bisect.bisect_left(self.ys, y + self.row_tolerance)
+        return lo, hi
+
+    def pair(self, ignore_words):
+        # จับคู่ตัวเลขกับชื่อที่อยู่ใกล้ที่สุดทางซ้ายในแถวเดียวกัน (block ที่ใช้แล้วเก็บใน set)
+        ignore_words = set(ignore_words)
+        used_blocks = set()
+        self.pairs = []
+
+        for i, block_num in enumerate(self.blocks):
+            if parse_damage(block_num['text']) is None: continue
+
+            best_index = -1
+            best_key = None
+            lo, hi = self._window(block_num['y'])
+            for j in range(lo, hi):
+                if j == i or j in used_blocks: continue
+                block_name = self.blocks[j]
+                if block_name['x'] >= block_num['x']: continue
+                key = (block_name['x'], -abs(block_num['y'] - block_name['y']))
+                if best_key is not None and key <= best_key: continue
+                if not is_name_candidate(block_name['text'], ignore_words): continue
+                best_index, best_key = j, key
+
+            if best_index != -1:
+                used_blocks.add(i)
+                used_blocks.add(best_index)
+                self.pairs.append((best_index, i))
+
+        return [(self.blocks[n]['text'], parse_damage(self.blocks[d]['text'])) for n, d in self.pairs]
+
+    def rows_table(self):
+        # สรุปแถวสำหรับ debug การจับคู่ผิด (ไม่ต้อง OCR ใหม่)
+        pairs_by_number = {d: n for n, d in self.pairs}
+        table = []
+        for r, row in enumerate(self.rows):
+            paired = [
+                f"{self.blocks[pairs_by_number[i]]['text']} → {self.blocks[i]['text']}"
+                for i in row if i in pairs_by_number
+            ]
+            table.append({
+                "row": r + 1,
+                "y": min(self.blocks[i]['y'] for i in row),
+                "texts": " | ".join(self.blocks[i]['text'] for i in row),
+                "pairs": ", ".join(paired),
+            })
+        return table
@@ -0,0 +1,481 @@
+import io
+import os
+import copy
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+import perf_stats
+from guild_config import NAME_COL
+from ocr_layout import TextLayout
+from ocr_preprocess import load_image, restore_coords, is_noop, compare_templates
+from roster_index import RosterIndex, MATCH_SCORE_THRESHOLD
+from roster_table import RosterTable
+
+# ==========================================
+# OCR SCAN ENGINE (ใช้ร่วมกันระหว่าง Streamlit / CLI / Service)
+# ==========================================
+OCR_LANGS = ['th', 'en']
+READTEXT_PARAMS = {"adjust_contrast": 0.7, "text_threshold": 0.5, "low_text": 0.35}
+IGNORE_WORDS = ["rank", "score", "damage", "total", "guild", "boss", "level", "lv", "name", "point"]
+
+
+def decode_image(data):
+    image = Image.open(io.BytesIO(data))
+    return np.array(image)
+
+
+def prepare_image(data, template=None):
+    # decode + ตัด ROI / ขาวดำ / ย่อ ตาม template -> (numpy array, transform สำหรับคืนพิกัด)
+    with perf_stats.stage("ocr.decode", len(data)):
+        return load_image(data, template)
+
+
+def build_ignore_words(guild_name=None):
+    words = list(IGNORE_WORDS)
+    if guild_name:
+        words.append(guild_name.lower())
+    return words
+
+
+def extract_pairs(results, ignore_words):
+    # แปลงผล readtext [(bbox, text, prob)] -> [(ชื่อ, ดาเมจ)] โดยจับคู่ตัวเลขกับชื่อในแถวเดียวกัน
+    return TextLayout(results).pair(ignore_words)
+
+
+def match_pairs(pairs, roster, guild_name, aliases=None):
+    # roster: RosterIndex (หรือ list ชื่อ) -> จับคู่ชื่อทั้งหมดใน batch เดียว
+    # aliases: AliasStore ถ้าชื่อที่อ่านได้เคยถูกยืนยันไว้ ใช้เลยไม่ต้อง fuzzy
+    if not isinstance(roster, RosterIndex):
+        roster = RosterIndex(roster)
+
+    match_results = [None] * len(pairs)
+    fuzzy_positions = []
+    alias_hits = 0
+    for pos, (best_name, _) in enumerate(pairs):
+        member = aliases.lookup(best_name) if aliases is not None else None
+        if member is not None and member in roster:
+            match_results[pos] = (member, 100)
+            alias_hits += 1
+        else:
+            fuzzy_positions.append(pos)
+
+    with perf_stats.stage("ocr.fuzzy_match"):
+        fuzzy_results = roster.match_batch([pairs[pos][0] for pos in fuzzy_positions])
+    for pos, match_result in zip(fuzzy_positions, fuzzy_results):
+        match_results[pos] = match_result
+
+    matched = []
+    new_candidates = []
+    guild_key = (guild_name or "").lower()
+
+    for (best_name, damage_val), match_result in zip(pairs, match_results):
+        if match_result and match_result[1] >= MATCH_SCORE_THRESHOLD:
+            matched.append({"name": match_result[0], "damage": damage_val})
+        elif best_name.lower() != guild_key:
+            # ถ้าไม่มีรายชื่อในระบบเลย หรือคะแนนต่ำ ก็ถือเป็นคนใหม่ (เก็บชื่อที่ใกล้สุดไว้ช่วยตัดสินใจ)
+            new_candidates.append({"name": best_name, "damage": damage_val, "suggestion": match_result})
+
+    return matched, new_candidates, alias_hits
+
+
+class ReaderWarmup:
+    # โหลด EasyOCR (import torch + โมเดล th/en) ใน thread เบื้องหลัง ไม่บล็อกการเปิดหน้าเว็บ
+    def __init__(self, langs=None):
+        self.langs = langs or OCR_LANGS
+        self.reader = None
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="easyocr-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def _load(self):
+        started = time.monotonic()
+        try:
+            import easyocr
+            self.reader = easyocr.Reader(self.langs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = time.monotonic() - started
+            self._ready.set()
+
+    def status(self):
+        if self._thread is None: return "idle"
+        if not self._ready.is_set(): return "loading"
+        return "error" if self.error is not None else "ready"
+
+    def wait(self, timeout=None):
+        # รอได้ไม่เกิน timeout วินาที -> คืน reader หรือ None ถ้ายังไม่พร้อม/โหลดพัง
+        self.start()
+        self._ready.wait(timeout)
+        return self.reader
+
+
+# --- Worker process (แต่ละ process มี Reader ของตัวเอง) ---
+_worker_reader = None
+
+def _init_ocr_worker(langs, torch_threads):
+    global _worker_reader
+    import easyocr
+    import torch
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    _worker_reader = easyocr.Reader(langs, verbose=False)
+
+def _ocr_in_worker(data, template=None):
+    # คืนเวลา decode / readtext กลับมาด้วย ให้ process หลักบันทึกลง perf_stats (stats ของ worker process ไม่ถูกรวม)
+    started = time.perf_counter()
+    img_np, transform = load_image(data, template)
+    decoded = time.perf_counter()
+    results = restore_coords(_worker_reader.readtext(img_np, **READTEXT_PARAMS), transform)
+    return results, decoded - started, time.perf_counter() - decoded
+
+
+class ScanEngine:
+    # workers <= 1 : ใช้ reader ตัวเดียวใน thread หลัก + decode ล่วงหน้าใน thread pool + ส่ง readtext_batched
+    # workers > 1  : กระจายรูปไปหลาย process (CPU) แต่ละ process โหลด Reader เอง
+    def __init__(self, reader=None, workers=1, batch_size=4, langs=None, cache=None, preprocess=None):
+        self.reader = reader
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.langs = langs or OCR_LANGS
+        self.cache = cache
+        self.preprocess = None if is_noop(preprocess) else dict(preprocess)  # template จาก ocr_preprocess
+        # pool ใช้ร่วมกับทุก engine ที่ได้จาก with_preprocess() -> เปลี่ยน template ไม่ต้องโหลดโมเดลใน worker ใหม่
+        # users = จำนวนงานสแกนที่กำลังใช้ pool / retired = สั่งปิดแล้ว รอให้งานสุดท้ายคืน pool ก่อนค่อยปิดจริง
+        self._shared = {"pool": None, "users": 0, "retired": False, "lock": threading.Lock()}
+
+    def with_preprocess(self, preprocess):
+        engine = copy.copy(self)
+        engine.preprocess = None if is_noop(preprocess) else dict(preprocess)
+        return engine
+
+    def _acquire_pool(self):
+        with self._shared["lock"]:
+            if self._shared["pool"] is None:
+                torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._shared["pool"] = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_ocr_worker,
+                    initargs=(self.langs, torch_threads),
+                )
+            self._shared["users"] += 1
+            return self._shared["pool"]
+
+    def _release_pool(self):
+        with self._shared["lock"]:
+            self._shared["users"] -= 1
+            pool = self._take_idle_pool()
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _take_idle_pool(self):
+        # เรียกขณะถือ lock: คืน pool ที่ต้องปิดเมื่อถูกสั่งปิดแล้วและไม่มีงานสแกนใช้อยู่
+        if not self._shared["retired"] or self._shared["users"] > 0:
+            return None
+        pool, self._shared["pool"] = self._shared["pool"], None
+        return pool
+
+    def shutdown(self, wait=True):
+        # ไม่ตัดงานสแกนของ session อื่นที่ใช้ pool อยู่: ถ้ายังมีคนใช้ จะปิดตอนงานสุดท้ายคืน pool (_release_pool)
+        with self._shared["lock"]:
+            self._shared["retired"] = True
+            pool = self._take_idle_pool()
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def cache_params(self):
+        params = {"langs": list(self.langs), **READTEXT_PARAMS}
+        if self.preprocess is not None:
+            params["preprocess"] = self.preprocess  # เปลี่ยน template แล้วต้องอ่านใหม่ ไม่ใช้ผลเดิมใน cache
+        return params
+
+    def read_all(self, images, on_progress=None):
+        # images: list ของ bytes -> list ของ (results, error) เรียงตามลำดับที่อัปโหลด
+        outputs = [None] * len(images)
+        for done, (idx, results, error) in enumerate(self.iter_read(images), 1):
+            outputs[idx] = (results, error)
+            if on_progress: on_progress(done, len(images))
+        return outputs
+
+    def iter_read(self, images, cancel=None):
+        # yield (index, results, error) ทีละรูปทันทีที่อ่านเสร็จ -> ใช้ทำผลแบบ streaming
+        # cancel: threading.Event ถ้าถูก set จะหยุดก่อนส่งรูปถัดไปเข้า OCR (รูปที่อ่านเสร็จแล้วไม่หาย)
+        keys = {}
+        pending = []
+
+        # รูปที่เคยอ่านแล้ว (hash ตรงกัน) ดึงผลจาก cache ไม่ต้องเข้า EasyOCR
+        for idx, data in enumerate(images):
+            if self.cache is not None:
+                with perf_stats.stage("ocr.cache_lookup"):
+                    keys[idx] = self.cache.make_key(data, self.cache_params())
+                    cached = self.cache.get(keys[idx])
+                if cached is not None:
+                    yield idx, cached, None
+                    continue
+            pending.append(idx)
+
+        pending_images = [images[idx] for idx in pending]
+        if self.workers > 1:
+            read = self._iter_multiprocess(pending_images, cancel)
+        else:
+            read = self._iter_batched(pending_images, cancel)
+
+        for pos, results, error in read:
+            idx = pending[pos]
+            if error is None and self.cache is not None:
+                self.cache.put(keys[idx], results)
+            yield idx, results, error
+
+    def _iter_multiprocess(self, images, cancel):
+        # ส่งงานเข้า pool ล่วงหน้าแค่ workers * 2 รูป -> กดยกเลิกแล้วไม่มีงานค้างในคิวอีกเป็นสิบรูป
+        pool = self._acquire_pool()
+        window = self.workers * 2
+        futures = {}
+        submitted = 0
+        try:
+            for pos in range(len(images)):
+                if cancel is not None and cancel.is_set():
+                    return
+                while submitted < len(images) and submitted < pos + window:
+                    futures[submitted] = pool.submit(_ocr_in_worker, images[submitted], self.preprocess)
+                    submitted += 1
+                try:
+                    results, decode_seconds, read_seconds = futures.pop(pos).result()
+                except Exception as e:
+                    yield pos, None, e
+                    continue
+                perf_stats.record("ocr.decode", decode_seconds, len(images[pos]))
+                perf_stats.record("ocr.readtext", read_seconds)
+                yield pos, results, None
+        finally:
+            for fut in futures.values():
+                fut.cancel()
+            self._release_pool()
+
+    def _iter_batched(self, images, cancel):
+        decode_workers = min(4, os.cpu_count() or 1)
+        decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+        try:
+            decoded_futures = [decode_pool.submit(prepare_image, data, self.preprocess) for data in images]
+
+            # รวมรูปขนาดเท่ากันที่อยู่ติดกันเป็น batch เดียว (readtext_batched ต้องการขนาดเท่ากัน)
+            chunk = []
+            for idx, fut in enumerate(decoded_futures):
+                try:
+                    img_np, transform = fut.result()
+                except Exception as e:
+                    yield idx, None, e
+                    continue
+
+                if chunk and (chunk[0][1].shape != img_np.shape or len(chunk) >= self.batch_size):
+                    yield from self._read_chunk(chunk)
+                    chunk = []
+                    if cancel is not None and cancel.is_set():
+                        return
+                chunk.append((idx, img_np, transform))
+
+            if chunk and not (cancel is not None and cancel.is_set()):
+                yield from self._read_chunk(chunk)
+        finally:
+            decode_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _read_chunk(self, chunk):
+        batch_results = None
+        if len(chunk) > 1:
+            started = time.perf_counter()
+            try:
+                batch_results = self.reader.readtext_batched([img for _, img, _ in chunk], **READTEXT_PARAMS)
+            except Exception:
+                batch_results = None  # ถ้า batch พัง ให้อ่านทีละรูปเพื่อแยก error ให้ถูกรูป
+            else:
+                per_image = (time.perf_counter() - started) / len(chunk)  # เฉลี่ยเวลา batch ต่อรูป
+                for _ in chunk:
+                    perf_stats.record("ocr.readtext", per_image)
+
+        for pos, (idx, img_np, transform) in enumerate(chunk):
+            if batch_results is not None:
+                yield idx, restore_coords(batch_results[pos], transform), None
+            else:
+                try:
+                    with perf_stats.stage("ocr.readtext"):
+                        results = self.reader.readtext(img_np, **READTEXT_PARAMS)
+                except Exception as e:
+                    yield idx, None, e
+                    continue
+                yield idx, restore_coords(results, transform), None
+
+
+def _scan_items(images):
+    # bytes ของรูป หรือแถบจาก scroll_ingest ({"data", "transform", "source"}) -> รูปแบบเดียวกัน
+    return [img if isinstance(img, dict) else {"data": img, "transform": None, "source": idx} for idx, img in enumerate(images)]
+
+
+def _layout_pairs(item, results, ignore_words):
+    with perf_stats.stage("ocr.pairing"):
+        layout = TextLayout(restore_coords(results, item["transform"]))
+        pairs = layout.pair(ignore_words)  # pair ก่อน rows_table() ไม่งั้นตาราง debug ไม่มีคอลัมน์ pairs
+        rows = [{"image": item["source"] + 1, **row} for row in layout.rows_table()]
+    return pairs, rows
+
+
+def scan_images(engine, images, roster, guild_name, ignore_words=None, on_progress=None, aliases=None):
+    # OCR ทุกรูปแล้วรวมผลตามลำดับเดิม -> ได้ผลลัพธ์เหมือนการสแกนทีละรูป
+    if ignore_words is None:
+        ignore_words = build_ignore_words(guild_name)
+
+    items = _scan_items(images)
+    all_pairs = []
+    errors = []
+    rows = []
+
+    with perf_stats.stage("ocr.read_all", sum(len(item["data"]) for item in items)):
+        outputs = engine.read_all([item["data"] for item in items], on_progress)
+    for item, (results, error) in zip(items, outputs):
+        if error is None:
+            try:
+                pairs, item_rows = _layout_pairs(item, results, ignore_words)
+                all_pairs.extend(pairs)
+                rows.extend(item_rows)
+            except Exception as e:
+                error = e
+        if error is not None:
+            errors.append((item["source"], error))
+
+    # fuzzy match ชื่อจากทุกรูปใน batch เดียว
+    all_match_log, new_candidates, alias_hits = match_pairs(all_pairs, roster, guild_name, aliases)
+    return {
+        "matched": all_match_log,
+        "new_candidates": new_candidates,
+        "alias_hits": alias_hits,
+        "errors": errors,
+        "rows": rows,
+    }
+
+
+class ScanStream:
+    # สแกนใน thread เบื้องหลัง ผลของแต่ละรูปออกมาทันทีที่อ่านเสร็จ (ดึงด้วย drain()) และกด cancel() ได้
+    # thread นี้ไม่แตะ DataFrame เอง ฝั่ง UI เป็นคนเอาผลไป apply -> ไม่มีการแก้ main_df จากหลาย thread
+    def __init__(self, engine, images, roster, guild_name, ignore_words=None, aliases=None):
+        self.engine = engine
+        self.items = _scan_items(images)
+        self.roster = roster
+        self.guild_name = guild_name
+        self.ignore_words = ignore_words if ignore_words is not None else build_ignore_words(guild_name)
+        self.aliases = aliases
+        self.total = len(self.items)
+        self.done = 0
+        self.error = None
+        self._events = []
+        self._waiting = {}  # idx -> event ที่อ่านเสร็จก่อนรูปก่อนหน้า (รอปล่อยตามลำดับอัปโหลด)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ocr-scan-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def status(self):
+        if not self._finished.is_set(): return "cancelling" if self._cancel.is_set() else "running"
+        if self.error is not None: return "error"
+        return "cancelled" if self._cancel.is_set() and self.done < self.total else "done"
+
+    def is_running(self):
+        return not self._finished.is_set()
+
+    def drain(self):
+        # คืน event ที่ยังไม่เคยดึง เรียงตามลำดับอัปโหลด (ชื่อเดียวกันหลายรูป -> รูปหลังสุดเขียนทับเหมือนสแกนทีละรูป)
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def _run(self):
+        timer = perf_stats.stage("ocr.scan_job", sum(len(item["data"]) for item in self.items))
+        try:
+            with timer:
+                stream = self.engine.iter_read([item["data"] for item in self.items], self._cancel)
+                for idx, results, error in stream:
+                    self._emit(idx, self._image_event(self.items[idx], results, error))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._flush()
+            self._finished.set()
+
+    def _image_event(self, item, results, error):
+        event = {"image": item["source"] + 1, "matched": [], "new_candidates": [], "alias_hits": 0, "rows": [], "error": error}
+        if error is None:
+            try:
+                pairs, event["rows"] = _layout_pairs(item, results, self.ignore_words)
+                event["matched"], event["new_candidates"], event["alias_hits"] = match_pairs(
+                    pairs, self.roster, self.guild_name, self.aliases
+                )
+            except Exception as e:
+                event["error"] = e
+        return event
+
+    def _emit(self, idx, event):
+        # iter_read คืนผลตามลำดับที่อ่านเสร็จ (รูปที่อยู่ใน cache มาก่อน) -> พักไว้จนรูปก่อนหน้ามาครบ
+        with self._lock:
+            self._waiting[idx] = event
+            self.done += 1
+            while self._next in self._waiting:
+                self._events.append(self._waiting.pop(self._next))
+                self._next += 1
+
+    def _flush(self):
+        # ยกเลิก/error กลางทาง: รูปที่ไม่ได้อ่านไม่มีวันมาถึง ปล่อยที่เหลือตามลำดับ
+        with self._lock:
+            for idx in sorted(self._waiting):
+                self._events.append(self._waiting.pop(idx))
+
+
+def compare_preprocess(reader, images, template, roster, guild_name, ignore_words=None):
+    # รายงานก่อน/หลัง preprocess (ไม่ผ่าน cache): เวลา OCR, จำนวนคู่ที่อ่านได้, hit rate เทียบกับภาพเต็ม
+    if ignore_words is None:
+        ignore_words = build_ignore_words(guild_name)
+
+    def pair_fn(results):
+        return TextLayout(results).pair(ignore_words)
+
+    def match_fn(pairs):
+        matched, _, _ = match_pairs(pairs, roster, guild_name)
+        return len(matched)
+
+    return compare_templates(reader, images, template, READTEXT_PARAMS, pair_fn, match_fn)
+
+
+def apply_matches(df, matched, boss, name_col=NAME_COL):
+    # เขียนดาเมจของคนที่จับคู่ได้ลงช่องบอส (ชื่อซ้ำในผลสแกน ใช้ค่าล่าสุด) -> คืนจำนวนแถวที่อัปเดต
+    if not matched:
+        return 0
+    table = RosterTable(df, [boss], name_col)
+    return table.apply([(item['name'], boss, item['damage']) for item in matched])["updated"]
+
+
+def unique_candidates(new_candidates):
+    # ชื่อใหม่ที่อ่านได้ซ้ำหลายรูป เก็บไว้รายการเดียว (ค่าล่าสุด)
+    unique = {}
+    for item in new_candidates:
+        unique[item['name']] = item
+    return list(unique.values())
@@ -0,0 +1,128 @@
+import io
+import os
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+# ==========================================
+# OCR PREPROCESS (ตัดเฉพาะกรอบ leaderboard + ขาวดำ + ย่อขนาด ก่อนส่งเข้า readtext)
+# ==========================================
+# roi = (ซ้าย, บน, ขวา, ล่าง) เป็นสัดส่วนของภาพ 0-1 -> ใช้ได้ทุกความละเอียดของอุปกรณ์รุ่นเดียวกัน
+# text_height_ratio = ความสูงตัวอักษรในแถว leaderboard / ความสูงภาพเต็ม (วัดจากภาพจริงของอุปกรณ์นั้น)
+# target_text_height = ความสูงตัวอักษร (px) หลังย่อ ไม่ขยายภาพที่เล็กกว่านี้อยู่แล้ว
+# เพิ่ม/แก้ template ของเครื่องตัวเองได้ที่ไฟล์ JSON (env OCR_ROI_TEMPLATES) รูปแบบเดียวกับด้านล่าง
+DEFAULT_TEMPLATE_PATH = os.environ.get("OCR_ROI_TEMPLATES", "roi_templates.json")
+NO_PREPROCESS = "none"
+BUILTIN_TEMPLATES = {
+    NO_PREPROCESS: {"roi": None, "grayscale": False, "text_height_ratio": None, "target_text_height": None},
+    "full_gray": {"roi": None, "grayscale": True, "text_height_ratio": 0.02, "target_text_height": 24},
+    "phone_landscape": {"roi": [0.15, 0.15, 0.85, 0.92], "grayscale": True, "text_height_ratio": 0.03, "target_text_height": 24},
+    "phone_portrait": {"roi": [0.03, 0.2, 0.97, 0.88], "grayscale": True, "text_height_ratio": 0.015, "target_text_height": 24},
+    "tablet": {"roi": [0.12, 0.15, 0.88, 0.9], "grayscale": True, "text_height_ratio": 0.025, "target_text_height": 24},
+}
+
+
+def load_templates(path=DEFAULT_TEMPLATE_PATH):
+    templates = {name: dict(t) for name, t in BUILTIN_TEMPLATES.items()}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            custom = json.load(f)
+    except (OSError, ValueError):
+        return templates
+    if isinstance(custom, dict):
+        for name, t in custom.items():
+            if isinstance(t, dict):
+                templates[str(name)] = {**BUILTIN_TEMPLATES[NO_PREPROCESS], **t}
+    return templates
+
+
+def is_noop(template):
+    return not template or (
+        not template.get("roi") and not template.get("grayscale") and not template.get("target_text_height")
+    )
+
+
+def _roi_box(template, width, height):
+    roi = template.get("roi")
+    if not roi:
+        return (0, 0, width, height)
+    left, top, right, bottom = (min(1.0, max(0.0, float(v))) for v in roi)
+    box = (int(left * width), int(top * height), int(round(right * width)), int(round(bottom * height)))
+    if box[2] - box[0] < 1 or box[3] - box[1] < 1:
+        return (0, 0, width, height)  # template ผิดรูป -> ไม่ตัด ดีกว่าได้ภาพว่าง
+    return box
+
+
+def preprocess(image, template):
+    # image: PIL.Image -> (numpy array, transform) transform ใช้แปลงพิกัด bbox กลับเป็นพิกัดภาพเดิม
+    width, height = image.size
+    box = _roi_box(template, width, height)
+    if box != (0, 0, width, height):
+        image = image.crop(box)
+    if template.get("grayscale"):
+        image = image.convert("L")
+
+    scale_x = scale_y = 1.0
+    ratio = template.get("text_height_ratio")
+    target = template.get("target_text_height")
+    if ratio and target:
+        scale = float(target) / (float(ratio) * height)
+        if scale < 1.0:
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            scale_x, scale_y = new_size[0] / image.width, new_size[1] / image.height
+            image = image.resize(new_size, Image.LANCZOS)
+
+    return np.array(image), {"offset": (box[0], box[1]), "scale": (scale_x, scale_y)}
+
+
+def load_image(data, template=None):
+    image = Image.open(io.BytesIO(data))
+    if is_noop(template):
+        return np.array(image), None
+    return preprocess(image, template)
+
+
+def restore_coords(results, transform):
+    # bbox จากภาพที่ตัด/ย่อแล้ว -> พิกัดภาพต้นฉบับ (ROW_TOLERANCE ของ ocr_layout อิงพิกัดภาพเต็ม)
+    if transform is None:
+        return results
+    (ox, oy), (sx, sy) = transform["offset"], transform["scale"]
+    restored = []
+    for bbox, text, prob in results:
+        points = [[float(x) / sx + ox, float(y) / sy + oy] for x, y in bbox]
+        restored.append((points, text, prob))
+    return restored
+
+
+def compare_templates(reader, images, template, readtext_params, pair_fn, match_fn=None):
+    # อ่านรูปชุดเดียวกันแบบเดิม (ภาพเต็ม) เทียบกับแบบ preprocess -> เวลา OCR / จำนวนคู่ชื่อ-ดาเมจ / จับคู่สมาชิกได้
+    # pair_fn(results) -> list ของคู่ (ชื่อ, ดาเมจ), match_fn(pairs) -> จำนวนที่จับคู่กับรายชื่อได้
+    report = []
+    for label, tmpl in (("ภาพเต็ม", None), ("Preprocess", template)):
+        seconds = 0.0
+        pixels = 0
+        pairs = []
+        for data in images:
+            img_np, transform = load_image(data, tmpl)
+            pixels += img_np.shape[0] * img_np.shape[1]
+            start = time.perf_counter()
+            results = reader.readtext(img_np, **readtext_params)
+            seconds += time.perf_counter() - start
+            pairs.extend(pair_fn(restore_coords(results, transform)))
+        report.append({
+            "mode": label,
+            "images": len(images),
+            "megapixels": round(pixels / 1e6, 2),
+            "ocr_seconds": round(seconds, 2),
+            "pairs": len(pairs),
+            "matched": match_fn(pairs) if match_fn else None,
+            "_pairs": set(pairs),
+        })
+
+    # hit rate: คู่ที่อ่านจากภาพเต็มได้ แล้วแบบ preprocess ยังอ่านได้ตรงกัน
+    base = report[0]["_pairs"]
+    for row in report:
+        row["hit_rate"] = round(len(row.pop("_pairs") & base) / len(base), 3) if base else None
+    return report
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+# ==========================================
+# PERF STATS (จับเวลาแต่ละขั้น: decode / readtext / pairing / fuzzy / DataFrame / Sheets / กราฟ)
+# ==========================================
+# ปิดอยู่ = stage() คืน object ว่างตัวเดียวกันทุกครั้ง (แค่เช็ค flag ไม่จับเวลา ไม่ล็อก)
+# เปิดด้วย env PERF_STATS=1 หรือ set_enabled(True) จากหน้า Diagnostics
+# เก็บระดับ process (รวมทุก session / thread สแกนเบื้องหลัง) ตัวอย่างเวลาเก็บล่าสุด MAX_SAMPLES ค่าต่อขั้นสำหรับ p50/p95
+MAX_SAMPLES = 2000
+
+_enabled = os.environ.get("PERF_STATS", "0") == "1"
+_lock = threading.Lock()
+_stages = {}
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+def payload_size(obj):
+    return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class _Stage:
+    __slots__ = ("count", "total", "bytes", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+
+def record(name, seconds, nbytes=0):
+    if not _enabled:
+        return
+    with _lock:
+        stage_stats = _stages.get(name)
+        if stage_stats is None:
+            stage_stats = _stages[name] = _Stage()
+        stage_stats.count += 1
+        stage_stats.total += seconds
+        stage_stats.bytes += nbytes
+        stage_stats.samples.append(seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "nbytes", "_start")
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._start, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+    def add_payload(self, obj):
+        # ขนาด JSON ของข้อมูลที่รับ/ส่ง (คำนวณเฉพาะตอนเปิดเก็บสถิติ)
+        self.nbytes += payload_size(obj)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+    def add_payload(self, obj):
+        pass
+
+
+_NOOP = _NoopTimer()
+
+
+def stage(name, nbytes=0):
+    # with perf_stats.stage("ocr.readtext"): ...
+    if not _enabled:
+        return _NOOP
+    return _Timer(name, nbytes)
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def summary():
+    with _lock:
+        snapshot = [(name, s.count, s.total, s.bytes, np.array(s.samples)) for name, s in _stages.items()]
+    rows = []
+    for name, count, total, nbytes, samples in sorted(snapshot):
+        p50, p95 = np.percentile(samples, [50, 95]) if len(samples) else (0.0, 0.0)
+        rows.append({
+            "stage": name,
+            "count": count,
+            "total_s": round(total, 4),
+            "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+            "p50_ms": round(float(p50) * 1000, 2),
+            "p95_ms": round(float(p95) * 1000, 2),
+            "max_ms": round(float(samples.max()) * 1000, 2) if len(samples) else 0.0,
+            "bytes": nbytes,
+        })
+    return rows
+
+
+def report_json():
+    return json.dumps({"generated_at": time.time(), "stages": summary()}, ensure_ascii=False, indent=2)
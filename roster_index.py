@@ -0,0 +1,104 @@
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz import process as rprocess
+from thefuzz import utils
+
+# ==========================================
+# ROSTER INDEX (fuzzy match ชื่อจาก OCR กับรายชื่อสมาชิกแบบ batch)
+# ==========================================
+MATCH_SCORE_THRESHOLD = 70
+PREFILTER_MIN_ROSTER = 500  # roster เล็กกว่านี้ให้คำนวณทั้งตารางเลย เร็วกว่า
+NGRAM_SIZE = 2
+SHORT_KEY_LENGTH = 3  # ชื่อสั้น ๆ ได้คะแนน partial สูงจากตัวอักษรเดียว -> เป็นผู้สมัครเสมอ
+
+
+def normalize_name(name):
+    # เหมือน process.extractOne (WRatio) ของ thefuzz: ตัดอักขระ 128-255, ตัวเล็ก, สัญลักษณ์ -> ช่องว่าง
+    # อักษรไทย (U+0E00) ไม่ถูกตัด จึงใช้ได้ทั้งชื่อไทย/อังกฤษ
+    return utils.full_process(str(name), force_ascii=True)
+
+
+def name_ngrams(key, n=NGRAM_SIZE):
+    compact = key.replace(" ", "")
+    if len(compact) < n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+class RosterIndex:
+    # สร้างครั้งเดียวต่อการสแกน: เก็บ key ที่ normalize แล้ว + postings ของ n-gram สำหรับคัดกรองผู้สมัคร
+    def __init__(self, names):
+        self.names = [str(x) for x in names if str(x).strip() != ""]
+        self.keys = [normalize_name(x) for x in self.names]
+        self.sorted_names = sorted(self.names)
+        self._name_set = set(self.names)
+
+        postings = {}
+        for idx, key in enumerate(self.keys):
+            for gram in name_ngrams(key):
+                postings.setdefault(gram, []).append(idx)
+        self._postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self._always = np.array(
+            [idx for idx, key in enumerate(self.keys) if len(key.replace(" ", "")) <= SHORT_KEY_LENGTH],
+            dtype=np.int64,
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._name_set
+
+    def _score(self, queries, columns=None):
+        choices = self.keys if columns is None else [self.keys[c] for c in columns]
+        return rprocess.cdist(queries, choices, scorer=fuzz.WRatio, dtype=np.float64, workers=-1)
+
+    def _candidate_mask(self, queries):
+        mask = np.zeros((len(queries), len(self.names)), dtype=bool)
+        mask[:, self._always] = True
+        for row, key in enumerate(queries):
+            if len(key.replace(" ", "")) <= SHORT_KEY_LENGTH:
+                mask[row] = True
+                continue
+            ids = [self._postings[g] for g in name_ngrams(key) if g in self._postings]
+            if ids:
+                mask[row, np.concatenate(ids)] = True
+        return mask
+
+    def match_batch(self, names):
+        # คืนค่า [(ชื่อในระบบ, คะแนน)] ตามลำดับ input (เหมือน extractOne) หรือ None ถ้าไม่มีรายชื่อในระบบ
+        if not self.names:
+            return [None] * len(names)
+        if not names:
+            return []
+
+        unique_keys = list(dict.fromkeys(normalize_name(n) for n in names))
+        best_idx = np.zeros(len(unique_keys), dtype=np.int64)
+        best_score = np.full(len(unique_keys), -1.0)
+
+        if len(self.names) >= PREFILTER_MIN_ROSTER:
+            # คัดเฉพาะชื่อที่มี n-gram ร่วมกัน แล้วคำนวณคะแนนรวดเดียว
+            mask = self._candidate_mask(unique_keys)
+            columns = np.flatnonzero(mask.any(axis=0))
+            if len(columns):
+                scores = self._score(unique_keys, columns)
+                scores[~mask[:, columns]] = -1.0
+                pos = scores.argmax(axis=1)
+                best_idx = columns[pos]
+                best_score = scores[np.arange(len(unique_keys)), pos]
+
+        # แถวที่ยังไม่ถึงเกณฑ์ -> คำนวณกับ roster ทั้งหมด เพื่อให้ผลผ่าน/ไม่ผ่าน 70 เหมือนเดิม
+        retry = np.flatnonzero(best_score < MATCH_SCORE_THRESHOLD)
+        if len(retry):
+            scores = self._score([unique_keys[r] for r in retry])
+            best_idx[retry] = scores.argmax(axis=1)
+            best_score[retry] = scores.max(axis=1)
+
+        by_key = {
+            key: (self.names[best_idx[r]], int(round(best_score[r])))
+            for r, key in enumerate(unique_keys)
+        }
+        return [by_key[normalize_name(n)] for n in names]
+
+    def match(self, name):
+        return self.match_batch([name])[0]
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+import perf_stats
+from guild_config import NAME_COL, DAYS_COLS
+
+# ==========================================
+# ROSTER TABLE (map ชื่อ -> ตำแหน่งแถว + เขียนผลสแกน/ยืนยันทั้งชุดในครั้งเดียว)
+# ==========================================
+# แทนการวน iterrows / หา index ด้วย boolean mask ทีละชื่อ (O(แถว x รายการ))
+# updates/inserts: (ชื่อสมาชิก, บอส, ดาเมจ) ชื่อเดียวกัน+บอสเดียวกันซ้ำใน batch ใช้ค่าล่าสุด
+
+
+class RosterTable:
+    def __init__(self, df, days_cols=DAYS_COLS, name_col=NAME_COL):
+        self.df = df
+        self.days_cols = list(days_cols)
+        self.name_col = name_col
+        with perf_stats.stage("df.index_names"):
+            self._positions = self._build_positions(df)
+
+    def _build_positions(self, df):
+        # ชื่อซ้ำในตาราง -> หลายตำแหน่ง (เขียนทุกแถว เหมือน apply_matches เดิม)
+        if df.empty:
+            return {}
+        codes, uniques = pd.factorize(df[self.name_col].astype(str).to_numpy(dtype=object))
+        order = np.argsort(codes, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1])
+        return dict(zip(uniques.tolist(), groups))
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, name):
+        return str(name) in self._positions
+
+    def rows_of(self, name):
+        return self._positions.get(str(name), np.empty(0, dtype=np.int64))
+
+    def apply(self, updates=(), inserts=()):
+        # คืนค่า {"updated": จำนวนช่องที่เขียน, "inserted": แถวใหม่, "conflicts": ค่าขัดกันใน batch, "missing": ชื่อไม่มีในตาราง}
+        with perf_stats.stage("df.apply"):
+            return self._apply(updates, inserts)
+
+    def _apply(self, updates, inserts):
+        report = {"updated": 0, "inserted": 0, "conflicts": 0, "missing": 0}
+        upd = _frame(updates)
+        ins = _frame(inserts)
+
+        # ชื่อที่ขอสร้างใหม่แต่มีอยู่แล้วในตาราง -> เขียนทับแถวเดิมแทน ไม่สร้างแถวซ้ำ
+        exists = ins["name"].map(self._positions.__contains__).astype(bool)
+        if exists.any():
+            report["conflicts"] += int(exists.sum())
+            upd = pd.concat([upd, ins[exists]], ignore_index=True) if not upd.empty else ins[exists]
+            ins = ins[~exists]
+
+        report["conflicts"] += _count_conflicts(upd) + _count_conflicts(ins)
+        upd = upd.drop_duplicates(["name", "boss"], keep="last")
+        ins = ins.drop_duplicates(["name", "boss"], keep="last")
+
+        known = upd["name"].map(self._positions.__contains__).astype(bool)
+        report["missing"] = int((~known).sum())
+        upd = upd[known]
+
+        for boss, part in upd.groupby("boss", sort=False):
+            if boss not in self.days_cols:
+                report["missing"] += len(part)
+                continue
+            rows = [self._positions[name] for name in part["name"].tolist()]
+            counts = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+            positions = np.concatenate(rows)
+            write_column(self.df, boss, positions, np.repeat(part["damage"].to_numpy(), counts))
+            report["updated"] += len(positions)
+
+        ins = ins[ins["boss"].isin(self.days_cols)]
+        if not ins.empty:
+            # แถวใหม่ทั้งหมดต่อท้ายด้วย concat ครั้งเดียว (บอสอื่นเป็น 0)
+            names = pd.unique(ins["name"])
+            new_rows = pd.DataFrame({self.name_col: names, **{c: np.zeros(len(names), dtype=np.int64) for c in self.days_cols}})
+            row_of = pd.Index(names).get_indexer(ins["name"])
+            for boss in pd.unique(ins["boss"]):
+                mask = (ins["boss"] == boss).to_numpy()
+                write_column(new_rows, boss, row_of[mask], ins["damage"].to_numpy()[mask])
+            self.df = pd.concat([self.df, new_rows], ignore_index=True)
+            self._positions = self._build_positions(self.df)
+            report["inserted"] = len(new_rows)
+
+        return report
+
+
+def write_column(df, col, positions, values):
+    loc = df.columns.get_loc(col)
+    try:
+        df.iloc[positions, loc] = values
+    except (TypeError, ValueError):
+        # dtype เดิมรับค่าไม่ได้ (เช่น ดาเมจทศนิยม/ว่างลงคอลัมน์ int) -> ขยาย dtype ของคอลัมน์ก่อน
+        df[col] = df[col].astype(np.result_type(df[col].dtype, np.asarray(values).dtype))
+        df.iloc[positions, loc] = values
+
+
+def _frame(items):
+    frame = pd.DataFrame(list(items), columns=["name", "boss", "damage"])
+    frame["name"] = pd.Series([str(n) for n in frame["name"]], index=frame.index, dtype=object)  # object ไว้ใช้ hash lookup เร็วกว่า arrow string
+    return frame
+
+
+def _count_conflicts(frame):
+    # ชื่อ+บอสเดียวกันแต่ดาเมจต่างกันใน batch เดียว (เช่น OCR อ่านสองรูปไม่ตรงกัน)
+    if frame.empty:
+        return 0
+    return int((frame.groupby(["name", "boss"], sort=False)["damage"].nunique() > 1).sum())
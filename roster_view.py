@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+import perf_stats
+from guild_config import NAME_COL, DAYS_COLS
+from roster_index import normalize_name
+from roster_table import write_column
+
+# ==========================================
+# ROSTER VIEW (index สำหรับค้นหา/กรอง + แบ่งหน้าตารางแก้ไขใน Dashboard)
+# ==========================================
+# สร้างครั้งเดียวต่อ main_df (เก็บใน session_state) แทน copy + str.contains ทั้งตารางทุก rerun
+# ชื่อตัวเล็ก (ค้นแบบไม่สนตัวพิมพ์) + key แบบ normalize_name (ไม่สนสัญลักษณ์/ช่องว่าง) + mask แถวที่มี 0
+# data_editor ได้แค่แถวของหน้าปัจจุบัน / เขียนกลับเฉพาะแถวที่แก้ตาม row id (index ของ main_df)
+PAGE_SIZES = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = 50
+SEARCH_CACHE_SIZE = 32
+
+
+class RosterView:
+    def __init__(self, df, days_cols=DAYS_COLS, name_col=NAME_COL):
+        self.days_cols = list(days_cols)
+        self.name_col = name_col
+        self._build(df)
+
+    def _build(self, df):
+        with perf_stats.stage("view.build"):
+            self.df = df
+            names = [str(n) if pd.notna(n) else "" for n in df[self.name_col].tolist()] if self.name_col in df.columns else [""] * len(df)
+            self.lower = np.array([n.lower() for n in names], dtype=object)
+            self.keys = np.array([normalize_name(n) for n in names], dtype=object)
+            self.zero_mask = self._zeros(df)
+            self._searches = {}
+
+    def _zeros(self, df):
+        cols = [c for c in self.days_cols if c in df.columns]
+        if not cols or df.empty:
+            return np.zeros(len(df), dtype=bool)
+        return df[cols].eq(0).any(axis=1).to_numpy(copy=True)
+
+    def is_current(self, df):
+        # แก้ main_df แบบ in-place จากที่อื่น (สแกน/ยืนยันชื่อ) ต้องทิ้ง view เอง ดู invalidate ใน app.py
+        return df is self.df and len(df) == len(self.lower)
+
+    def __len__(self):
+        return len(self.df)
+
+    def matches(self, term="", zeros_only=False):
+        # ตำแหน่งแถว (iloc) ที่ตรงคำค้น และ/หรือ มีช่องที่เป็น 0
+        with perf_stats.stage("view.search"):
+            positions = self._search(str(term or "").strip().lower())
+            if zeros_only:
+                positions = positions[self.zero_mask[positions]]
+            return positions
+
+    def _search(self, term):
+        if not term:
+            return np.arange(len(self.lower))
+        cached = self._searches.get(term)
+        if cached is not None:
+            return cached
+        # พิมพ์ต่อท้ายทีละตัว -> ค้นต่อจากผลของคำที่สั้นกว่าแทนการไล่ทั้งตาราง
+        # ใช้ได้เฉพาะคำก่อนหน้าที่ normalize แล้วไม่ว่าง: เช่น "." ค้นด้วย substring อย่างเดียว แต่ ".a" ค้นด้วย key "a" ได้ด้วย
+        key = normalize_name(term)
+        candidates = None
+        for prefix in sorted(self._searches, key=len, reverse=True):
+            if term.startswith(prefix) and (normalize_name(prefix) or not key):
+                candidates = self._searches[prefix]
+                break
+        if candidates is None:
+            candidates = np.arange(len(self.lower))
+        lower = self.lower[candidates]
+        keys = self.keys[candidates]
+        hit = np.fromiter(
+            ((term in n) or (bool(key) and key in k) for n, k in zip(lower, keys)),
+            dtype=bool, count=len(candidates),
+        )
+        result = candidates[hit]
+        if len(self._searches) >= SEARCH_CACHE_SIZE:
+            self._searches.pop(next(iter(self._searches)))
+        self._searches[term] = result
+        return result
+
+    def page(self, positions, page, page_size=DEFAULT_PAGE_SIZE):
+        # page เริ่มที่ 0 -> สำเนาเฉพาะแถวของหน้านั้น (index = row id เดิมของ main_df)
+        start = page * page_size
+        return self.df.iloc[positions[start:start + page_size]]
+
+    def write_back(self, page_df, edited_df):
+        # เทียบหน้าเดิมกับผลจาก data_editor: แถวที่แก้ -> เขียนทับตาม row id / แถวที่หาย -> ลบ / id ที่ไม่อยู่ในหน้า -> แถวใหม่
+        with perf_stats.stage("view.write_back"):
+            return self._write_back(page_df, edited_df)
+
+    def _write_back(self, page_df, edited_df):
+        report = {"updated": 0, "inserted": 0, "deleted": 0}
+        page_ids = page_df.index
+        kept = edited_df.index.isin(page_ids)
+        common = edited_df[kept]
+        added = edited_df[~kept]
+        deleted = page_ids.difference(common.index)
+
+        cols = [c for c in page_df.columns if c in edited_df.columns]
+        before = page_df.loc[common.index, cols]
+        after = common[cols]
+        same = before.eq(after) | (before.isna() & after.isna())
+        changed = common.index[~same.all(axis=1).to_numpy()]
+        if len(changed):
+            positions = self.df.index.get_indexer(changed)
+            for col in cols:
+                write_column(self.df, col, positions, after.loc[changed, col].to_numpy())
+            # อัปเดต index เฉพาะแถวที่แก้ ไม่ต้องสร้างใหม่ทั้งตาราง
+            if self.name_col in cols:
+                names = [str(n) if pd.notna(n) else "" for n in after.loc[changed, self.name_col].tolist()]
+                self.lower[positions] = [n.lower() for n in names]
+                self.keys[positions] = [normalize_name(n) for n in names]
+            self.zero_mask[positions] = self._zeros(self.df.iloc[positions])
+            self._searches = {}
+            report["updated"] = len(changed)
+
+        if len(deleted) or len(added):
+            df = self.df.drop(index=deleted)
+            if len(added):
+                start = int(self.df.index.max()) + 1 if len(self.df) else 0
+                added = added.reindex(columns=self.df.columns).set_axis(pd.RangeIndex(start, start + len(added)))
+                df = pd.concat([df, added]) if len(df) else added
+            self._build(df)
+            report["inserted"] = len(added)
+            report["deleted"] = len(deleted)
+        return report
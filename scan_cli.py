@@ -0,0 +1,174 @@
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+import ocr_pipeline
+import sheet_sync
+import scroll_ingest
+from guild_config import NAME_COL, DAYS_COLS
+from roster_index import RosterIndex
+from alias_store import AliasStore, DEFAULT_ALIAS_PATH
+from ocr_cache import OcrResultCache, DEFAULT_CACHE_DIR
+from ocr_preprocess import load_templates, NO_PREPROCESS
+
+# ==========================================
+# HEADLESS BATCH SCAN (OCR -> match -> fill โดยไม่ต้องเปิด Streamlit)
+# ==========================================
+# โครงสร้างโฟลเดอร์: <images_dir>/<ชื่อบอส>/*.png|jpg  (ชื่อบอสตาม DAYS_COLS)
+#   python scan_cli.py shots/ --roster roster.csv --out filled.csv --unmatched unmatched.csv
+#   python scan_cli.py shots/ --sheet-url URL --worksheet 3 --credentials sa.json --workers 4
+#   python scan_cli.py shots/ --roster roster.csv --roi-template phone_landscape
+#   python scan_cli.py shots/ --roster roster.csv --scroll-dedupe   (รูปเรียงตามชื่อไฟล์ = ลำดับที่เลื่อน, รองรับคลิป .mp4)
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg') + scroll_ingest.VIDEO_EXTS
+CHUNK_SIZE = 16  # อ่านไฟล์เข้าหน่วยความจำทีละก้อน ไม่โหลดทั้งโฟลเดอร์พร้อมกัน
+
+
+def list_boss_images(images_dir, bosses):
+    plan = []
+    for boss in bosses:
+        boss_dir = os.path.join(images_dir, boss)
+        if not os.path.isdir(boss_dir): continue
+        files = sorted(
+            os.path.join(boss_dir, f) for f in os.listdir(boss_dir)
+            if f.lower().endswith(IMAGE_EXTS)
+        )
+        if files:
+            plan.append((boss, files))
+    return plan
+
+
+def load_roster_csv(path):
+    df = pd.read_csv(path, dtype={NAME_COL: str}, keep_default_na=False)
+    return sheet_sync.normalize_frame(df, DAYS_COLS)
+
+
+def load_roster_sheet(sheet_url, worksheet_name, credentials_path):
+    import gspread
+    client = gspread.service_account(filename=credentials_path)
+    worksheet = client.open_by_url(sheet_url).worksheet(worksheet_name)
+    df, _ = sheet_sync.read_worksheet_frame(worksheet, DAYS_COLS)
+    return df
+
+
+def _read_files(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield path, f.read()
+
+
+def scan_directory(engine, table, images_dir, guild_name, aliases=None, log=print, scroll_template=None):
+    # คืนค่า (จำนวนที่อัปเดต, รายการชื่อที่จับคู่ไม่ได้) และเขียนดาเมจลง table โดยตรง
+    # scroll_template ไม่ใช่ None = ตัดส่วนที่ซ้อนกับรูปก่อนหน้าก่อน OCR (engine ต้องไม่ preprocess ซ้ำ)
+    ignore_words = ocr_pipeline.build_ignore_words(guild_name)
+    total_updated = 0
+    unmatched = []
+
+    for boss, files in list_boss_images(images_dir, DAYS_COLS):
+        roster = RosterIndex(table[NAME_COL].tolist())
+        matched, candidates = [], []
+        deduper = scroll_ingest.ScrollDeduper(scroll_template) if scroll_template is not None else None
+
+        for start in range(0, len(files), CHUNK_SIZE):
+            chunk = list(_read_files(files[start:start + CHUNK_SIZE]))
+            if deduper is not None:
+                inputs, _, ingest_errors = scroll_ingest.ingest(chunk, deduper=deduper)
+                for idx, e in ingest_errors:
+                    log(f"[{boss}] {chunk[idx][0]}: {e}")
+            else:
+                inputs = [data for _, data in chunk]
+            result = ocr_pipeline.scan_images(
+                engine, inputs, roster, guild_name,
+                ignore_words=ignore_words, aliases=aliases,
+            )
+            matched.extend(result["matched"])
+            candidates.extend(result["new_candidates"])
+            for idx, e in result["errors"]:
+                log(f"[{boss}] {chunk[idx][0]}: {e}")
+
+        updated = ocr_pipeline.apply_matches(table, matched, boss)
+        total_updated += updated
+        new_names = ocr_pipeline.unique_candidates(candidates)
+        for item in new_names:
+            suggestion = item.get("suggestion")
+            unmatched.append({
+                "boss": boss,
+                "ชื่อที่อ่านได้": item["name"],
+                "ดาเมจ": item["damage"],
+                "ใกล้เคียง": suggestion[0] if suggestion else "",
+                "คะแนน": suggestion[1] if suggestion else 0,
+            })
+        log(f"[{boss}] {len(files)} รูป -> อัปเดต {updated} คน, ชื่อใหม่ {len(new_names)} ชื่อ")
+        if deduper is not None:
+            stats = deduper.stats()
+            log(f"[{boss}] ตัดส่วนซ้ำ: {stats['frames']} เฟรม -> {stats['strips']} ชิ้น ({stats['ocr_megapixels']}/{stats['input_megapixels']} MP)")
+
+    return total_updated, unmatched
+
+
+def build_engine(workers, use_cache, cache_dir, preprocess=None):
+    cache = OcrResultCache(cache_dir) if use_cache else None
+    reader = None
+    if workers <= 1:
+        warmup = ocr_pipeline.ReaderWarmup()
+        reader = warmup.wait()
+        if reader is None:
+            raise RuntimeError(f"โหลด EasyOCR ไม่สำเร็จ: {warmup.error}")
+    return ocr_pipeline.ScanEngine(reader=reader, workers=workers, cache=cache, preprocess=preprocess)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="สแกนรูป leaderboard ทุกบอสแล้วเติมลงตาราง (ไม่ต้องใช้เบราว์เซอร์)")
+    parser.add_argument("images_dir", help="โฟลเดอร์ที่มีโฟลเดอร์ย่อยตามชื่อบอส")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--roster", help="ไฟล์ CSV รายชื่อ (คอลัมน์ ชื่อสมาชิก + บอส)")
+    src.add_argument("--sheet-url", help="Google Sheet URL สำหรับโหลดรายชื่อ")
+    parser.add_argument("--worksheet", default="1", help="ชื่อหน้าใน Google Sheet (ค่าเริ่มต้น: 1)")
+    parser.add_argument("--credentials", help="ไฟล์ service account JSON (ใช้คู่กับ --sheet-url)")
+    parser.add_argument("--out", default="filled.csv", help="ไฟล์ CSV ตารางที่เติมแล้ว")
+    parser.add_argument("--unmatched", default="unmatched.csv", help="ไฟล์ CSV รายงานชื่อที่จับคู่ไม่ได้")
+    parser.add_argument("--guild-name", default="MeAndBro")
+    parser.add_argument("--workers", type=int, default=1, help="จำนวน CPU process สำหรับ OCR")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="ไม่ใช้ OCR result cache")
+    parser.add_argument("--aliases", default=DEFAULT_ALIAS_PATH, help="ไฟล์ alias ชื่อที่อ่านผิด")
+    parser.add_argument("--roi-template", default=NO_PREPROCESS, help="template ตัด ROI/ย่อภาพก่อน OCR (ดู ocr_preprocess.py)")
+    parser.add_argument("--scroll-dedupe", action="store_true", help="รูปเลื่อนต่อกัน: OCR เฉพาะส่วนที่ไม่ซ้ำกับรูปก่อนหน้า")
+    args = parser.parse_args(argv)
+    if args.sheet_url and not args.credentials:
+        parser.error("--sheet-url ต้องใช้คู่กับ --credentials")
+    templates = load_templates()
+    if args.roi_template not in templates:
+        parser.error(f"--roi-template ต้องเป็นหนึ่งใน {', '.join(templates)}")
+    args.preprocess = templates[args.roi_template]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.roster:
+        table = load_roster_csv(args.roster)
+    else:
+        table = load_roster_sheet(args.sheet_url, args.worksheet, args.credentials)
+
+    engine = build_engine(args.workers, not args.no_cache, args.cache_dir, None if args.scroll_dedupe else args.preprocess)
+    try:
+        total_updated, unmatched = scan_directory(
+            engine, table, args.images_dir, args.guild_name, aliases=AliasStore(args.aliases),
+            scroll_template=args.preprocess if args.scroll_dedupe else None,
+        )
+    finally:
+        engine.shutdown()
+
+    table[[NAME_COL] + DAYS_COLS].to_csv(args.out, index=False, encoding="utf-8-sig")
+    pd.DataFrame(unmatched, columns=["boss", "ชื่อที่อ่านได้", "ดาเมจ", "ใกล้เคียง", "คะแนน"]).to_csv(
+        args.unmatched, index=False, encoding="utf-8-sig"
+    )
+    print(f"✅ อัปเดต {total_updated} ช่อง / ชื่อที่จับคู่ไม่ได้ {len(unmatched)} รายการ -> {args.out}, {args.unmatched}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
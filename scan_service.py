@@ -0,0 +1,339 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+
+import ocr_pipeline
+import sheet_sync
+import scroll_ingest
+from guild_config import NAME_COL, DAYS_COLS
+from roster_index import RosterIndex
+from alias_store import AliasStore
+from ocr_cache import OcrResultCache
+from ocr_preprocess import load_templates, NO_PREPROCESS
+from sheet_connection import SheetConnection
+
+# ==========================================
+# SCAN INGESTION SERVICE (รับรูปจาก chat bot -> คิว -> OCR ด้วย worker ที่โหลดโมเดลไว้แล้ว)
+# ==========================================
+#   uvicorn scan_service:app --host 0.0.0.0 --port 8000
+# ตั้งค่าผ่าน env:
+#   SCAN_WORKERS          จำนวน worker (แต่ละตัวมี EasyOCR Reader ของตัวเอง)      ค่าเริ่มต้น 2
+#   SCAN_MAX_QUEUED_JOBS  จำนวนงานที่รอในคิวได้สูงสุด                             ค่าเริ่มต้น 32
+#   SCAN_MAX_QUEUED_MB    ขนาดรูปรวมที่รอในคิวได้สูงสุด (MB)                      ค่าเริ่มต้น 256
+#   SHEET_URL + GCP_CREDENTIALS (service account JSON) สำหรับโหลดรายชื่อจาก worksheet
+#   ROSTER_CSV            ใช้ไฟล์ CSV แทน Google Sheet (สำหรับทดสอบในเครื่อง)
+#   GUILD_NAME            ชื่อกิลด์ (ไม่นับเป็นชื่อสมาชิก)
+#   OCR_ROI_TEMPLATE      template ตัด ROI/ย่อภาพก่อน OCR (ดู ocr_preprocess.py)       ค่าเริ่มต้น none
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.environ.get("SCAN_MAX_QUEUED_JOBS", "32"))
+MAX_QUEUED_BYTES = int(os.environ.get("SCAN_MAX_QUEUED_MB", "256")) * 1024 * 1024
+MAX_FILES_PER_JOB = 60
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+MAX_FINISHED_JOBS = 500  # เก็บผลงานที่เสร็จแล้วไว้ให้ดึงได้ (เก่าสุดถูกลบก่อน)
+GUILD_NAME = os.environ.get("GUILD_NAME", "MeAndBro")
+ROI_TEMPLATE = os.environ.get("OCR_ROI_TEMPLATE", NO_PREPROCESS)
+
+
+class ScanJob:
+    def __init__(self, boss, worksheet, images, names=None, scroll_dedupe=False):
+        self.id = uuid.uuid4().hex
+        self.boss = boss
+        self.worksheet = worksheet
+        self.images = images
+        self.names = names or [f"image{i + 1}.png" for i in range(len(images))]
+        self.scroll_dedupe = scroll_dedupe
+        self.ingest_stats = None
+        self.image_count = len(images)
+        self.queued_bytes = sum(len(data) for data in images)
+        self.status = "queued"
+        self.done = 0
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def summary(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "boss": self.boss,
+            "worksheet": self.worksheet,
+            "images": self.image_count,
+            "processed": self.done,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class RosterSource:
+    # โหลดรายชื่อของ worksheet ที่ระบุ (cache ผ่าน SheetConnection) หรือจาก CSV
+    def __init__(self):
+        self.csv_path = os.environ.get("ROSTER_CSV")
+        self.sheet_url = os.environ.get("SHEET_URL")
+        self._conn = None
+        if not self.csv_path and self.sheet_url and os.environ.get("GCP_CREDENTIALS"):
+            import gspread
+            self._conn = SheetConnection(gspread.service_account(filename=os.environ["GCP_CREDENTIALS"]))
+
+    def names(self, worksheet):
+        if self.csv_path:
+            import pandas as pd
+            df = sheet_sync.normalize_frame(pd.read_csv(self.csv_path, keep_default_na=False), DAYS_COLS)
+            return df[NAME_COL].tolist()
+        if self._conn is None:
+            return []
+        df, _ = self._conn.cached_read(
+            self.sheet_url, worksheet, lambda ws: sheet_sync.read_worksheet_frame(ws, DAYS_COLS)
+        )
+        return df[NAME_COL].tolist()
+
+
+class ScanService:
+    # คิวมีขนาดจำกัดทั้งจำนวนงานและ bytes รวม + worker จำนวนคงที่ -> อัปโหลดพร้อมกัน 200 รูปก็ไม่ล้นเครื่อง
+    def __init__(self, workers=SCAN_WORKERS, max_jobs=MAX_QUEUED_JOBS, max_bytes=MAX_QUEUED_BYTES):
+        self.workers = max(1, workers)
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(maxsize=max_jobs)
+        self.jobs = OrderedDict()
+        self.queued_bytes = 0
+        self.cache = OcrResultCache()
+        self.aliases = AliasStore()
+        self.roster = RosterSource()
+        templates = load_templates()
+        if ROI_TEMPLATE not in templates:
+            raise ValueError(f"OCR_ROI_TEMPLATE '{ROI_TEMPLATE}' not found, expected one of {list(templates)}")
+        self.preprocess = templates[ROI_TEMPLATE]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._warmups = []
+        self._alive = 0  # worker ที่ยังรับงานได้ (กำลังโหลดโมเดลหรือพร้อมแล้ว)
+        self.worker_error = None
+
+    def start(self):
+        try:
+            import torch
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+        except ImportError:
+            pass
+        with self._lock:
+            self._alive += self.workers
+        for i in range(self.workers):
+            warmup = ocr_pipeline.ReaderWarmup().start()  # preload โมเดลทุก worker พร้อมกันตอนเปิด service
+            thread = threading.Thread(target=self._worker, args=(warmup,), name=f"scan-worker-{i}", daemon=True)
+            thread.start()
+            self._warmups.append(warmup)
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def readiness(self):
+        return [w.status() for w in self._warmups]
+
+    def reserve(self, nbytes):
+        # จองพื้นที่ในคิวก่อนอ่านไฟล์เข้าหน่วยความจำ -> request พร้อมกันหลายตัวรวมกันไม่เกิน max_bytes
+        with self._lock:
+            if self.queued_bytes + nbytes > self.max_bytes:
+                raise OverflowError("queued image bytes limit reached")
+            self.queued_bytes += nbytes
+
+    def release(self, nbytes):
+        with self._lock:
+            self.queued_bytes -= nbytes
+
+    def submit(self, boss, worksheet, images, names=None, scroll_dedupe=False, reserved=0):
+        # reserved = bytes ที่จองไว้แล้วด้วย reserve() (ถ้า submit ไม่ผ่าน ผู้เรียกต้อง release เอง)
+        job = ScanJob(boss, worksheet, images, names, scroll_dedupe)
+        extra = job.queued_bytes - reserved
+        with self._lock:
+            if self._threads and self._alive <= 0:
+                raise RuntimeError(f"no OCR worker is running ({self.worker_error})")
+            if extra > 0 and self.queued_bytes + extra > self.max_bytes:
+                raise OverflowError("queued image bytes limit reached")
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise OverflowError("job queue is full")
+            self.queued_bytes += extra
+            self.jobs[job.id] = job
+            self._trim_finished()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _trim_finished(self):
+        finished = [jid for jid, j in self.jobs.items() if j.status in ("done", "error")]
+        for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self.jobs.pop(jid, None)
+
+    def _worker(self, warmup):
+        reader = warmup.wait()
+        if reader is None:
+            self._worker_failed(f"OCR model failed to load: {warmup.error}")
+            return
+        engine = ocr_pipeline.ScanEngine(reader=reader, workers=1, cache=self.cache, preprocess=self.preprocess)
+        # งานแบบตัดส่วนซ้ำ: scroll_ingest ตัด ROI/ย่อภาพไว้แล้ว ใช้ reader เดียวกันแต่ไม่ preprocess ซ้ำ
+        strip_engine = ocr_pipeline.ScanEngine(reader=reader, workers=1, cache=self.cache)
+
+        while not self._stop.is_set():
+            try:
+                job = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            job.status = "running"
+            try:
+                self._run(strip_engine if job.scroll_dedupe else engine, job)
+                job.status = "done"
+            except Exception as e:
+                job.status = "error"
+                job.error = str(e)
+            finally:
+                job.images = None  # คืนหน่วยความจำรูปทันทีที่อ่านเสร็จ
+                job.finished_at = time.time()
+                with self._lock:
+                    self.queued_bytes -= job.queued_bytes
+                self.queue.task_done()
+
+    def _worker_failed(self, error):
+        # worker ตัวสุดท้ายโหลดโมเดลไม่ขึ้น -> งานที่ค้างในคิวไม่มีใครทำแน่นอน ปิดเป็น error ทั้งหมด
+        with self._lock:
+            self._alive -= 1
+            self.worker_error = error
+            if self._alive > 0:
+                return
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            job.status = "error"
+            job.error = error
+            job.images = None
+            job.finished_at = time.time()
+            with self._lock:
+                self.queued_bytes -= job.queued_bytes
+            self.queue.task_done()
+
+    def _run(self, engine, job):
+        def on_progress(done, total):
+            job.done = done
+
+        roster = RosterIndex(self.roster.names(job.worksheet))
+        inputs, ingest_errors = job.images, []
+        if job.scroll_dedupe:
+            inputs, job.ingest_stats, ingest_errors = scroll_ingest.ingest(
+                list(zip(job.names, job.images)), self.preprocess
+            )
+        scan_result = ocr_pipeline.scan_images(
+            engine, inputs, roster, GUILD_NAME, on_progress=on_progress, aliases=self.aliases
+        )
+        job.result = {
+            "boss": job.boss,
+            "worksheet": job.worksheet,
+            "matched": scan_result["matched"],
+            "new_candidates": [
+                {
+                    "name": item["name"],
+                    "damage": item["damage"],
+                    "suggestion": list(item["suggestion"]) if item.get("suggestion") else None,
+                }
+                for item in ocr_pipeline.unique_candidates(scan_result["new_candidates"])
+            ],
+            "alias_hits": scan_result["alias_hits"],
+            "errors": [{"image": idx + 1, "error": str(e)} for idx, e in ingest_errors + scan_result["errors"]],
+            "ingest": job.ingest_stats,
+        }
+
+
+service = ScanService()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    service.start()
+    yield
+    service.stop()
+
+
+app = FastAPI(title="Guild OCR Scan Service", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {
+        "workers": service.readiness(),
+        "queued_jobs": service.queue.qsize(),
+        "queued_bytes": service.queued_bytes,
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    boss: str = Form(...),
+    worksheet: str = Form("1"),
+    files: list[UploadFile] = File(...),
+    scroll_dedupe: bool = Form(False),
+):
+    if boss not in DAYS_COLS:
+        raise HTTPException(status_code=400, detail=f"unknown boss '{boss}', expected one of {DAYS_COLS}")
+    if not files or len(files) > MAX_FILES_PER_JOB:
+        raise HTTPException(status_code=400, detail=f"send 1-{MAX_FILES_PER_JOB} images per job")
+
+    images, names = [], []
+    reserved = 0
+    try:
+        for upload in files:
+            if scroll_ingest.is_video(upload.filename) and not scroll_dedupe:
+                raise HTTPException(status_code=400, detail=f"{upload.filename}: video uploads require scroll_dedupe=true")
+            if upload.size is not None and upload.size > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=413, detail=f"{upload.filename} is larger than {MAX_IMAGE_BYTES} bytes")
+            # จองตามขนาดที่แจ้งมา (ไม่รู้ขนาด = จองเต็มเพดานต่อไฟล์) ก่อนอ่าน แล้วคืนส่วนที่เกิน
+            expected = upload.size if upload.size is not None else MAX_IMAGE_BYTES
+            service.reserve(expected)
+            reserved += expected
+            data = await upload.read(expected + 1)
+            if len(data) > expected:
+                raise HTTPException(status_code=413, detail=f"{upload.filename} is larger than {MAX_IMAGE_BYTES} bytes")
+            service.release(expected - len(data))
+            reserved -= expected - len(data)
+            images.append(data)
+            names.append(upload.filename or f"image{len(names) + 1}.png")
+        job = service.submit(boss, worksheet, images, names, scroll_dedupe, reserved=reserved)
+    except OverflowError as e:
+        service.release(reserved)
+        raise HTTPException(status_code=503, detail=f"busy: {e}, retry later", headers={"Retry-After": "30"})
+    except RuntimeError as e:
+        service.release(reserved)
+        raise HTTPException(status_code=503, detail=str(e))
+    except BaseException:
+        service.release(reserved)
+        raise
+    return job.summary()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.summary()
+
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str):
+    job = service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"job is {job.status}")
+    return job.result
@@ -0,0 +1,171 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+import perf_stats
+from ocr_preprocess import preprocess, is_noop
+
+# ==========================================
+# SCROLL INGEST (ภาพ leaderboard ที่เลื่อนต่อกัน / คลิปอัดหน้าจอ -> OCR เฉพาะแถบที่เพิ่งโผล่ใหม่)
+# ==========================================
+# หลักการ: แต่ละแถว pixel ย่อเหลือค่าเฉลี่ย PROFILE_BINS ช่อง (row profile)
+# ภาพถัดไปที่เลื่อนลง แถวบนของมันจะตรงกับแถวล่างของภาพก่อนหน้า -> หาระยะซ้อนทับที่ profile ตรงกันมากที่สุด
+# แล้วตัดเฉพาะส่วนล่างที่ยังไม่เคยเห็น (เผื่อขอบ STRIP_MARGIN_RATIO กันแถวที่ถูกตัดครึ่ง)
+PROFILE_BINS = 32
+PROFILE_TOLERANCE = 12.0  # ความต่างของค่าเฉลี่ยความสว่างที่ยังถือว่าเป็นแถวเดียวกัน (เผื่อ JPEG / วิดีโอบีบอัด)
+FLAT_ROW_CONTRAST = 8.0  # แถวที่ไม่มีตัวอักษร (พื้นเรียบ) ไม่นำมาตัดสินว่าซ้อนทับกัน
+MATCH_RATIO = 0.9
+MIN_OVERLAP_RATIO = 0.1
+MIN_INFORMATIVE_ROWS = 12
+STRIP_MARGIN_RATIO = 0.08
+MIN_NEW_ROWS = 8
+VIDEO_EXTS = ('.mp4', '.mov', '.webm', '.mkv', '.avi', '.gif')
+VIDEO_SAMPLE_SECONDS = 0.5
+MAX_VIDEO_FRAMES = 600
+
+
+def row_profiles(img_np):
+    # (H, W[, C]) -> profile (H, PROFILE_BINS) และ mask แถวพื้นเรียบ
+    gray = img_np.astype(np.float32)
+    if gray.ndim == 3:
+        gray = gray[..., :3].mean(axis=2)
+    height, width = gray.shape
+    bins = min(PROFILE_BINS, width)
+    usable = width - width % bins
+    profile = gray[:, :usable].reshape(height, bins, -1).mean(axis=2)
+    flat = (gray.max(axis=1) - gray.min(axis=1)) < FLAT_ROW_CONTRAST
+    return profile, flat
+
+
+def find_overlap(prev, cur):
+    # prev/cur: (profile, flat) -> จำนวนแถวบนของ cur ที่ซ้ำกับแถวล่างของ prev (0 = ไม่ซ้อนกัน)
+    prev_profile, prev_flat = prev
+    cur_profile, cur_flat = cur
+    if prev_profile.shape[1] != cur_profile.shape[1]:
+        return 0
+    longest = min(len(prev_profile), len(cur_profile))
+    shortest = max(MIN_INFORMATIVE_ROWS, int(len(cur_profile) * MIN_OVERLAP_RATIO))
+
+    # ภาพที่เลื่อนทีละนิดซ้อนกันมาก -> ลองจากระยะซ้อนมากไปน้อย เจอแล้วหยุด
+    for overlap in range(longest, shortest - 1, -1):
+        informative = ~(prev_flat[-overlap:] & cur_flat[:overlap])
+        count = int(informative.sum())
+        if count < MIN_INFORMATIVE_ROWS:
+            continue
+        diff = np.abs(prev_profile[-overlap:][informative] - cur_profile[:overlap][informative]).max(axis=1)
+        if (diff <= PROFILE_TOLERANCE).mean() >= MATCH_RATIO:
+            return overlap
+    return 0
+
+
+def encode_png(img_np):
+    buf = io.BytesIO()
+    Image.fromarray(img_np).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class ScrollDeduper:
+    # ป้อนภาพทีละเฟรมตามลำดับที่เลื่อน -> คืนแถบที่ต้อง OCR (หรือ None ถ้าไม่มีอะไรใหม่)
+    # template (ocr_preprocess) ถูกใช้ที่นี่ก่อนตัดแถบ -> engine ที่อ่านแถบต้องไม่ preprocess ซ้ำ
+    def __init__(self, template=None):
+        self.template = None if is_noop(template) else template
+        self._prev = None
+        self.frames = 0
+        self.strips = 0
+        self.input_pixels = 0
+        self.strip_pixels = 0
+
+    def add(self, image, source):
+        # image: PIL.Image, source: index ของไฟล์/เฟรม (ใช้รายงาน error / debug)
+        with perf_stats.stage("ocr.scroll_dedupe"):
+            return self._add(image, source)
+
+    def _add(self, image, source):
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGB")
+        if self.template is not None:
+            img_np, transform = preprocess(image, self.template)
+        else:
+            img_np, transform = np.array(image), {"offset": (0, 0), "scale": (1.0, 1.0)}
+        self.frames += 1
+        self.input_pixels += img_np.shape[0] * img_np.shape[1]
+
+        cur = row_profiles(img_np)
+        overlap = find_overlap(self._prev, cur) if self._prev is not None else 0
+        self._prev = cur
+
+        height = img_np.shape[0]
+        if height - overlap < MIN_NEW_ROWS:
+            return None  # เฟรมเดิม (ยังไม่ได้เลื่อน)
+        top = max(0, overlap - int(height * STRIP_MARGIN_RATIO)) if overlap else 0
+        strip = np.ascontiguousarray(img_np[top:])
+        self.strips += 1
+        self.strip_pixels += strip.shape[0] * strip.shape[1]
+
+        # พิกัดใน strip -> พิกัดภาพต้นฉบับ (รวม offset ของ ROI และแถวที่ตัดทิ้งด้านบน)
+        (ox, oy), (sx, sy) = transform["offset"], transform["scale"]
+        return {
+            "data": encode_png(strip),
+            "transform": {"offset": (ox, oy + top / sy), "scale": (sx, sy)},
+            "source": source,
+            "top": top,
+            "overlap": overlap,
+        }
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "strips": self.strips,
+            "input_megapixels": round(self.input_pixels / 1e6, 2),
+            "ocr_megapixels": round(self.strip_pixels / 1e6, 2),
+        }
+
+
+def is_video(filename):
+    return os.path.splitext(str(filename).lower())[1] in VIDEO_EXTS
+
+
+def sample_video_frames(data, extension, every_seconds=VIDEO_SAMPLE_SECONDS, max_frames=MAX_VIDEO_FRAMES):
+    # อ่านคลิปทีละเฟรม (ไม่โหลดทั้งคลิปเข้าหน่วยความจำ) แล้วเก็บทุก ๆ every_seconds วินาที
+    # mp4/mov/webm/mkv/avi อ่านผ่าน imageio-ffmpeg (อยู่ใน requirements.txt) / GIF ใช้ Pillow
+    import imageio.v3 as iio
+    try:
+        meta = iio.immeta(data, extension=extension)
+    except Exception:
+        meta = {}
+    fps = meta.get("fps")
+    if not fps and meta.get("duration"):
+        fps = 1000.0 / meta["duration"]  # GIF เก็บ duration ต่อเฟรมเป็นมิลลิวินาที
+    step = max(1, int(round(fps * every_seconds))) if fps else 1
+
+    sampled = 0
+    for idx, frame in enumerate(iio.imiter(data, extension=extension)):
+        if idx % step:
+            continue
+        yield Image.fromarray(np.asarray(frame))
+        sampled += 1
+        if sampled >= max_frames:
+            break
+
+
+def ingest(files, template=None, every_seconds=VIDEO_SAMPLE_SECONDS, deduper=None):
+    # files: [(ชื่อไฟล์, bytes)] เรียงตามลำดับที่เลื่อน -> (แถบที่ต้อง OCR, สถิติ, error ของไฟล์ที่อ่านไม่ได้)
+    # ส่ง deduper เดิมมาได้เมื่อแบ่งไฟล์เป็นหลายก้อน (เทียบส่วนซ้อนทับข้ามก้อนต่อได้)
+    if deduper is None:
+        deduper = ScrollDeduper(template)
+    strips, errors = [], []
+    for file_idx, (name, data) in enumerate(files):
+        try:
+            if is_video(name):
+                frames = sample_video_frames(data, os.path.splitext(name)[1].lower(), every_seconds)
+            else:
+                frames = [Image.open(io.BytesIO(data))]
+            for image in frames:
+                strip = deduper.add(image, file_idx)
+                if strip is not None:
+                    strips.append(strip)
+        except Exception as e:
+            errors.append((file_idx, e))
+    return strips, deduper.stats(), errors
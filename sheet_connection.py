@@ -0,0 +1,117 @@
+import time
+import threading
+from concurrent.futures import Future
+
+# ==========================================
+# SHEET CONNECTION (cache handle ของ Spreadsheet/Worksheet + cache ข้อมูลที่อ่านแล้วแบบมี TTL)
+# ==========================================
+DEFAULT_READ_TTL = 60  # วินาที
+
+
+class SheetConnection:
+    # ใช้ร่วมกันทุก session (ผ่าน st.cache_resource) -> คลิก Load/Compare พร้อมกันหลายคนก็ไม่ยิง API ซ้ำ
+    def __init__(self, client, read_ttl=DEFAULT_READ_TTL):
+        self.client = client
+        self.read_ttl = read_ttl
+        self._lock = threading.RLock()
+        self._spreadsheets = {}  # url -> Spreadsheet
+        self._worksheets = {}  # (url, name) -> Worksheet
+        self._reads = {}  # (url, name) -> {"value", "fetched_at", "revision"}
+        self._inflight = {}  # (url, name) -> Future ของการโหลดที่กำลังทำอยู่
+
+    def spreadsheet(self, url):
+        with self._lock:
+            sh = self._spreadsheets.get(url)
+            if sh is None:
+                sh = self.client.open_by_url(url)
+                self._spreadsheets[url] = sh
+            return sh
+
+    def worksheet(self, url, name):
+        with self._lock:
+            ws = self._worksheets.get((url, name))
+            if ws is None:
+                ws = self.spreadsheet(url).worksheet(name)
+                self._worksheets[(url, name)] = ws
+            return ws
+
+    def worksheet_titles(self, url):
+        # ดึง metadata ครั้งเดียวได้ทุกหน้า -> เก็บ handle ไว้ใช้ต่อด้วย
+        with self._lock:
+            worksheets = self.spreadsheet(url).worksheets()
+            for ws in worksheets:
+                self._worksheets[(url, ws.title)] = ws
+            return [ws.title for ws in worksheets]
+
+    def add_worksheet(self, url, name, rows="100", cols="20"):
+        with self._lock:
+            ws = self.spreadsheet(url).add_worksheet(title=name, rows=rows, cols=cols)
+            self._worksheets[(url, name)] = ws
+            self._reads.pop((url, name), None)
+            return ws
+
+    def revision(self, url):
+        # Drive modifiedTime ของทั้งไฟล์ (เบากว่าดึงค่าทั้งหน้า) ถ้าอ่านไม่ได้ถือว่าไม่รู้ revision
+        try:
+            return self.spreadsheet(url).get_lastUpdateTime()
+        except Exception:
+            return None
+
+    def cached_read(self, url, name, loader):
+        # loader(worksheet) -> ค่าที่ parse แล้ว / ภายใน TTL ใช้ค่าเดิม, เกิน TTL เช็ค revision ก่อนโหลดใหม่
+        # ไม่ถือ lock ระหว่างยิง API: หน้าเดียวกันรอ Future ของคนที่กำลังโหลด / หน้าอื่นอ่านต่อได้ทันที
+        key = (url, name)
+        with self._lock:
+            entry = self._reads.get(key)
+            if entry is not None and time.monotonic() - entry["fetched_at"] < self.read_ttl:
+                return entry["value"]
+            flight = self._inflight.get(key)
+            if flight is not None:
+                owner = False
+            else:
+                owner = True
+                flight = self._inflight[key] = Future()
+        if not owner:
+            return flight.result()
+
+        try:
+            revision = self.revision(url)
+            if entry is not None and revision is not None and revision == entry["revision"]:
+                value = entry["value"]
+            else:
+                value = loader(self.worksheet(url, name))
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    self._inflight.pop(key)
+            flight.set_exception(e)
+            raise
+
+        with self._lock:
+            # ถูก invalidate ระหว่างโหลด (เช่น มีคน Save) -> ไม่เก็บค่าที่อาจเก่าลง cache
+            if self._inflight.get(key) is flight:
+                self._inflight.pop(key)
+                self._reads[key] = {"value": value, "fetched_at": time.monotonic(), "revision": revision}
+        flight.set_result(value)
+        return value
+
+    def cached_revision(self, url, name):
+        # revision ของไฟล์ ณ ตอนที่อ่านค่าใน cache ของหน้านี้ (None = ไม่รู้)
+        with self._lock:
+            entry = self._reads.get((url, name))
+            return entry["revision"] if entry is not None else None
+
+    def invalidate(self, url, name=None):
+        # เรียกหลัง Save หรือเมื่อเกิด error (name=None = ล้างทั้งไฟล์ รวมถึง handle)
+        with self._lock:
+            if name is not None:
+                self._reads.pop((url, name), None)
+                self._inflight.pop((url, name), None)
+                return
+            self._spreadsheets.pop(url, None)
+            for key in [k for k in self._worksheets if k[0] == url]:
+                self._worksheets.pop(key, None)
+            for key in [k for k in self._reads if k[0] == url]:
+                self._reads.pop(key, None)
+            for key in [k for k in self._inflight if k[0] == url]:
+                self._inflight.pop(key, None)
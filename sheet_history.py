@@ -0,0 +1,59 @@
+import pandas as pd
+
+from sheet_sync import normalize_frame
+
+# ==========================================
+# SHEET HISTORY (โหลดหลายสัปดาห์ใน request เดียวด้วย values_batch_get)
+# ==========================================
+HISTORY_COLUMNS = ["ชื่อสมาชิก", "week", "boss", "damage"]
+
+
+def _quote_title(title):
+    return "'" + str(title).replace("'", "''") + "'"
+
+
+def order_week_titles(titles):
+    # หน้าที่ตั้งชื่อเป็นตัวเลข (1, 2, 3, ...) เรียงตามเลขสัปดาห์ ที่เหลือคงลำดับเดิมต่อท้าย
+    numeric, others = [], []
+    for title in titles:
+        try:
+            numeric.append((float(title), title))
+        except ValueError:
+            others.append(title)
+    return [t for _, t in sorted(numeric)] + others
+
+
+def values_to_frame(values, days_cols, name_col="ชื่อสมาชิก"):
+    if not values:
+        return normalize_frame(pd.DataFrame(columns=[name_col] + days_cols), days_cols, name_col)
+    header = [str(h) for h in values[0]]
+    rows = [list(row) + [""] * (len(header) - len(row)) for row in values[1:]]
+    df = pd.DataFrame([row[:len(header)] for row in rows], columns=header)
+    return normalize_frame(df, days_cols, name_col)
+
+
+def fetch_history(spreadsheet, titles, days_cols, name_col="ชื่อสมาชิก"):
+    # titles: ชื่อหน้าที่ต้องการ (เรียงเก่า -> ใหม่) -> DataFrame แบบ long: สมาชิก / week / boss / damage
+    if not titles:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+    response = spreadsheet.values_batch_get(
+        [_quote_title(t) for t in titles],
+        params={"valueRenderOption": "UNFORMATTED_VALUE"},
+    )
+
+    frames = []
+    for title, value_range in zip(titles, response.get("valueRanges", [])):
+        wide = values_to_frame(value_range.get("values", []), days_cols, name_col)
+        wide[name_col] = wide[name_col].str.strip()
+        wide = wide[wide[name_col] != ""]
+        long = wide.melt(id_vars=[name_col], value_vars=days_cols, var_name="boss", value_name="damage")
+        long.insert(1, "week", str(title))
+        frames.append(long)
+
+    if not frames:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    history = pd.concat(frames, ignore_index=True)
+    history["week"] = pd.Categorical(history["week"], categories=[str(t) for t in titles], ordered=True)
+    history["boss"] = pd.Categorical(history["boss"], categories=days_cols, ordered=True)
+    return history[HISTORY_COLUMNS]
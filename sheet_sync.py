@@ -0,0 +1,197 @@
+import math
+
+import numpy as np
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+import perf_stats
+
+# ==========================================
+# SHEET DIFF (เทียบตารางปัจจุบันกับ snapshot ที่โหลดมา แล้วส่งเฉพาะเซลล์ที่เปลี่ยน)
+# ==========================================
+DATA_START_ROW = 2  # แถว 1 เป็นหัวตาราง
+
+
+def normalize_frame(df, days_cols, name_col="ชื่อสมาชิก"):
+    # เติมคอลัมน์ที่ขาด + แปลงดาเมจเป็นตัวเลข (ค่าที่อ่านไม่ได้ = 0)
+    if name_col not in df.columns:
+        df[name_col] = ""
+    for col in days_cols:
+        if col not in df.columns:
+            df[col] = 0.0
+
+    df[name_col] = df[name_col].astype(str)
+    for col in days_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+
+def read_worksheet_frame(worksheet, days_cols, name_col="ชื่อสมาชิก"):
+    # get_all_records -> DataFrame ที่ normalize แล้ว + header ตามลำดับบน Sheet
+    data = worksheet.get_all_records()
+    df = normalize_frame(pd.DataFrame(data), days_cols, name_col)
+
+    # get_all_records คืน dict ตามลำดับหัวตาราง จึงได้ header มาโดยไม่ต้องเรียก API เพิ่ม
+    sheet_header = list(data[0].keys()) if data else [name_col] + list(days_cols)
+    return df, sheet_header
+
+
+def clean_value(item):
+    if isinstance(item, (int, float, np.integer, np.floating)):
+        return float(item)
+    return str(item)
+
+
+def to_sheet_rows(df, export_cols):
+    return [[clean_value(item) for item in row] for row in df[export_cols].values.tolist()]
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def _a1_range(row1, col1, row2, col2):
+    return f"{rowcol_to_a1(row1, col1)}:{rowcol_to_a1(row2, col2)}"
+
+
+def diff_rows(old_rows, new_rows, start_row=DATA_START_ROW):
+    # เทียบทีละตำแหน่ง: เซลล์ที่ต่างกันติดกันในแถวเดียวรวมเป็น range เดียว / แถวที่เพิ่มส่งเป็นก้อนเดียว
+    data = []
+    cells = 0
+
+    for r, (old, new) in enumerate(zip(old_rows, new_rows)):
+        c = 0
+        while c < len(new):
+            if c < len(old) and _same(old[c], new[c]):
+                c += 1
+                continue
+            start = c
+            while c < len(new) and not (c < len(old) and _same(old[c], new[c])):
+                c += 1
+            sheet_row = start_row + r
+            data.append({"range": _a1_range(sheet_row, start + 1, sheet_row, c), "values": [new[start:c]]})
+            cells += c - start
+
+    appended = new_rows[len(old_rows):]
+    if appended:
+        first_row = start_row + len(old_rows)
+        width = max(len(row) for row in appended)
+        data.append({
+            "range": _a1_range(first_row, 1, first_row + len(appended) - 1, width),
+            "values": appended,
+        })
+        cells += sum(len(row) for row in appended)
+
+    return {
+        "data": data,
+        "cells": cells,
+        "appended": len(appended),
+        "deleted": max(0, len(old_rows) - len(new_rows)),
+    }
+
+
+# ==========================================
+# LOAD / SAVE WORKSHEET (ใช้ร่วมกันระหว่างหน้า Streamlit และ bench.py)
+# ==========================================
+# conn: SheetConnection / snapshot: {"header", "rows"} ของข้อมูลบน Sheet ล่าสุด (ผู้เรียกเป็นคนเก็บ)
+
+
+def _read_timed(worksheet, days_cols, name_col):
+    # เรียกเฉพาะตอน cache ไม่มี/หมดอายุ -> เวลานี้คือเวลาอ่านจาก Google API จริง
+    with perf_stats.stage("sheets.read_api") as timer:
+        df, header = read_worksheet_frame(worksheet, days_cols, name_col)
+        timer.add_payload(df.values.tolist())
+    return df, header
+
+
+def load_sheet(conn, sheet_url, worksheet_name, days_cols, name_col="ชื่อสมาชิก"):
+    # คืนค่า (DataFrame, header บน Sheet, snapshot rows, revision ของไฟล์ตอนอ่าน) / ไม่มีหน้านี้ -> สร้างหน้าใหม่พร้อมหัวตาราง
+    export_cols = [name_col] + list(days_cols)
+    try:
+        conn.worksheet(sheet_url, worksheet_name)
+    except Exception:
+        worksheet = conn.add_worksheet(sheet_url, worksheet_name, rows="100", cols="20")
+        worksheet.append_row(export_cols)
+        return pd.DataFrame(columns=export_cols), export_cols, [], conn.revision(sheet_url)
+
+    # ค่าใน cache ใช้ร่วมกันทุก session ต้อง copy ก่อนเอาไปแก้
+    with perf_stats.stage("sheets.load"):
+        df, sheet_header = conn.cached_read(
+            sheet_url, worksheet_name, lambda ws: _read_timed(ws, days_cols, name_col)
+        )
+    df = df.copy()
+
+    with perf_stats.stage("df.to_sheet_rows"):
+        snapshot_rows = to_sheet_rows(df, export_cols)
+    return df, sheet_header, snapshot_rows, conn.cached_revision(sheet_url, worksheet_name)
+
+
+def read_remote(conn, sheet_url, worksheet_name, days_cols, name_col="ชื่อสมาชิก"):
+    # อ่านค่าปัจจุบันบน Sheet ตรง ๆ (ไม่ผ่าน cache) -> (header, rows) หรือ None ถ้ายังไม่มีหน้านี้
+    try:
+        worksheet = conn.worksheet(sheet_url, worksheet_name)
+    except Exception:
+        return None
+    df, header = _read_timed(worksheet, days_cols, name_col)
+    return header, to_sheet_rows(df, [name_col] + list(days_cols))
+
+
+def remote_changed(snapshot, header, rows):
+    # ค่าบน Sheet ต่างจาก snapshot ที่เราใช้ diff หรือไม่ (แทรก/ลบ/แก้แถว หรือหัวตารางเปลี่ยน)
+    if snapshot is None:
+        return bool(rows)
+    if list(snapshot["header"]) != list(header):
+        return True
+    diff = diff_rows(snapshot["rows"], rows)
+    return bool(diff["data"] or diff["deleted"])
+
+
+def save_full(worksheet, export_cols, clean_list):
+    with perf_stats.stage("sheets.write_full") as timer:
+        worksheet.clear()
+        worksheet.update([export_cols])
+        if clean_list:
+            worksheet.update("A2", clean_list)
+        timer.add_payload([export_cols] + clean_list)
+    return {"cells": len(export_cols) + sum(len(row) for row in clean_list), "appended": len(clean_list), "deleted": 0}
+
+
+def save_diff(worksheet, snapshot, clean_list):
+    with perf_stats.stage("sheets.diff"):
+        diff = diff_rows(snapshot["rows"], clean_list)
+
+    with perf_stats.stage("sheets.write_diff") as timer:
+        needed_rows = DATA_START_ROW - 1 + len(clean_list)
+        if diff["appended"] and worksheet.row_count < needed_rows:
+            worksheet.add_rows(needed_rows - worksheet.row_count)
+        if diff["data"]:
+            worksheet.batch_update(diff["data"])
+        if diff["deleted"]:
+            first_deleted = DATA_START_ROW + len(clean_list)
+            worksheet.delete_rows(first_deleted, first_deleted + diff["deleted"] - 1)
+        timer.add_payload(diff["data"])
+    return diff
+
+
+def save_sheet(conn, sheet_url, worksheet_name, df, days_cols, snapshot=None, mode="diff", name_col="ชื่อสมาชิก"):
+    # mode="diff" ส่งเฉพาะเซลล์ที่เปลี่ยนจาก snapshot (ไม่มี snapshot หรือหัวตารางไม่ตรง -> เขียนใหม่ทั้งหน้า)
+    # คืนค่า (ผลการเขียน, header, rows) -> header/rows คือ snapshot ใหม่หลังบันทึก
+    try:
+        worksheet = conn.worksheet(sheet_url, worksheet_name)
+    except Exception:
+        worksheet = conn.add_worksheet(sheet_url, worksheet_name, rows="100", cols="20")
+
+    export_cols = [name_col] + list(days_cols)
+    for c in export_cols:
+        if c not in df.columns: df[c] = 0
+
+    with perf_stats.stage("df.to_sheet_rows"):
+        clean_list = to_sheet_rows(df, export_cols)
+    if mode == "diff" and snapshot is not None and snapshot["header"] == export_cols:
+        result = save_diff(worksheet, snapshot, clean_list)
+    else:
+        result = save_full(worksheet, export_cols, clean_list)
+    conn.invalidate(sheet_url, worksheet_name)
+    return result, export_cols, clean_list
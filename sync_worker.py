@@ -0,0 +1,148 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import perf_stats
+import sheet_sync
+
+# ==========================================
+# SHEET SYNC WORKER (thread เบื้องหลัง ส่งการแก้ไขจาก LocalStore ขึ้น Google Sheets)
+# ==========================================
+# save ในเครื่องหลายครั้งระหว่างรอบ -> ส่งแค่ revision ล่าสุดครั้งเดียว (diff เทียบ snapshot ที่อยู่บน Sheet)
+# ส่งไม่สำเร็จ -> retry แบบ exponential backoff + jitter ต่อหน้า
+# เจอ 429 / quota -> พักทุกหน้าอย่างน้อย QUOTA_COOLDOWN_SECONDS (โควต้านับรวมทั้ง service account)
+# Sheets API จำกัด write request ต่อนาที -> เว้นระยะระหว่างการส่งแต่ละหน้าตาม SYNC_WRITES_PER_MINUTE
+# ก่อนส่งเทียบ revision ของไฟล์กับตอนได้ snapshot: เปลี่ยน -> อ่านหน้านั้นจริงมาเทียบ ถ้ามีคนแก้ -> conflict ไม่เขียนทับ
+SYNC_POLL_SECONDS = 5.0
+SYNC_WRITES_PER_MINUTE = int(os.environ.get("SYNC_WRITES_PER_MINUTE", "20"))
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+QUOTA_COOLDOWN_SECONDS = 60.0
+logger = logging.getLogger(__name__)
+CONFLICT_MESSAGE = "Google Sheet ถูกแก้จากที่อื่นหลังโหลดครั้งล่าสุด (ยังไม่ได้ส่งการแก้ไขในเครื่อง)"
+
+
+def is_quota_error(error):
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    text = str(error)
+    return "429" in text or "RATE_LIMIT_EXCEEDED" in text or "Quota exceeded" in text
+
+
+def retry_delay(attempts):
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+class SheetSyncWorker:
+    # 1 ตัวต่อ process (st.cache_resource) ใช้ SheetConnection ร่วมกับหน้าเว็บ
+    def __init__(self, store, conn, days_cols, writes_per_minute=SYNC_WRITES_PER_MINUTE, poll_seconds=SYNC_POLL_SECONDS):
+        self.store = store
+        self.conn = conn
+        self.days_cols = list(days_cols)
+        self.min_interval = 60.0 / max(1, writes_per_minute)
+        self.poll_seconds = poll_seconds
+        self.paused_until = 0.0
+        self._last_push = 0.0
+        self._failures = {}  # (url, หน้า) -> จำนวนครั้งที่พังนอกการส่ง (store อ่าน/เขียนไม่ได้ ฯลฯ)
+        self.last_error = None  # error ล่าสุดของ loop ที่ไม่ผูกกับหน้าใด (แสดงในหน้าเว็บ)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        # มี save ใหม่ -> ตื่นมาส่งทันทีไม่ต้องรอรอบ poll
+        self._wake.set()
+
+    def quota_wait(self):
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_pending()
+                self.last_error = None
+            except Exception as e:
+                # เช่น อ่านรายการหน้าที่ค้างจาก store ไม่ได้ -> ลองใหม่รอบหน้า
+                self.last_error = e
+                logger.exception("sheet sync loop failed")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def sync_pending(self):
+        # ส่งทุกหน้าที่ค้าง -> คืนจำนวนหน้าที่ส่งสำเร็จ
+        synced = 0
+        for sheet_url, worksheet in self.store.pending():
+            if self.quota_wait() > 0 or self._stop.is_set():
+                break
+            wait = self._last_push + self.min_interval - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            try:
+                synced += self.sync_one(sheet_url, worksheet)
+            except Exception as e:
+                self._record_failure(sheet_url, worksheet, e)
+            else:
+                self._failures.pop((sheet_url, worksheet), None)
+        return synced
+
+    def _record_failure(self, sheet_url, worksheet, error):
+        # checkout / mark_synced พัง (ไม่ใช่ error จาก Sheets ซึ่ง sync_one บันทึกเองแล้ว) -> ลงสถานะของหน้านั้นพร้อม backoff
+        key = (sheet_url, worksheet)
+        self._failures[key] = self._failures.get(key, 0) + 1
+        logger.exception("sheet sync failed for %s / %s", sheet_url, worksheet)
+        try:
+            self.store.mark_failed(sheet_url, worksheet, error, time.time() + retry_delay(self._failures[key]))
+        except Exception:
+            self.last_error = error
+            logger.exception("could not record sync failure for %s / %s", sheet_url, worksheet)
+
+    def sync_one(self, sheet_url, worksheet):
+        job = self.store.checkout(sheet_url, worksheet)
+        if job is None:
+            return True
+        self._last_push = time.monotonic()
+        try:
+            if self._remote_changed(sheet_url, worksheet, job):
+                self.store.mark_conflict(sheet_url, worksheet, CONFLICT_MESSAGE)
+                return False
+            with perf_stats.stage("sync.push"):
+                result, header, rows = sheet_sync.save_sheet(
+                    self.conn, sheet_url, worksheet, job["df"], self.days_cols,
+                    snapshot=job["snapshot"], mode="full" if job["force_full"] else "diff",
+                )
+            sheet_revision = self.conn.revision(sheet_url)
+        except Exception as e:
+            self.conn.invalidate(sheet_url)
+            delay = retry_delay(job["attempts"] + 1)
+            if is_quota_error(e):
+                delay = max(delay, QUOTA_COOLDOWN_SECONDS)
+                self.paused_until = time.monotonic() + delay
+            self.store.mark_failed(sheet_url, worksheet, e, time.time() + delay)
+            return False
+        self.store.mark_synced(sheet_url, worksheet, job["revision"], header, rows, result, sheet_revision)
+        return True
+
+    def _remote_changed(self, sheet_url, worksheet, job):
+        # revision เท่าเดิม = ไม่มีใครเขียนไฟล์นี้ตั้งแต่ได้ snapshot / ไม่เท่า (หรือไม่รู้) -> อาจเป็นหน้าอื่นในไฟล์เดียวกัน
+        # จึงอ่านหน้านี้จริงมาเทียบ snapshot ก่อนตัดสิน (diff ตามตำแหน่งแถวจะผิดแถวถ้ามีคนแทรก/ลบแถวไว้)
+        current = self.conn.revision(sheet_url)
+        if current is not None and current == job["sheet_revision"]:
+            return False
+        remote = sheet_sync.read_remote(self.conn, sheet_url, worksheet, self.days_cols)
+        if remote is None:
+            return False
+        header, rows = remote
+        return sheet_sync.remote_changed(job["snapshot"], header, rows)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# โมดูลของแอปอยู่ที่ root ของ repo (ไม่ได้เป็น package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guild_config import NAME_COL, DAYS_COLS  # noqa: E402
+
+SHEET_URL = "https://example.invalid/spreadsheets/d/test"
+WORKSHEET = "1"
+
+
+def roster_frame(rows):
+    # rows: [(ชื่อ, ดาเมจบอสแรก)] บอสที่เหลือเป็น 1
+    return pd.DataFrame({
+        NAME_COL: [name for name, _ in rows],
+        **{col: [damage if i == 0 else 1 for _, damage in rows] for i, col in enumerate(DAYS_COLS)},
+    })
+
+
+@pytest.fixture
+def store():
+    from local_store import LocalStore
+    store = LocalStore(":memory:")
+    yield store
+    store.close()
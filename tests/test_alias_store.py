@@ -0,0 +1,23 @@
+import pytest
+
+from alias_store import AliasStore
+
+
+def test_record_many_persists_across_reload(tmp_path):
+    path = str(tmp_path / "aliases.json")
+    store = AliasStore(path)
+    assert store.record_many([("Shad0wBlade", "ShadowBlade"), ("ShadowBlade", "ShadowBlade")]) == 1
+    assert AliasStore(path).lookup(" Shad0wBlade ") == "ShadowBlade"
+
+
+def test_failed_save_leaves_memory_unchanged(tmp_path, monkeypatch):
+    store = AliasStore(str(tmp_path / "aliases.json"))
+
+    def read_only(aliases):
+        raise OSError("Read-only file system")
+
+    monkeypatch.setattr(store, "_save", read_only)
+    with pytest.raises(OSError):
+        store.record_many([("Shad0wBlade", "ShadowBlade")])
+    assert store.lookup("Shad0wBlade") is None
+    assert len(store) == 0
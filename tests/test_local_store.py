@@ -0,0 +1,111 @@
+import pandas as pd
+
+from local_store import LocalStore, STATUS_CONFLICT, STATUS_PENDING, STATUS_RETRYING, STATUS_SYNCED
+from conftest import SHEET_URL, WORKSHEET, roster_frame
+
+
+def status(store):
+    return store.statuses(SHEET_URL)[0]
+
+
+def test_load_missing_returns_none(store):
+    assert store.load(SHEET_URL, WORKSHEET) is None
+    assert not store.has(SHEET_URL, WORKSHEET)
+
+
+def test_import_remote_is_synced(store):
+    df = roster_frame([("A", 10), ("B", 20)])
+    store.import_remote(SHEET_URL, WORKSHEET, df, list(df.columns), [["A", 10.0]], "rev-1")
+    pd.testing.assert_frame_equal(store.load(SHEET_URL, WORKSHEET), df)
+    assert not store.has_unsynced(SHEET_URL, WORKSHEET)
+    assert store.pending() == []
+    assert store.sheet_revision(SHEET_URL, WORKSHEET) == "rev-1"
+
+
+def test_saves_coalesce_into_latest_revision(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]))
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 2)]))
+    assert store.pending() == [(SHEET_URL, WORKSHEET)]
+    assert status(store)["unsynced_saves"] == 2
+
+    job = store.checkout(SHEET_URL, WORKSHEET)
+    assert job["revision"] == 2
+    assert job["df"].iloc[0, 1] == 2
+
+    store.mark_synced(SHEET_URL, WORKSHEET, job["revision"], ["h"], [["A", 2.0]], {"cells": 1}, "rev-2")
+    assert store.pending() == []
+    assert status(store)["status"] == STATUS_SYNCED
+    assert store.sheet_revision(SHEET_URL, WORKSHEET) == "rev-2"
+
+
+def test_mark_synced_racing_a_new_save_stays_pending(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]))
+    job = store.checkout(SHEET_URL, WORKSHEET)
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 5)]))  # save ระหว่างที่ worker กำลังส่ง revision 1
+
+    store.mark_synced(SHEET_URL, WORKSHEET, job["revision"], ["h"], [["A", 1.0]], {"cells": 1})
+    assert status(store)["status"] == STATUS_PENDING
+    assert status(store)["unsynced_saves"] == 1
+
+    job = store.checkout(SHEET_URL, WORKSHEET)
+    assert job["revision"] == 2
+    assert job["snapshot"]["rows"] == [["A", 1.0]]  # diff รอบถัดไปเทียบกับค่าที่เพิ่งขึ้น Sheet
+    assert job["df"].iloc[0, 1] == 5
+
+
+def test_force_full_survives_until_its_revision_is_synced(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]), full=True)
+    job = store.checkout(SHEET_URL, WORKSHEET)
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 2)]))
+    store.mark_synced(SHEET_URL, WORKSHEET, job["revision"], ["h"], [], {})
+    assert store.checkout(SHEET_URL, WORKSHEET)["force_full"]
+
+
+def test_mark_failed_backs_off_until_retry_now(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]))
+    store.checkout(SHEET_URL, WORKSHEET)
+    store.mark_failed(SHEET_URL, WORKSHEET, RuntimeError("boom"), retry_at=1e12)
+    assert status(store)["status"] == STATUS_RETRYING
+    assert status(store)["last_error"] == "boom"
+    assert store.pending() == []
+
+    store.retry_now(SHEET_URL)
+    assert store.pending() == [(SHEET_URL, WORKSHEET)]
+
+
+def test_conflict_blocks_sync_until_resolved(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]))
+    store.mark_conflict(SHEET_URL, WORKSHEET, "changed upstream")
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 2)]))
+    assert status(store)["status"] == STATUS_CONFLICT
+    assert store.pending() == []
+    assert store.checkout(SHEET_URL, WORKSHEET) is None
+
+    store.resolve_conflict(SHEET_URL, WORKSHEET, "rev-9")
+    job = store.checkout(SHEET_URL, WORKSHEET)
+    assert job["force_full"] and job["sheet_revision"] == "rev-9"
+
+
+def test_import_remote_discards_local_edits(store):
+    store.save(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]))
+    store.mark_conflict(SHEET_URL, WORKSHEET, "changed upstream")
+    remote = roster_frame([("Z", 9)])
+    store.import_remote(SHEET_URL, WORKSHEET, remote, list(remote.columns), [], "rev-3")
+    assert status(store)["status"] == STATUS_SYNCED
+    assert not store.has_unsynced(SHEET_URL, WORKSHEET)
+    assert store.load(SHEET_URL, WORKSHEET).iloc[0, 0] == "Z"
+
+
+def test_state_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    first = LocalStore(path)
+    first.import_remote(SHEET_URL, WORKSHEET, roster_frame([("A", 1)]), ["h"], [["A", 1.0]], "rev-1")
+    first.save(SHEET_URL, WORKSHEET, roster_frame([("A", 3)]))
+    first.close()
+
+    second = LocalStore(path)
+    job = second.checkout(SHEET_URL, WORKSHEET)
+    assert job["snapshot"]["rows"] == [["A", 1.0]]
+    assert job["sheet_revision"] == "rev-1"
+    assert job["df"].iloc[0, 1] == 3
+    second.close()
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from roster_view import RosterView
+from guild_config import NAME_COL, DAYS_COLS
+from conftest import roster_frame
+
+
+def make_view():
+    # damage 0 = ยังไม่ได้ตีบอสแรก
+    return RosterView(roster_frame([
+        ("ShadowBlade", 100), ("xXshadowXx", 0), ("สมชาย", 50), ("Dark_Wolf", 0), ("Moon", 30),
+    ]))
+
+
+def names(view, positions):
+    return view.df.iloc[positions][NAME_COL].tolist()
+
+
+def test_search_is_case_and_symbol_insensitive():
+    view = make_view()
+    assert names(view, view.matches("SHADOW")) == ["ShadowBlade", "xXshadowXx"]
+    assert names(view, view.matches("dark wolf")) == ["Dark_Wolf"]
+    assert names(view, view.matches("สม")) == ["สมชาย"]
+    assert len(view.matches("")) == 5
+
+
+def test_zero_filter_uses_precomputed_mask():
+    view = make_view()
+    assert names(view, view.matches("", zeros_only=True)) == ["xXshadowXx", "Dark_Wolf"]
+    assert names(view, view.matches("shadow", zeros_only=True)) == ["xXshadowXx"]
+
+
+def test_narrowing_from_symbol_only_prefix():
+    view = RosterView(roster_frame([("abc", 1), ("x.y", 1)]))
+    assert names(view, view.matches(".")) == ["x.y"]
+    assert names(view, view.matches(".a")) == ["abc"]  # key "a" ไม่ถูกตัดทิ้งเพราะผลของ "." ที่ cache ไว้
+
+
+def test_incremental_search_matches_fresh_view():
+    view = make_view()
+    term = ""
+    for ch in "shadowx":
+        term += ch
+        assert list(view.matches(term)) == list(make_view().matches(term))
+
+
+def test_page_keeps_row_ids():
+    view = make_view()
+    page = view.page(view.matches(""), 1, page_size=2)
+    assert page.index.tolist() == [2, 3]
+    assert page[NAME_COL].tolist() == ["สมชาย", "Dark_Wolf"]
+
+
+def test_write_back_updates_only_edited_rows_by_id():
+    view = make_view()
+    df = view.df
+    page = view.page(view.matches("", zeros_only=True), 0, page_size=10)  # แถว id 1, 3
+    edited = page.copy()
+    edited.loc[3, DAYS_COLS[0]] = 500
+    edited.loc[3, NAME_COL] = "Night_Wolf"
+
+    report = view.write_back(page, edited)
+    assert report == {"updated": 1, "inserted": 0, "deleted": 0}
+    assert view.df is df  # แก้ในที่ ไม่ copy ทั้งตาราง
+    assert df.loc[3, NAME_COL] == "Night_Wolf" and df.loc[3, DAYS_COLS[0]] == 500
+    assert df.loc[1, DAYS_COLS[0]] == 0
+    assert names(view, view.matches("night wolf")) == ["Night_Wolf"]
+    assert names(view, view.matches("", zeros_only=True)) == ["xXshadowXx"]
+
+
+def test_write_back_without_changes_is_a_no_op():
+    view = make_view()
+    page = view.page(view.matches(""), 0)
+    assert view.write_back(page, page.copy()) == {"updated": 0, "inserted": 0, "deleted": 0}
+
+
+def test_write_back_deletes_and_inserts_with_fresh_ids():
+    view = make_view()
+    page = view.page(view.matches(""), 0, page_size=2)  # id 0, 1
+    edited = page.drop(index=[1])
+    # data_editor ให้ id แถวใหม่ = id สูงสุดของหน้า + 1 ซึ่งชนกับแถว id 2 ที่อยู่นอกหน้านี้
+    edited.loc[2] = ["NewMember"] + [7] * len(DAYS_COLS)
+
+    report = view.write_back(page, edited)
+    assert report == {"updated": 0, "inserted": 1, "deleted": 1}
+    df = view.df
+    assert df.index.is_unique
+    assert 1 not in df.index
+    assert df.loc[2, NAME_COL] == "สมชาย"  # แถวเดิมนอกหน้าไม่ถูกทับ
+    assert df.loc[5, NAME_COL] == "NewMember"
+    assert len(df) == 5
+    assert names(view, view.matches("newmember")) == ["NewMember"]
+    assert view.is_current(df)
+
+
+def test_write_back_widens_dtype_for_cleared_cells():
+    view = make_view()
+    page = view.page(view.matches(""), 0, page_size=1)
+    edited = page.copy()
+    edited[DAYS_COLS[0]] = edited[DAYS_COLS[0]].astype(float)
+    edited.loc[0, DAYS_COLS[0]] = np.nan
+
+    view.write_back(page, edited)
+    assert pd.isna(view.df.loc[0, DAYS_COLS[0]])
+    assert view.df.loc[1, DAYS_COLS[0]] == 0
@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ocr_pipeline
+
+
+class FakePool(ThreadPoolExecutor):
+    # ใช้ thread แทน process: ไม่ต้องโหลด EasyOCR ใน worker
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers)
+        self.closed = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+        assert not cancel_futures
+        super().shutdown(wait=wait)
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    gate = threading.Event()
+
+    def fake_ocr(data, template=None):
+        gate.wait(5)
+        return [data], 0.0, 0.0
+
+    monkeypatch.setattr(ocr_pipeline, "ProcessPoolExecutor", FakePool)
+    monkeypatch.setattr(ocr_pipeline, "_ocr_in_worker", fake_ocr)
+    return gate
+
+
+def test_shutdown_waits_for_running_scan(gate):
+    engine = ocr_pipeline.ScanEngine(workers=2)
+    scan = engine.with_preprocess(None).iter_read([b"a", b"b", b"c", b"d", b"e"])
+    gate.set()
+    assert next(scan)[0] == 0
+    pool = engine._shared["pool"]
+
+    engine.shutdown(wait=False)  # อีก session เปลี่ยนจำนวน workers ระหว่างที่ยังสแกนไม่เสร็จ
+    assert not pool.closed
+    rest = list(scan)
+    assert [idx for idx, _, error in rest if error is None] == [1, 2, 3, 4]
+    assert pool.closed
+
+
+def test_idle_engine_shuts_down_immediately(gate):
+    gate.set()
+    engine = ocr_pipeline.ScanEngine(workers=2)
+    assert len(engine.read_all([b"a"])) == 1
+    pool = engine._shared["pool"]
+    assert not pool.closed
+    engine.shutdown()
+    assert pool.closed and engine._shared["pool"] is None
+
+
+def test_cancelled_scan_releases_pool(gate):
+    engine = ocr_pipeline.ScanEngine(workers=2)
+    cancel = threading.Event()
+    scan = engine.iter_read([b"a", b"b", b"c"], cancel=cancel)
+    gate.set()
+    next(scan)
+    cancel.set()
+    assert list(scan) == []
+    assert engine._shared["users"] == 0
@@ -0,0 +1,162 @@
+import pandas as pd
+import pytest
+
+import sheet_sync
+from fake_gspread import FakeClient
+from sheet_connection import SheetConnection
+from sync_worker import SheetSyncWorker, QUOTA_COOLDOWN_SECONDS
+from local_store import STATUS_CONFLICT, STATUS_PENDING, STATUS_RETRYING, STATUS_SYNCED
+from guild_config import NAME_COL, DAYS_COLS
+from conftest import SHEET_URL, WORKSHEET
+
+HEADER = [NAME_COL] + list(DAYS_COLS)
+
+
+def sheet_row(name, first):
+    return [name, first] + [1] * (len(DAYS_COLS) - 1)
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    client.spreadsheet(SHEET_URL).seed(WORKSHEET, [HEADER, sheet_row("A", 10), sheet_row("B", 20)])
+    return client
+
+
+@pytest.fixture
+def conn(client):
+    return SheetConnection(client)
+
+
+@pytest.fixture
+def worker(store, conn):
+    return SheetSyncWorker(store, conn, DAYS_COLS, writes_per_minute=60_000)
+
+
+def load_into(store, conn):
+    df, header, rows, revision = sheet_sync.load_sheet(conn, SHEET_URL, WORKSHEET, DAYS_COLS)
+    store.import_remote(SHEET_URL, WORKSHEET, df, header, rows, revision)
+    return df
+
+
+def cells(client, title=WORKSHEET):
+    return client.spreadsheet(SHEET_URL)._worksheets[title].cells
+
+
+def status(store):
+    return store.statuses(SHEET_URL)[0]
+
+
+def test_diff_push_writes_only_changed_cells(store, conn, client, worker):
+    df = load_into(store, conn)
+    df.loc[df[NAME_COL] == "B", DAYS_COLS[0]] = 99
+    store.save(SHEET_URL, WORKSHEET, df)
+    client.reset_calls()
+
+    assert worker.sync_one(SHEET_URL, WORKSHEET)
+    assert client.calls["batch_update"] == 1 and client.calls["clear"] == 0
+    assert cells(client)[2][:2] == ["B", 99]
+    assert status(store)["status"] == STATUS_SYNCED
+    assert status(store)["last_result"]["cells"] == 1
+
+
+def test_coalesced_saves_push_once(store, conn, client, worker):
+    df = load_into(store, conn)
+    for damage in (30, 40, 50):
+        df.loc[0, DAYS_COLS[0]] = damage
+        store.save(SHEET_URL, WORKSHEET, df)
+    client.reset_calls()
+
+    assert worker.sync_pending() == 1
+    assert client.calls["batch_update"] == 1
+    assert cells(client)[1][1] == 50
+    assert store.pending() == []
+
+
+def test_row_inserted_upstream_is_a_conflict(store, conn, client, worker):
+    df = load_into(store, conn)
+    ws = client.spreadsheet(SHEET_URL).worksheet(WORKSHEET)
+    ws.update("A2", [sheet_row("Z", 5), sheet_row("A", 10), sheet_row("B", 20)])  # มีคนแทรกแถวบนสุด
+    before = [list(row) for row in cells(client)]
+
+    df.loc[df[NAME_COL] == "B", DAYS_COLS[0]] = 99
+    store.save(SHEET_URL, WORKSHEET, df)
+    assert not worker.sync_one(SHEET_URL, WORKSHEET)
+
+    assert cells(client) == before  # ไม่เขียนทับแถวของคนอื่น
+    assert status(store)["status"] == STATUS_CONFLICT
+    assert store.pending() == []
+
+
+def test_write_to_another_tab_still_syncs(store, conn, client, worker):
+    df = load_into(store, conn)
+    client.spreadsheet(SHEET_URL).seed("2", [HEADER])  # revision ของไฟล์ขยับ แต่หน้านี้ไม่เปลี่ยน
+    df.loc[0, DAYS_COLS[0]] = 77
+    store.save(SHEET_URL, WORKSHEET, df)
+
+    assert worker.sync_one(SHEET_URL, WORKSHEET)
+    assert cells(client)[1][1] == 77
+    assert status(store)["status"] == STATUS_SYNCED
+
+
+def test_resolve_conflict_rewrites_the_sheet(store, conn, client, worker):
+    df = load_into(store, conn)
+    client.spreadsheet(SHEET_URL).worksheet(WORKSHEET).update("A2", [sheet_row("Z", 5)])
+    store.save(SHEET_URL, WORKSHEET, df)
+    assert not worker.sync_one(SHEET_URL, WORKSHEET)
+
+    store.resolve_conflict(SHEET_URL, WORKSHEET, conn.revision(SHEET_URL))
+    assert worker.sync_one(SHEET_URL, WORKSHEET)
+    assert [row[0] for row in cells(client)] == [NAME_COL, "A", "B"]
+
+
+def test_save_during_push_stays_pending(store, conn, client, worker, monkeypatch):
+    df = load_into(store, conn)
+    df.loc[0, DAYS_COLS[0]] = 11
+    store.save(SHEET_URL, WORKSHEET, df)
+
+    ws = client.spreadsheet(SHEET_URL).worksheet(WORKSHEET)
+    push = ws.batch_update
+    newer = df.copy()
+    newer.loc[0, DAYS_COLS[0]] = 12
+
+    def batch_update_and_save(data):
+        push(data)
+        store.save(SHEET_URL, WORKSHEET, newer)
+
+    monkeypatch.setattr(ws, "batch_update", batch_update_and_save)
+    assert worker.sync_one(SHEET_URL, WORKSHEET)
+    assert status(store)["status"] == STATUS_PENDING
+
+    monkeypatch.setattr(ws, "batch_update", push)
+    assert worker.sync_one(SHEET_URL, WORKSHEET)
+    assert cells(client)[1][1] == 12
+    assert status(store)["status"] == STATUS_SYNCED
+
+
+def test_quota_error_pauses_and_retries(store, conn, client, worker, monkeypatch):
+    df = load_into(store, conn)
+    df.loc[0, DAYS_COLS[0]] = 11
+    store.save(SHEET_URL, WORKSHEET, df)
+
+    def over_quota(data):
+        raise RuntimeError("APIError: [429]: Quota exceeded for quota metric 'Write requests'")
+
+    monkeypatch.setattr(client.spreadsheet(SHEET_URL).worksheet(WORKSHEET), "batch_update", over_quota)
+    assert not worker.sync_one(SHEET_URL, WORKSHEET)
+    assert status(store)["status"] == STATUS_RETRYING
+    assert "429" in status(store)["last_error"]
+    assert worker.quota_wait() > QUOTA_COOLDOWN_SECONDS - 5
+    assert worker.sync_pending() == 0  # ยังอยู่ในช่วงพัก
+
+
+def test_store_failure_is_recorded(store, worker, monkeypatch):
+    store.save(SHEET_URL, WORKSHEET, pd.DataFrame({NAME_COL: ["A"]}))
+
+    def broken(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(store, "checkout", broken)
+    assert worker.sync_pending() == 0
+    assert status(store)["status"] == STATUS_RETRYING
+    assert status(store)["last_error"] == "database is locked"